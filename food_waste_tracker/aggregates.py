@@ -0,0 +1,144 @@
+import hashlib
+import pandas as pd
+from date_index import DateIndex
+
+"""
+Shared rollups of the waste data.
+
+Every dashboard number (total, daily average, top category, per category,
+per reason, daily and monthly series) is derived from one small
+(date, category, reason) cube, so the raw entries are scanned only once
+no matter how many charts, API calls or chat answers read from it.
+"""
+
+CUBE_KEYS = ["date", "category", "reason"]
+
+class WasteAggregates:
+    """All rollups of one snapshot of the waste data"""
+
+    def __init__(self, cube):
+        """
+        Args:
+            cube (pd.DataFrame): One row per (date, category, reason) with
+                summed `quantity_kg` and an entry `count`
+        """
+        self.cube = cube
+        self._fingerprint = None
+        self._date_index = None
+        self.count = int(cube["count"].sum()) if not cube.empty else 0
+        self.total = float(cube["quantity_kg"].sum()) if not cube.empty else 0.0
+
+        self.daily = self._sum_by("date")
+        self.by_category = self._sum_by("category")
+        self.by_reason = self._sum_by("reason")
+
+        self.daily_avg = float(self.daily.mean()) if len(self.daily) else 0.0
+        self.top_category = self.by_category.idxmax() if len(self.by_category) else "N/A"
+
+        # Calendar buckets are computed over the (small) daily series
+        if len(self.daily):
+            days = pd.DatetimeIndex(self.daily.index)
+            self.daily_by_day = self.daily.groupby(days.normalize()).sum()
+            # Bucket by datetime64[M] and format only the distinct months
+            months = days.to_numpy().astype("datetime64[M]")
+            monthly = self.daily.groupby(months).sum()
+            monthly.index = monthly.index.strftime("%Y-%m")
+            self.monthly = monthly
+        else:
+            self.daily_by_day = pd.Series(dtype="float64", index=pd.DatetimeIndex([]))
+            self.monthly = pd.Series(dtype="float64")
+
+    def _sum_by(self, key):
+        if self.cube.empty or key not in self.cube.columns:
+            return pd.Series(dtype="float64")
+        return self.cube.groupby(key, observed=True)["quantity_kg"].sum()
+
+    @property
+    def empty(self):
+        return self.count == 0
+
+    @property
+    def fingerprint(self):
+        """Stable hash of the cube, equal for equal data regardless of row order"""
+        if self._fingerprint is None:
+            rows = 0
+            if not self.cube.empty:
+                cube = self.cube.assign(quantity_kg=self.cube["quantity_kg"].astype("float64").round(6))
+                rows = int(pd.util.hash_pandas_object(cube, index=False).sum())
+            raw = f"{self.count}:{self.total:.6f}:{rows}"
+            self._fingerprint = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        return self._fingerprint
+
+    @property
+    def date_index(self):
+        """DateIndex over the cube for arbitrary time windows, built on first use"""
+        if self._date_index is None:
+            self._date_index = DateIndex(self.cube)
+        return self._date_index
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build the cube from raw entries in a single grouped pass"""
+        if df is None or df.empty or "quantity_kg" not in df.columns:
+            return cls(pd.DataFrame(columns=CUBE_KEYS + ["quantity_kg", "count"]))
+
+        keys = [key for key in CUBE_KEYS if key in df.columns]
+        if not keys:
+            cube = pd.DataFrame({
+                "quantity_kg": [df["quantity_kg"].sum()],
+                "count": [len(df)]
+            })
+            return cls(cube)
+
+        cube = (
+            df.groupby(keys, observed=True, dropna=False, sort=False)["quantity_kg"]
+            .agg(["sum", "size"])
+            .rename(columns={"sum": "quantity_kg", "size": "count"})
+            .reset_index()
+        )
+        return cls(cube)
+
+    def combine(self, other, sign=1):
+        """Rollups with another snapshot's entries added (sign=1) or removed (sign=-1)"""
+        if other.cube.empty:
+            return self
+        delta = other.cube.assign(
+            quantity_kg=other.cube["quantity_kg"].astype("float64") * sign,
+            count=other.cube["count"] * sign
+        )
+        frames = [frame for frame in (self.cube, delta) if not frame.empty]
+        cube = pd.concat(frames, ignore_index=True)
+        keys = [key for key in CUBE_KEYS if key in cube.columns]
+        if keys:
+            cube = (
+                cube.groupby(keys, observed=True, dropna=False, sort=False)[["quantity_kg", "count"]]
+                .sum()
+                .reset_index()
+            )
+        else:
+            cube = cube[["quantity_kg", "count"]].sum().to_frame().T
+        return WasteAggregates(cube[cube["count"] > 0].reset_index(drop=True))
+
+    @classmethod
+    def from_cube(cls, cube):
+        """Wrap a cube that was already grouped, e.g. by MongoDB"""
+        return cls(cube)
+
+    # Chart-ready frames
+    def daily_frame(self):
+        return pd.DataFrame({
+            "date": self.daily_by_day.index.date,
+            "quantity_kg": self.daily_by_day.to_numpy()
+        })
+
+    def category_frame(self):
+        return self.by_category.rename_axis("category").reset_index(name="quantity_kg")
+
+    def monthly_frame(self):
+        return self.monthly.rename_axis("month").reset_index(name="quantity_kg")
+
+    def as_stats(self):
+        """The (total, daily average, top category) triple of get_stats"""
+        if self.empty:
+            return 0, 0, "N/A"
+        return self.total, self.daily_avg, self.top_category
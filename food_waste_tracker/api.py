@@ -1,11 +1,30 @@
 import os
 import json
+import base64
+import hashlib
+import threading
+import weakref
 import pandas as pd
-from datetime import datetime
-import streamlit as st
-from anthropic import Anthropic
+from datetime import datetime, timezone
+from bson import json_util
+from bson.objectid import ObjectId
 from chatbot import get_chatbot_response
-from food_waste_data import initialize_data, add_waste_entry, get_stats
+from food_waste_data import (
+    initialize_data,
+    add_waste_entry,
+    add_waste_entries,
+    get_aggregates,
+    find_entries,
+    count_entries,
+    store,
+    ALL_COLUMNS
+)
+import local_llm
+import metrics
+import llm_gateway
+import mongo_pipelines
+import forecast
+from response_cache import response_cache, make_key
 from database import unit_to_kg
 
 """
@@ -13,6 +32,14 @@ This module provides API functions for interacting with the Food Waste Tracker.
 It will be integrated into the Streamlit app rather than running as a separate service.
 """
 
+# Sorted views of DataFrames handed to process_entries_api, keyed by
+# (DataFrame id, sort field, ascending)
+_sorted_memo = {}
+SORTED_MEMO_SIZE = 8
+# Reentrant: a weakref callback can fire on this thread while it holds the lock
+_sorted_memo_lock = threading.RLock()
+
+@metrics.timed()
 def process_chat_api(message, waste_data):
     """
     API function for chatbot interaction
@@ -36,6 +63,7 @@ def process_chat_api(message, waste_data):
     except Exception as e:
         return {"error": str(e)}
 
+@metrics.timed()
 def process_add_waste_api(data, waste_data):
     """
     API function to add a waste entry
@@ -87,71 +115,354 @@ def process_add_waste_api(data, waste_data):
     except Exception as e:
         return {"error": str(e)}
 
-def process_stats_api(period, waste_data):
+@metrics.timed()
+def process_bulk_add_waste_api(data, waste_data=None, batch_size=1000):
     """
-    API function to get food waste statistics
+    API function to add many waste entries in one call
     
     Args:
-        period (str): Time period ("7days", "30days", "month", "year", "all")
-        waste_data (pd.DataFrame): The waste data
+        data (list): Waste entries, each a dict with the fields of
+            process_add_waste_api
+        waste_data (pd.DataFrame, optional): The waste data (unused, kept
+            for symmetry with the other API functions)
+        batch_size (int): Entries written per insert_many round trip
         
     Returns:
-        dict: Statistics about food waste
+        dict: Number of inserted entries and per-row errors
     """
     try:
-        # Filter data based on period
-        today = pd.Timestamp(datetime.now().date())
+        if not isinstance(data, list):
+            return {"error": "Expected a list of waste entries"}
         
-        if period == '7days':
-            filtered_data = waste_data[waste_data['date'] >= (today - pd.Timedelta(days=7))]
-        elif period == '30days':
-            filtered_data = waste_data[waste_data['date'] >= (today - pd.Timedelta(days=30))]
-        elif period == 'month':
-            current_month = today.month
-            current_year = today.year
-            filtered_data = waste_data[
-                (waste_data['date'].dt.month == current_month) & 
-                (waste_data['date'].dt.year == current_year)
-            ]
-        elif period == 'year':
-            current_year = today.year
-            filtered_data = waste_data[waste_data['date'].dt.year == current_year]
-        else:  # 'all' or any invalid value
-            filtered_data = waste_data
+        if batch_size < 1:
+            batch_size = 1000
         
-        # If no data available
-        if len(filtered_data) == 0:
-            return {
-                "total_waste_kg": 0,
-                "avg_daily_waste_kg": 0,
-                "most_wasted_category": "None",
-                "waste_by_category": {},
-                "waste_by_reason": {}
-            }
+        report = add_waste_entries(data, batch_size=batch_size)
+        
+        return {
+            "success": not report["errors"],
+            "inserted": report["inserted"],
+            "failed": len(report["errors"]),
+            "errors": report["errors"]
+        }
+    
+    except Exception as e:
+        return {"error": str(e)}
+
+def filter_period(waste_data, period):
+    """
+    Rows of a DataFrame that fall in a stats period
+    
+    Args:
+        waste_data (pd.DataFrame): Entries with a `date` column
+        period (str): Time period, as in process_stats_api
         
-        # Calculate statistics
-        total_waste_kg, avg_daily_waste_kg, most_wasted_category = get_stats(filtered_data)
+    Returns:
+        pd.DataFrame: The matching rows, in their original order
+    """
+    start, end = mongo_pipelines.period_bounds(period)
+    mask = pd.Series(True, index=waste_data.index)
+    if start is not None:
+        mask &= waste_data['date'] >= start
+    if end is not None:
+        mask &= waste_data['date'] < end
+    return waste_data[mask]
+
+def stats_window(period="all", start=None, end=None):
+    """
+    Time window of a stats request
+    
+    Args:
+        period (str): Named period, used when neither start nor end is given
+        start (str, optional): First date (inclusive)
+        end (str, optional): Last date; a plain date includes that whole day
         
-        # Get waste by category
-        category_waste = filtered_data.groupby('category')['quantity_kg'].sum()
-        waste_by_category = category_waste.to_dict()
+    Returns:
+        tuple: (start, end) timestamps, either may be None
+    """
+    if start is None and end is None:
+        start, end = mongo_pipelines.period_bounds(period)
+        return (pd.Timestamp(start) if start else None, pd.Timestamp(end) if end else None)
+    
+    start = pd.Timestamp(start) if start else None
+    if end:
+        end_ts = pd.Timestamp(end)
+        end = end_ts + pd.Timedelta(days=1) if end_ts == end_ts.normalize() else end_ts
+    else:
+        end = None
+    if start is not None and end is not None and start >= end:
+        raise ValueError("start must be before end")
+    return start, end
+
+@metrics.timed()
+def process_stats_api(period, waste_data=None, start=None, end=None, group_by=None):
+    """
+    API function to get food waste statistics
+    
+    Args:
+        period (str): Time period ("7days", "30days", "month", "year", "all")
+        waste_data (pd.DataFrame, optional): The waste data. When None, the
+            statistics are computed from the MongoDB-side rollups.
+        start (str, optional): Window start date, overrides period
+        end (str, optional): Window end date (inclusive), overrides period
+        group_by (str, optional): "week", "month", "category" or "reason" to
+            add per-bucket totals under "buckets"
         
-        # Get waste by reason
-        reason_waste = filtered_data.groupby('reason')['quantity_kg'].sum()
-        waste_by_reason = reason_waste.to_dict()
+    Returns:
+        dict: Statistics about food waste
+    """
+    try:
+        window = stats_window(period, start, end)
         
-        return {
-            "total_waste_kg": float(total_waste_kg),
-            "avg_daily_waste_kg": float(avg_daily_waste_kg),
-            "most_wasted_category": most_wasted_category,
-            "waste_by_category": {k: float(v) for k, v in waste_by_category.items()},
-            "waste_by_reason": {k: float(v) for k, v in waste_by_reason.items()}
-        }
+        # Range sums come from the date-sorted index of the (memoized)
+        # rollups; without a DataFrame the database only groups the
+        # entries in the window, found through the date index
+        match = None if waste_data is not None else mongo_pipelines.range_match(*window)
+        aggregates = get_aggregates(waste_data, match=match)
+        return stats_from_index(aggregates.date_index, *window, group_by=group_by)
     
     except Exception as e:
         return {"error": str(e)}
 
-def process_entries_api(params, waste_data):
+def stats_from_index(index, start=None, end=None, group_by=None):
+    """process_stats_api response for a window of a DateIndex"""
+    stats = index.stats(start, end) or {
+        "total_waste_kg": 0,
+        "avg_daily_waste_kg": 0,
+        "most_wasted_category": "None",
+        "waste_by_category": {},
+        "waste_by_reason": {},
+        "entry_count": 0
+    }
+    
+    if group_by in ("week", "month"):
+        buckets = index.buckets(group_by, start, end)
+    elif group_by in ("category", "reason"):
+        buckets = index.by(group_by, start, end)
+    elif group_by:
+        raise ValueError(f"Unknown group_by: {group_by}")
+    else:
+        return stats
+    
+    stats["buckets"] = {str(k): float(v) for k, v in buckets.items()}
+    return stats
+
+@metrics.timed()
+def process_forecast_api(horizon=forecast.FORECAST_HORIZON, waste_data=None, group_by="category"):
+    """
+    API function to project daily waste
+    
+    Args:
+        horizon (int): Days to forecast after the last complete day
+        waste_data (pd.DataFrame, optional): The waste data. When None, the
+            forecast is fitted on the MongoDB-side rollups.
+        group_by (str): "category" or "reason"
+        
+    Returns:
+        dict: Forecast days, and per series (plus in total) the model used
+            and the daily forecast with a 95% interval, in kg
+    """
+    try:
+        return forecast_from_aggregates(get_aggregates(waste_data), horizon, group_by)
+    
+    except Exception as e:
+        return {"error": str(e)}
+
+def forecast_from_aggregates(aggregates, horizon=forecast.FORECAST_HORIZON, group_by="category"):
+    """process_forecast_api response for one snapshot of the rollups"""
+    result = forecast.forecast(aggregates, horizon, group_by)
+    
+    def points(values):
+        return [
+            {
+                "date": day.strftime('%Y-%m-%d'),
+                "forecast_kg": round(float(value), 3),
+                "lower_kg": round(float(lower), 3),
+                "upper_kg": round(float(upper), 3)
+            }
+            for day, value, lower, upper in zip(
+                result["dates"], values["forecast_kg"], values["lower_kg"], values["upper_kg"]
+            )
+        ]
+    
+    history_end = result["history_end"]
+    return {
+        "horizon": int(horizon),
+        "group_by": group_by,
+        "history_end": history_end.strftime('%Y-%m-%d') if history_end is not None else None,
+        "series": {
+            name: {
+                "model": values["model"],
+                "alpha": values["alpha"],
+                "gamma": values["gamma"],
+                "points": points(values)
+            }
+            for name, values in result["series"].items()
+        },
+        "total": points(result["total"]) if result["total"] else []
+    }
+
+ENTRY_FIELDS = ['id', 'food_item', 'category', 'quantity', 'unit', 'quantity_kg', 'date', 'reason', 'notes']
+
+def _entry_from_doc(doc):
+    """API representation of a raw MongoDB entry"""
+    return {
+        'id': int(doc['id']) if 'id' in doc else None,
+        'food_item': doc.get('food_item'),
+        'category': doc.get('category'),
+        'quantity': float(doc.get('quantity', 0)),
+        'unit': doc.get('unit'),
+        'quantity_kg': float(doc.get('quantity_kg', 0)),
+        'date': doc['date'].strftime('%Y-%m-%d') if doc.get('date') else None,
+        'reason': doc.get('reason'),
+        'notes': doc.get('notes', '')
+    }
+
+def _entries_from_frame(page):
+    """API representation of a page of DataFrame rows, converted column-wise"""
+    def column(name, default=None):
+        if name not in page.columns:
+            return [default] * len(page)
+        values = page[name]
+        if name == 'date':
+            return values.dt.strftime('%Y-%m-%d').astype(object).where(values.notna(), None).tolist()
+        if name in ('quantity', 'quantity_kg'):
+            return values.astype(float).tolist()
+        if name == 'id':
+            return values.astype(int).tolist()
+        return values.astype(object).where(values.notna(), None).tolist()
+
+    columns = [column(name, '' if name == 'notes' else None) for name in ENTRY_FIELDS]
+    return [dict(zip(ENTRY_FIELDS, values)) for values in zip(*columns)]
+
+def _encode_cursor(sort_by, order, value, entry_id):
+    """Opaque token pointing just after the (sort value, _id) of an entry"""
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    elif hasattr(value, 'item'):
+        value = value.item()  # numpy scalar
+    elif isinstance(value, float) and value != value:
+        value = None  # NaN
+    payload = json_util.dumps({"s": sort_by, "o": order, "v": value, "id": str(entry_id)})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def _decode_cursor(token, sort_by, order):
+    """(sort value, _id string) from a cursor token issued for this sort"""
+    try:
+        payload = json_util.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if payload.get("s") != sort_by or payload.get("o") != order:
+        raise ValueError("Cursor does not match the requested sort order")
+    value = payload["v"]
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value, payload["id"]
+
+def _sorted_entries(waste_data, sort_by, ascending):
+    """The DataFrame ordered by (sort field, _id), memoized per DataFrame"""
+    key = (id(waste_data), sort_by, ascending)
+    with _sorted_memo_lock:
+        hit = _sorted_memo.get(key)
+    if hit is not None and hit[0]() is waste_data:
+        metrics.cache_event("sorted_entries", True)
+        return hit[1]
+    metrics.cache_event("sorted_entries", False)
+    
+    # Categoricals sort by category order; page in value order instead
+    sort_key = waste_data[sort_by]
+    if isinstance(sort_key.dtype, pd.CategoricalDtype):
+        sort_key = sort_key.astype(object)
+    sorted_data = (
+        waste_data.assign(_sort_key=sort_key)
+        .sort_values(by=['_sort_key', '_id'], ascending=ascending, na_position='last')
+    )
+    
+    # The sorted copy is released as soon as its DataFrame is garbage
+    # collected (ids are reused, so only drop the entry this ref belongs to)
+    def forget(ref):
+        with _sorted_memo_lock:
+            if _sorted_memo.get(key, (None,))[0] is ref:
+                del _sorted_memo[key]
+    
+    with _sorted_memo_lock:
+        if len(_sorted_memo) >= SORTED_MEMO_SIZE and key not in _sorted_memo:
+            _sorted_memo.pop(next(iter(_sorted_memo)))
+        _sorted_memo[key] = (weakref.ref(waste_data, forget), sorted_data)
+    return sorted_data
+
+def _rows_after(sorted_data, ascending, value, entry_id):
+    """Position of the first row after (value, _id) in a _sorted_entries frame"""
+    keys = sorted_data['_sort_key']
+    ids = sorted_data['_id']
+    later_id = (ids > entry_id) if ascending else (ids < entry_id)
+    if value is None:
+        # Missing values come last in both orders
+        after = keys.isna() & later_id
+    else:
+        later_key = (keys > value) if ascending else (keys < value)
+        after = keys.isna() | later_key | ((keys == value) & later_id)
+    after = after.to_numpy()
+    return int(after.argmax()) if after.any() else len(sorted_data)
+
+def entries_query(params):
+    """Validated process_entries_api parameters"""
+    limit = int(params.get('limit', 10))
+    offset = int(params.get('offset', 0))
+    order = params.get('order', 'desc')
+    
+    # Validate parameters
+    if limit < 1 or limit > 100:
+        limit = 10
+    
+    if offset < 0:
+        offset = 0
+    
+    ascending = (order.lower() == 'asc')
+    return {
+        'limit': limit,
+        'skip': offset,
+        'cursor': params.get('cursor'),
+        'sort': params.get('sort', 'date'),
+        'order': 'asc' if ascending else 'desc',
+        'ascending': ascending,
+        'period': params.get('period', 'all'),
+        'category': params.get('category'),
+        'search': (params.get('search') or '').strip()
+    }
+
+def mongo_entries_match(query):
+    """MongoDB filter for an entries_query"""
+    match = mongo_pipelines.period_match(query['period'])
+    if query['category']:
+        match['category'] = query['category']
+    if query['search']:
+        match.update(mongo_pipelines.search_match('food_item', query['search']))
+    return match
+
+def mongo_entries_after(query):
+    """(sort value, ObjectId) to seek past, from the query's cursor"""
+    if not query['cursor']:
+        return None
+    value, entry_id = _decode_cursor(query['cursor'], query['sort'], query['order'])
+    return value, ObjectId(entry_id)
+
+def entries_page_from_docs(query, docs, total):
+    """Entries response for up to limit + 1 MongoDB documents"""
+    next_cursor = None
+    if len(docs) > query['limit']:
+        docs = docs[:query['limit']]
+        last = docs[-1]
+        next_cursor = _encode_cursor(query['sort'], query['order'], last.get(query['sort']), last['_id'])
+    
+    return {
+        "total": total,
+        "entries": [_entry_from_doc(doc) for doc in docs],
+        "next_cursor": next_cursor
+    }
+
+@metrics.timed()
+def process_entries_api(params, waste_data=None):
     """
     API function to get waste entries
     
@@ -159,63 +470,166 @@ def process_entries_api(params, waste_data):
         params (dict): Query parameters:
             - limit (int): Number of entries to return
             - offset (int): Number of entries to skip
+            - cursor (str, optional): `next_cursor` of the previous page.
+              Seeks straight to the next page, so deep pages cost the same
+              as the first one; `offset` is ignored when given.
             - sort (str): Field to sort by
             - order (str): Sort order ("asc" or "desc")
-        waste_data (pd.DataFrame): The waste data
+            - period (str, optional): Time period, as in process_stats_api
+            - category (str, optional): Only return entries of this category
+            - search (str, optional): Only return entries whose food item
+              contains this text (case-insensitive)
+        waste_data (pd.DataFrame, optional): The waste data. When None, the
+            page is read from MongoDB with an indexed find().sort().limit()
         
     Returns:
-        dict: Paginated list of waste entries
+        dict: Paginated list of waste entries and the cursor of the next
+            page (None on the last page)
     """
     try:
-        # Get query parameters
-        limit = int(params.get('limit', 10))
-        offset = int(params.get('offset', 0))
-        sort_by = params.get('sort', 'date')
-        order = params.get('order', 'desc')
-        
-        # Validate parameters
-        if limit < 1 or limit > 100:
-            limit = 10
+        query = entries_query(params)
+        limit, offset, cursor = query['limit'], query['skip'], query['cursor']
+        sort_by, order, ascending = query['sort'], query['order'], query['ascending']
+        period, category, search = query['period'], query['category'], query['search']
         
-        if offset < 0:
-            offset = 0
+        if waste_data is None:
+            # Filter, sort and page on the server using the indexes
+            if sort_by not in ALL_COLUMNS:
+                query['sort'] = 'date'
+            match = mongo_entries_match(query)
+            after = mongo_entries_after(query)
+            
+            # One extra entry tells whether there is a next page
+            docs = find_entries(match, query['sort'], ascending, offset, limit + 1, after)
+            return entries_page_from_docs(query, docs, count_entries(match))
         
         # Make sure sort_by field exists
         valid_sort_fields = waste_data.columns.tolist()
         if sort_by not in valid_sort_fields:
             sort_by = 'date'
         
-        # Sort data
-        ascending = (order.lower() == 'asc')
-        sorted_data = waste_data.sort_values(by=sort_by, ascending=ascending)
+        # Sort the caller's DataFrame (once per DataFrame and sort order),
+        # then filter the sorted view, which keeps its order
+        sorted_data = _sorted_entries(waste_data, sort_by, ascending)
+        sorted_data = filter_period(sorted_data, period)
+        if category:
+            sorted_data = sorted_data[sorted_data['category'] == category]
+        if search and 'food_item' in sorted_data.columns:
+            food_item = sorted_data['food_item'].astype(str)
+            sorted_data = sorted_data[food_item.str.contains(search, case=False, regex=False)]
         
         # Apply pagination
+        if cursor:
+            value, entry_id = _decode_cursor(cursor, sort_by, order)
+            offset = _rows_after(sorted_data, ascending, value, entry_id)
         paginated_data = sorted_data.iloc[offset:offset + limit]
         
-        # Convert to list of dictionaries
-        entries = []
-        for _, row in paginated_data.iterrows():
-            entry = {
-                'id': int(row['id']) if 'id' in row else None,
-                'food_item': row['food_item'],
-                'category': row['category'],
-                'quantity': float(row['quantity']),
-                'unit': row['unit'],
-                'quantity_kg': float(row['quantity_kg']),
-                'date': row['date'].strftime('%Y-%m-%d'),
-                'reason': row['reason'],
-                'notes': row['notes'] if 'notes' in row else ''
-            }
-            entries.append(entry)
+        next_cursor = None
+        if offset + limit < len(sorted_data) and not paginated_data.empty:
+            last = paginated_data.iloc[-1]
+            next_cursor = _encode_cursor(sort_by, order, last['_sort_key'], last['_id'])
         
         return {
-            "total": len(waste_data),
-            "entries": entries
+            "total": len(sorted_data),
+            "entries": _entries_from_frame(paginated_data),
+            "next_cursor": next_cursor
         }
     
     except Exception as e:
         return {"error": str(e)}
 
+# the newest Anthropic model is "claude-3-5-sonnet-20241022" which was released October 22, 2024
+ANTHROPIC_MODEL = "claude-3-5-sonnet-20241022"
+ANTHROPIC_MAX_TOKENS = 1000
+ANTHROPIC_SYSTEM_PROMPT = """You are an AI assistant specialized in food waste reduction and management, but you can also answer general questions on any topic. 
+You have access to the user's food waste tracking data from their Food Waste Tracker application.
+When the user asks about food waste, provide helpful, informative responses about reducing food waste, understanding waste patterns, 
+and adopting sustainable practices. When the user asks general questions unrelated to food waste, provide helpful and accurate information on those topics as well.
+Be concise but thorough in your responses.
+"""
+
+# Data contexts keyed by the aggregates fingerprint they describe
+_anthropic_contexts = {}
+_anthropic_contexts_lock = threading.Lock()
+ANTHROPIC_CONTEXT_CACHE_SIZE = 8
+
+def anthropic_data_context(stats, recent_entries):
+    """
+    Waste data summary prepended to questions sent to Claude
+    
+    Args:
+        stats (tuple): (total kg, average daily kg, most wasted category)
+        recent_entries (list): Most recent entries as dicts
+        
+    Returns:
+        str: The context block
+    """
+    total_waste_kg, avg_daily_waste_kg, most_wasted_category = stats
+    data_context = f"""
+Current Food Waste Statistics:
+- Total Waste: {total_waste_kg:.2f} kg
+- Average Daily Waste: {avg_daily_waste_kg:.2f} kg
+- Most Wasted Category: {most_wasted_category}
+"""
+    
+    # Add sample of recent entries
+    if recent_entries:
+        data_context += "\nMost Recent Entries:\n"
+        for row in recent_entries:
+            data_context += f"- {row['food_item']} ({row['category']}): {row['quantity']} {row['unit']} on {row['date'].strftime('%Y-%m-%d')}\n"
+    return data_context
+
+def anthropic_context(waste_data):
+    """
+    Waste data context for Claude, built once per snapshot of the data
+    
+    Args:
+        waste_data (pd.DataFrame): The waste data
+        
+    Returns:
+        str: The context block, cached per aggregates fingerprint (empty
+            without data)
+    """
+    if waste_data is None or waste_data.empty:
+        return ""
+    aggregates = get_aggregates(waste_data)
+    key = aggregates.fingerprint
+    with _anthropic_contexts_lock:
+        data_context = _anthropic_contexts.get(key)
+    if data_context is not None:
+        return data_context
+    
+    # Dashboard frames carry no food items; read the newest entries instead
+    if {'food_item', 'quantity', 'unit'}.issubset(waste_data.columns):
+        recent_entries = waste_data.sort_values(['date', '_id'], ascending=False).head(3).to_dict('records')
+    else:
+        recent_entries = find_entries(None, 'date', False, limit=3)
+    data_context = anthropic_data_context(aggregates.as_stats(), recent_entries)
+    
+    with _anthropic_contexts_lock:
+        if len(_anthropic_contexts) >= ANTHROPIC_CONTEXT_CACHE_SIZE:
+            _anthropic_contexts.pop(next(iter(_anthropic_contexts)))
+        _anthropic_contexts[key] = data_context
+    return data_context
+
+def anthropic_payload(message, data_context):
+    """Request body for the Anthropic messages API"""
+    return {
+        "model": ANTHROPIC_MODEL,
+        "max_tokens": ANTHROPIC_MAX_TOKENS,
+        "system": ANTHROPIC_SYSTEM_PROMPT,
+        "messages": [{
+            "role": "user",
+            "content": f"{data_context}\n\nUser question: {message}"
+        }]
+    }
+
+def anthropic_cache_key(message, data_context):
+    """Response cache key of a question asked with a given data context"""
+    context_hash = hashlib.sha1(data_context.encode("utf-8")).hexdigest()
+    return make_key(message, f"anthropic:{ANTHROPIC_MODEL}", context_hash)
+
+@metrics.timed()
 def process_anthropic_api(message, waste_data=None):
     """
     API function to get a response from Anthropic Claude
@@ -235,55 +649,79 @@ def process_anthropic_api(message, waste_data=None):
                 "error": "ANTHROPIC_API_KEY is not set. Please set up your API key in the environment variables."
             }
         
-        # Initialize Anthropic client
-        client = Anthropic(api_key=anthropic_api_key)
+        # Waste data context if available (prepared by the dashboard
+        # precompute job, so usually just a cache lookup)
+        data_context = anthropic_context(waste_data)
         
-        # Get waste data context if available
-        data_context = ""
-        if waste_data is not None and not waste_data.empty:
-            total_waste_kg, avg_daily_waste_kg, most_wasted_category = get_stats(waste_data)
-            
-            data_context = f"""
-Current Food Waste Statistics:
-- Total Waste: {total_waste_kg:.2f} kg
-- Average Daily Waste: {avg_daily_waste_kg:.2f} kg
-- Most Wasted Category: {most_wasted_category}
-"""
-            
-            # Add sample of recent entries
-            if len(waste_data) > 0:
-                recent_entries = waste_data.sort_values('date', ascending=False).head(3)
-                data_context += "\nMost Recent Entries:\n"
-                for _, row in recent_entries.iterrows():
-                    data_context += f"- {row['food_item']} ({row['category']}): {row['quantity']} {row['unit']} on {row['date'].strftime('%Y-%m-%d')}\n"
-        
-        # Prepare the prompt
-        system_prompt = """You are an AI assistant specialized in food waste reduction and management, but you can also answer general questions on any topic. 
-You have access to the user's food waste tracking data from their Food Waste Tracker application.
-When the user asks about food waste, provide helpful, informative responses about reducing food waste, understanding waste patterns, 
-and adopting sustainable practices. When the user asks general questions unrelated to food waste, provide helpful and accurate information on those topics as well.
-Be concise but thorough in your responses.
-"""
-
-        # Get response from Claude
-        # the newest Anthropic model is "claude-3-5-sonnet-20241022" which was released October 22, 2024
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=1000,
-            system=system_prompt,
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"{data_context}\n\nUser question: {message}"
-                }
-            ]
-        )
+        # Same question with the same data context: reuse the answer
+        key = anthropic_cache_key(message, data_context)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return {"response": cached}
         
-        response_text = message.content[0].text
+        # Get response from Claude through the shared gateway (pooled
+        # connection, timeouts, retries and circuit breaker)
+        response_text = llm_gateway.anthropic_message(anthropic_payload(message, data_context))
+        response_cache.set(key, response_text)
         
         return {
             "response": response_text
         }
     
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+@metrics.timed()
+def process_health_api():
+    """
+    API function to check the database connection
+    
+    Returns:
+        dict: Ping status and latency, the storage backend, plus connection
+            pool usage (MongoDB) or the entry count (embedded stores)
+    """
+    try:
+        return store.health()
+    
+    except Exception as e:
+        return {"error": str(e)}
+
+@metrics.timed()
+def process_llm_metrics_api():
+    """
+    API function to report the local LLM worker's state
+    
+    Returns:
+        dict: Model load state, queue depth, batch sizes and latency percentiles
+    """
+    return local_llm.get_metrics()
+
+@metrics.timed()
+def process_llm_circuits_api():
+    """
+    API function to report the hosted LLM backends' circuit breakers
+    
+    Returns:
+        dict: State ("closed", "open" or "half-open") and failure count per backend
+    """
+    return llm_gateway.circuit_status()
+
+@metrics.timed()
+def process_response_cache_api():
+    """
+    API function to report response cache usage
+    
+    Returns:
+        dict: Memory/disk hits, misses, evictions, size and hit rate
+    """
+    return response_cache.stats()
+
+def process_metrics_api():
+    """
+    API function to report hot path timings
+    
+    Returns:
+        dict: Whether recording is on, latency percentiles, row and error
+            counts per instrumented function or block, and cache hit rates
+    """
+    return metrics.snapshot()
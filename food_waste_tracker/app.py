@@ -1,19 +1,36 @@
+import os
+import math
+import pandas as pd
 import streamlit as st
 from datetime import datetime
 from dotenv import load_dotenv
 from food_waste_data import (
     initialize_data,
+    get_cached_data,
     add_waste_entry,
     get_stats,
-    get_all_data,
-    delete_data_by_id
+    delete_data_by_id,
+    ensure_indexes,
+    find_entries,
+    count_entries,
+    has_entries,
+    get_data_version,
+    reconcile_rollups,
+    DASHBOARD_COLUMNS
 )
 from visualization import (
     create_daily_chart,
     create_category_chart,
-    create_monthly_trend
+    create_monthly_trend,
+    create_forecast_chart,
+    precompute_dashboard
 )
-from chatbot import get_chatbot_response
+from chatbot import get_chatbot_response, stream_chatbot_response, CHATBOT_MODE
+import api
+import local_llm
+import metrics
+from watcher import get_watcher
+from scheduler import get_scheduler, HIGH
 
 load_dotenv()
 
@@ -24,12 +41,53 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Load data from MongoDB
-waste_data = initialize_data()
+# Create the collection indexes (once per process)
+ensure_indexes()
+
+# Start loading the local LLM in the background so the first chat
+# message doesn't wait for it
+if CHATBOT_MODE != "offline":
+    local_llm.warm_up()
+
+# Follow inserts and deletes from other terminals (change stream, or polling
+# on standalone servers) so the cached data stays current without reloads
+get_watcher()
+LIVE_REFRESH_SECONDS = float(os.getenv("LIVE_REFRESH_SECONDS", "5"))
+
+# Rebuild the rollups and chart caches in the background on a timer, so
+# dashboard renders only read caches; post-submit tips also run there
+DASHBOARD_PRECOMPUTE_SECONDS = float(os.getenv("DASHBOARD_PRECOMPUTE_SECONDS", "30"))
+TIP_POLL_SECONDS = 1
+scheduler = get_scheduler()
+scheduler.every(DASHBOARD_PRECOMPUTE_SECONDS, precompute_dashboard, key="precompute_dashboard")
+
+# Correct any rollup bucket that drifted from the raw entries
+ROLLUP_RECONCILE_SECONDS = float(os.getenv("ROLLUP_RECONCILE_SECONDS", "3600"))
+scheduler.every(ROLLUP_RECONCILE_SECONDS, reconcile_rollups, key="reconcile_rollups", run_now=False)
+
+CATEGORIES = ["Vegetables", "Fruits", "Dairy", "Grains", "Meat", "Others"]
+UNITS = ["kg", "g", "lbs", "oz", "ltr", "ml", "servings", "items"]
+REASONS = ["Expired", "Spoiled", "Leftover", "Overcooked", "Others"]
+
+# Waste log paging: rows per page, and pages fetched ahead of the visible
+# one so paging forward usually needs no query
+LOG_PAGE_SIZES = [25, 50, 100]
+LOG_PREFETCH_PAGES = 2
+LOG_PERIODS = {"all": "All time", "7days": "Last 7 days", "30days": "Last 30 days",
+               "month": "This month", "year": "This year"}
+LOG_SORT_FIELDS = {"Date": "date", "Quantity (kg)": "quantity_kg", "Food item": "food_item",
+                   "Category": "category", "Logged at": "entry_timestamp"}
+LOG_COLUMNS = ["food_item", "category", "quantity", "unit", "quantity_kg", "date", "reason", "notes"]
+
+# Load data from MongoDB (cached across reruns, only new entries are fetched).
+# The dashboard only needs a few typed columns, so notes etc. are not read.
+waste_data = initialize_data(DASHBOARD_COLUMNS)
 
 # Session state for chat
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "pending_tips" not in st.session_state:
+    st.session_state.pending_tips = []
 
 # App title
 st.title("🥕 Food Waste Tracker with AI Assistant")
@@ -38,68 +96,204 @@ st.title("🥕 Food Waste Tracker with AI Assistant")
 st.sidebar.subheader("➕ Add Food Waste Entry")
 with st.sidebar.form("waste_form"):
     food_item = st.text_input("Food Item")
-    category = st.selectbox("Category", ["Vegetables", "Fruits", "Dairy", "Grains", "Meat", "Others"])
+    category = st.selectbox("Category", CATEGORIES)
     quantity = st.number_input("Quantity", min_value=0.1, step=0.1)
-    unit = st.selectbox("Unit", ["kg", "lbs", "servings", "items"])
-    reason = st.selectbox("Reason", ["Expired", "Spoiled", "Leftover", "Overcooked", "Others"])
+    unit = st.selectbox("Unit", UNITS)
+    reason = st.selectbox("Reason", REASONS)
     date = st.date_input("Date", datetime.today())
     notes = st.text_area("Notes (optional)")
     submit = st.form_submit_button("Submit")
 
 if submit:
     add_waste_entry(None, food_item, category, quantity, unit, date, reason, notes)
+    waste_data = initialize_data(DASHBOARD_COLUMNS)
     st.success(f"✅ {quantity} {unit} of '{food_item}' added!")
 
-    # Trigger chatbot after entry
+    # Ask the chatbot for a tip in the background; it joins the chat
+    # history when ready instead of holding up the submit
     prompt = (
         f"I just logged {quantity} {unit} of {food_item} in the category '{category}', "
         f"wasted because it was '{reason}'. Suggest a tip or advice."
     )
-    bot_reply = get_chatbot_response(prompt, waste_data)
-    st.session_state.chat_history.append(("Assistant", bot_reply))
+    st.session_state.pending_tips.append(
+        scheduler.submit(get_chatbot_response, prompt, waste_data, priority=HIGH, key=("tip", prompt))
+    )
 
 
 # --- Dashboard Section ---
 st.subheader("📊 Waste Overview")
 
-total, avg_daily, top_cat = get_stats(waste_data)
-col1, col2, col3 = st.columns(3)
-col1.metric("Total Waste (kg)", f"{total:.2f}")
-col2.metric("Avg Daily Waste", f"{avg_daily:.2f} kg")
-col3.metric("Top Wasted Category", top_cat)
+# Re-rendered on a timer from the watcher-maintained cache, so totals from
+# other terminals show up without a full rerun or a database read
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def waste_overview():
+    live_data = get_cached_data(DASHBOARD_COLUMNS)
+
+    total, avg_daily, top_cat = get_stats(live_data)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Waste (kg)", f"{total:.2f}")
+    col2.metric("Avg Daily Waste", f"{avg_daily:.2f} kg")
+    col3.metric("Top Wasted Category", top_cat)
 
-# Charts
-st.plotly_chart(create_daily_chart(waste_data), use_container_width=True)
-st.plotly_chart(create_category_chart(waste_data), use_container_width=True)
-st.plotly_chart(create_monthly_trend(waste_data), use_container_width=True)
+    # Charts
+    st.plotly_chart(create_daily_chart(live_data), use_container_width=True)
+    st.plotly_chart(create_category_chart(live_data), use_container_width=True)
+    st.plotly_chart(create_monthly_trend(live_data), use_container_width=True)
+    st.plotly_chart(create_forecast_chart(live_data), use_container_width=True)
+
+waste_overview()
 
 # --- Chat Assistant ---
 st.subheader("💬 Ask Your AI Assistant")
 
-user_msg = st.text_input("Talk to the assistant:", key="chat_input")
+# Move a submitted message out of the input box, so the reruns triggered
+# by tips and live refreshes don't send it again
+def take_chat_message():
+    st.session_state.chat_message = st.session_state.chat_input
+    st.session_state.chat_input = ""
+
+st.text_input("Talk to the assistant:", key="chat_input", on_change=take_chat_message)
+user_msg = st.session_state.pop("chat_message", "")
 
 if user_msg:
     st.session_state.chat_history.append(("You", user_msg))
-    response = get_chatbot_response(user_msg, waste_data)
+    # Show the answer as it streams in, then add it to the history
+    placeholder = st.empty()
+    response = ""
+    for chunk in stream_chatbot_response(user_msg, waste_data):
+        response += chunk
+        placeholder.markdown(f"**Assistant:** {response}")
+    placeholder.empty()
     st.session_state.chat_history.append(("Assistant", response))
 
+# Tips still being written; finished ones move to the chat history
+@st.fragment(run_every=TIP_POLL_SECONDS)
+def pending_tips():
+    pending = st.session_state.pending_tips
+    ready = [tip for tip in pending if tip.done()]
+    if not ready:
+        if pending:
+            st.caption("💡 Writing a tip for your last entry...")
+        return
+    for tip in ready:
+        pending.remove(tip)
+        try:
+            reply = tip.result()
+        except Exception as e:
+            reply = f"Sorry, I couldn't come up with a tip this time ({e})."
+        st.session_state.chat_history.append(("Assistant", reply))
+    st.rerun()
+
+pending_tips()
+
 # Display chat history
 for speaker, message in st.session_state.chat_history:
     st.markdown(f"**{speaker}:** {message}")
 
 # --- Data Table + Delete ---
 st.subheader("📋 Waste Log")
-raw_data = get_all_data()
-if raw_data:
-    df = initialize_data()
-    st.dataframe(df.drop(columns=["_id"]), use_container_width=True)
 
-    delete_id = st.text_input("Enter MongoDB ID to Delete Entry:")
-    if st.button("Delete Entry"):
+# Rows of window `index` (a few pages starting at a keyset position), read
+# with one indexed query and kept until the filters or the data change
+def log_window(log, index):
+    if index not in log["windows"]:
+        rows = log["page_size"] * (LOG_PREFETCH_PAGES + 1)
+        docs = find_entries(log["match"], log["sort"], log["ascending"],
+                            limit=rows + 1, after=log["starts"][index])
+        log["windows"][index] = docs[:rows]
+        if len(docs) > rows:
+            last = docs[rows - 1]
+            log["starts"][index + 1] = (last.get(log["sort"]), last["_id"])
+    return log["windows"][index]
+
+# Paging state for the current filters, reset when they change
+def log_state(match, sort, ascending, page_size):
+    key = (repr(match), sort, ascending, page_size)
+    log = st.session_state.get("waste_log")
+    if log is None or log["key"] != key:
+        log = st.session_state.waste_log = {
+            "key": key, "match": match, "sort": sort, "ascending": ascending,
+            "page_size": page_size, "page": 0,
+            "starts": {0: None},    # keyset position each window starts after
+            "windows": {},          # window index -> entries
+            "version": None, "total": None,
+        }
+    version = get_data_version()
+    if log["version"] != version:
+        # Entries were added or deleted: refetch, keeping the page positions
+        log["windows"].clear()
+        log["total"] = count_entries(match)
+        log["version"] = version
+    return log
+
+# Only this section reruns while paging, filtering or deleting
+@st.fragment
+def waste_log():
+    if not has_entries():
+        st.info("No entries yet. Add your first one from the sidebar.")
+        return
+
+    search_col, category_col, period_col, sort_col, order_col, size_col = st.columns([3, 2, 2, 2, 2, 1])
+    search = search_col.text_input("Search food item", key="log_search")
+    category = category_col.selectbox("Category", ["All", *CATEGORIES], key="log_category")
+    period = period_col.selectbox("Period", list(LOG_PERIODS), format_func=LOG_PERIODS.get, key="log_period")
+    sort_label = sort_col.selectbox("Sort by", list(LOG_SORT_FIELDS), key="log_sort")
+    order = order_col.selectbox("Order", ["Descending", "Ascending"], key="log_order")
+    page_size = size_col.selectbox("Rows", LOG_PAGE_SIZES, key="log_page_size")
+
+    query = api.entries_query({
+        "period": period,
+        "category": None if category == "All" else category,
+        "search": search,
+        "order": "asc" if order == "Ascending" else "desc",
+    })
+    log = log_state(api.mongo_entries_match(query), LOG_SORT_FIELDS[sort_label], query["ascending"], page_size)
+
+    pages_per_window = LOG_PREFETCH_PAGES + 1
+    window = log_window(log, log["page"] // pages_per_window)
+    start = (log["page"] % pages_per_window) * page_size
+    entries = window[start:start + page_size]
+    if not entries and log["page"] > 0:
+        # The page emptied (e.g. its entries were deleted): step back
+        log["page"] -= 1
+        st.rerun(scope="fragment")
+
+    table = pd.DataFrame.from_records(entries, columns=LOG_COLUMNS)
+    table["date"] = pd.to_datetime(table["date"]).dt.date
+    selection = st.dataframe(table, use_container_width=True, hide_index=True,
+                             on_select="rerun", selection_mode="multi-row",
+                             key=f"log_table_{log['page']}_{log['version']}")
+
+    has_next = start + page_size < len(window) or (log["page"] // pages_per_window + 1) in log["starts"]
+    pages = max(1, math.ceil((log["total"] or 0) / page_size))
+    first_col, prev_col, label_col, next_col, delete_col = st.columns([1, 1, 3, 1, 2])
+    if first_col.button("⏮ First", disabled=log["page"] == 0):
+        log["page"] = 0
+        st.rerun(scope="fragment")
+    if prev_col.button("◀ Prev", disabled=log["page"] == 0):
+        log["page"] -= 1
+        st.rerun(scope="fragment")
+    label_col.caption(f"Page {log['page'] + 1} of {pages} · {log['total']} entries")
+    if next_col.button("Next ▶", disabled=not has_next):
+        log["page"] += 1
+        st.rerun(scope="fragment")
+
+    selected = selection.selection.rows
+    if delete_col.button(f"🗑️ Delete selected ({len(selected)})", disabled=not selected):
         try:
-            delete_data_by_id(delete_id)
-            st.success("🗑️ Entry deleted successfully.")
-        except:
-            st.error("❌ Invalid ID or deletion failed.")
-else:
-    st.info("No entries yet. Add your first one from the sidebar.")
+            for row in selected:
+                delete_data_by_id(str(entries[row]["_id"]))
+            st.toast(f"🗑️ Deleted {len(selected)} entries.")
+        except Exception:
+            st.toast("❌ Deletion failed.")
+        st.rerun(scope="fragment")
+
+waste_log()
+
+# --- Debug panel: where this run spent its time (METRICS_ENABLED=1) ---
+if metrics.enabled():
+    with st.sidebar.expander("⏱️ Performance"):
+        timings = metrics.snapshot()
+        st.dataframe(timings["timings"], use_container_width=True, hide_index=True)
+        st.json(timings["caches"])
+        st.json({"jobs": scheduler.stats()})
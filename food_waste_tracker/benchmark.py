@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+"""
+Benchmarks for the data, API, chart and chatbot hot paths.
+
+    python benchmark.py --sizes 1000 100000 1000000 --output bench.json
+    python benchmark.py --backend mongomock --sizes 1000 20000
+    python benchmark.py --backend sqlite --sizes 100000 1000000
+    python benchmark.py --compare before.json after.json
+
+The memory backend (default) feeds synthetic entries straight to the
+DataFrame paths; the mongomock backend (needs the mongomock package) loads
+them into an in-process fake MongoDB first, and the sqlite backend into an
+in-memory SQLite store (storage.py), so initialize_data and the
+server-side API paths are measured too. None needs a live server.
+
+Each path is timed once with every cache cleared (cold), then `--repeat`
+more times (warm, median reported). Peak memory is the tracemalloc peak
+of a separate cold run. Results are written as JSON, tagged with the git
+commit, so runs can be compared across commits with --compare.
+"""
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_REPEAT = 5
+
+def _use_mongomock():
+    # Must run before food_waste_data / database create their client
+    import mongomock
+    import pymongo
+    pymongo.MongoClient = mongomock.MongoClient
+
+def _reset_caches():
+    import api
+    import food_waste_data
+    import forecast
+    import visualization
+    with food_waste_data._aggregates_lock:
+        food_waste_data._aggregates_memo.clear()
+    with visualization._chart_cache_lock:
+        visualization._chart_cache.clear()
+    api._sorted_memo.clear()
+    with forecast._fits_lock:
+        forecast._fits.clear()
+
+def _measure(func, repeat, reset=_reset_caches):
+    reset()
+    started = time.perf_counter()
+    func()
+    cold = time.perf_counter() - started
+
+    reset()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    warm = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        warm.append(time.perf_counter() - started)
+    return {
+        "cold_ms": cold * 1000,
+        "warm_ms": statistics.median(warm) * 1000 if warm else None,
+        "peak_mb": peak / 2 ** 20,
+    }
+
+# (name, callable) pairs over DataFrames shaped like initialize_data's
+def _frame_paths(dashboard, full):
+    import api
+    import chatbot
+    import food_waste_data
+    import visualization
+
+    first, last = dashboard["date"].min(), dashboard["date"].max()
+    window = (str((first + (last - first) / 3).date()), str((first + 2 * (last - first) / 3).date()))
+    return [
+        ("get_stats", lambda: food_waste_data.get_stats(dashboard)),
+        ("process_stats_api 30days", lambda: api.process_stats_api("30days", dashboard)),
+        ("process_stats_api window+week", lambda: api.process_stats_api("all", dashboard, *window, group_by="week")),
+        ("process_entries_api first page", lambda: api.process_entries_api({"limit": 50}, full)),
+        ("process_entries_api deep page", lambda: api.process_entries_api({"limit": 50, "offset": len(full) // 2}, full)),
+        ("process_entries_api by category", lambda: api.process_entries_api({"limit": 50, "category": "Dairy", "sort": "quantity"}, full)),
+        ("create_daily_chart", lambda: visualization.create_daily_chart(dashboard)),
+        ("create_category_chart", lambda: visualization.create_category_chart(dashboard)),
+        ("create_monthly_trend", lambda: visualization.create_monthly_trend(dashboard)),
+        ("process_forecast_api", lambda: api.process_forecast_api(14, dashboard)),
+        ("generate_data_specific_response", lambda: chatbot.generate_data_specific_response("what's my total waste", dashboard)),
+    ]
+
+def _server_paths():
+    import api
+    return [
+        ("process_stats_api server", lambda: api.process_stats_api("30days")),
+        ("process_entries_api server", lambda: api.process_entries_api({"limit": 50})),
+    ]
+
+def run_size(size, backend, repeat, seed=0):
+    import food_waste_data
+    import storage
+    import synthetic
+
+    entries = synthetic.generate_entries(size, seed=seed)
+    results = []
+
+    def record(path, measurement):
+        results.append({"size": size, "path": path, **measurement})
+        warm = measurement["warm_ms"]
+        warm = f"{warm:10.1f} ms" if warm is not None else f"{'-':>10}   "
+        print(f"{size:>10}  {path:<34} cold {measurement['cold_ms']:10.1f} ms"
+              f"  warm {warm}  peak {measurement['peak_mb']:8.1f} MB")
+
+    if backend != "memory":
+        if backend == "sqlite":
+            # A fresh in-memory database per size
+            food_waste_data.store = storage.create_storage("sqlite", ":memory:")
+        else:
+            food_waste_data.store.collection.delete_many({})
+        for start in range(0, size, 50000):
+            food_waste_data.store.insert_many(synthetic.to_documents(entries.iloc[start:start + 50000]))
+
+        def clear_data_caches():
+            _reset_caches()
+            with food_waste_data._cache_lock:
+                food_waste_data._caches.clear()
+
+        record("initialize_data", _measure(
+            lambda: food_waste_data.initialize_data(food_waste_data.DASHBOARD_COLUMNS),
+            0, reset=clear_data_caches))
+        record("initialize_data top-up", _measure(
+            lambda: food_waste_data.initialize_data(food_waste_data.DASHBOARD_COLUMNS), repeat))
+        dashboard = food_waste_data.initialize_data(food_waste_data.DASHBOARD_COLUMNS)
+        full = food_waste_data.initialize_data()
+        paths = _frame_paths(dashboard, full) + _server_paths()
+    else:
+        full = synthetic.typed_frame(entries)
+        dashboard = full[list(food_waste_data.DASHBOARD_COLUMNS)]
+        paths = _frame_paths(dashboard, full)
+
+    for path, func in paths:
+        record(path, _measure(func, repeat))
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run(sizes, backend="memory", repeat=DEFAULT_REPEAT, seed=0):
+    """Benchmark every hot path at each size and return the JSON report"""
+    if backend == "mongomock":
+        _use_mongomock()
+    elif backend == "sqlite":
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        os.environ["STORAGE_PATH"] = ":memory:"
+    import numpy
+    import pandas
+
+    results = []
+    for size in sizes:
+        results.extend(run_size(size, backend, repeat, seed))
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "backend": backend,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "pandas": pandas.__version__,
+        "numpy": numpy.__version__,
+        "machine": platform.platform(),
+        "results": results,
+    }
+
+def compare(before, after):
+    """Rows of (size, path, before ms, after ms, ratio) for cold and warm timings"""
+    old = {(r["size"], r["path"]): r for r in before["results"]}
+    rows = []
+    for r in after["results"]:
+        previous = old.get((r["size"], r["path"]))
+        if previous is None:
+            continue
+        for phase in ("cold_ms", "warm_ms"):
+            if previous.get(phase) and r.get(phase) is not None:
+                rows.append((r["size"], r["path"], phase[:-3], previous[phase], r[phase], r[phase] / previous[phase]))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Food Waste Tracker hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Entry counts to benchmark (1k to 10M)")
+    parser.add_argument("--backend", choices=["memory", "mongomock", "sqlite"], default="memory")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Warm runs per path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="Compare two JSON reports instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        print(f"{before.get('commit')} -> {after.get('commit')}")
+        for size, path, phase, old_ms, new_ms, ratio in compare(before, after):
+            print(f"{size:>10}  {path:<34} {phase:<4} {old_ms:10.1f} -> {new_ms:10.1f} ms  x{ratio:.2f}")
+        sys.exit(0)
+
+    report = run(args.sizes, args.backend, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {len(report['results'])} results to {args.output}")
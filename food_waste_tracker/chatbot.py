@@ -1,51 +1,41 @@
 import os
 import random
-import pandas as pd
-import requests
-from transformers import pipeline  # For local LLM fallback
 from dotenv import load_dotenv
+from food_waste_data import get_aggregates
+import llm_gateway
+import local_llm
+import metrics
+from response_cache import response_cache, make_key
+from intents import engine as intent_engine
 
 load_dotenv()
 
+# "online" (DeepSeek, then local LLM), "auto" (local LLM) or "offline"
+CHATBOT_MODE = os.getenv("CHATBOT_MODE", "auto")
+
 # ===== 1. First define all helper functions =====
 def get_answer_type(query):
     """Categorize user query for offline responses"""
-    query = query.lower()
-    if any(word in query for word in ["hello", "hi", "hey"]):
-        return "greeting"
-    elif any(word in query for word in ["waste", "quantity", "total"]):
-        return "waste_stats"
-    elif any(word in query for word in ["tip", "reduce", "prevent"]):
-        return "tips"
-    elif any(word in query for word in ["sustain", "planet", "eco"]):
-        return "sustainability"
-    return "fallback"
+    return intent_engine.answer_type(query)
 
 def generate_data_specific_response(query, waste_data):
     """Generate responses based on waste data analysis"""
     if waste_data is None or waste_data.empty:
         return None
         
-    query = query.lower()
     try:
-        if "total waste" in query:
-            total = waste_data["quantity_kg"].sum()
-            return f"Total recorded waste: {total:.2f} kg"
-            
-        elif "most wasted" in query:
-            if "category" in waste_data.columns:
-                top = waste_data.groupby("category")["quantity_kg"].sum().idxmax()
-                return f"Most wasted category: {top}"
-                
-        elif "average" in query:
-            if "date" in waste_data.columns:
-                avg = waste_data.groupby("date")["quantity_kg"].sum().mean()
-                return f"Average daily waste: {avg:.2f} kg"
-                
+        # Shared rollups, computed once per data version
+        return answer_from_aggregates(query, get_aggregates(waste_data))
     except Exception as e:
         print(f"Data analysis error: {e}")
     return None
 
+def answer_from_aggregates(query, aggregates):
+    """Answer data questions from precomputed WasteAggregates"""
+    if aggregates is None or aggregates.empty:
+        return None
+    return intent_engine.answer_from_aggregates(query, aggregates)
+
 # ===== 2. Then define constants =====
 responses = {
     "greeting": ["Hello! How can I help with food waste today?"],
@@ -55,60 +45,101 @@ responses = {
     "fallback": ["I'm not sure I understand. Ask about waste stats or tips!"]
 }
 
+DEEPSEEK_URL = llm_gateway.DEEPSEEK_URL
+
+def deepseek_payload(query):
+    """Request body for the DeepSeek chat completions API"""
+    return {
+        "model": "deepseek-chat",
+        "messages": [{
+            "role": "system",
+            "content": "You're a food waste expert assistant."
+        }, {
+            "role": "user",
+            "content": query
+        }],
+        "temperature": 0.7,
+        "max_tokens": 300
+    }
+
+def parse_deepseek_response(body):
+    """Answer text from a DeepSeek chat completions response body"""
+    return body["choices"][0]["message"]["content"].strip()
+
 # ===== 3. Finally define main chatbot function =====
+def data_fingerprint(waste_data):
+    """Fingerprint of the data an answer is based on, for the response cache"""
+    if waste_data is None or waste_data.empty:
+        return None
+    return get_aggregates(waste_data).fingerprint
+
+@metrics.timed()
 def get_chatbot_response(query, waste_data=None):
     """Main function to generate responses with fallback logic"""
-    MODE = os.getenv("CHATBOT_MODE", "auto")
+    return "".join(stream_chatbot_response(query, waste_data))
+
+def stream_chatbot_response(query, waste_data=None):
+    """Yield the answer in pieces, so the UI can show it while it is generated"""
+    MODE = CHATBOT_MODE
+    
+    # Repeated questions against unchanged data are answered from the cache
+    key = make_key(query, f"chatbot:{MODE}", data_fingerprint(waste_data))
+    cached = response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
     
     # 1. Try data-specific response first
     if waste_data is not None:
         data_response = generate_data_specific_response(query, waste_data)
         if data_response:
-            return data_response
+            response_cache.set(key, data_response)
+            yield data_response
+            return
     
     # 2. Try API/local LLM if in online mode
     if MODE != "offline":
-        # DeepSeek API attempt
-        api_key = os.getenv("DEEPSEEK_API_KEY")
-        if api_key and MODE == "online":
+        # DeepSeek API attempt, skipped while its circuit is open
+        if os.getenv("DEEPSEEK_API_KEY") and MODE == "online":
+            parts = []
             try:
-                response = requests.post(
-                    "https://api.deepseek.com/v1/chat/completions",
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    json={
-                        "model": "deepseek-chat",
-                        "messages": [{
-                            "role": "system",
-                            "content": "You're a food waste expert assistant."
-                        }, {
-                            "role": "user",
-                            "content": query
-                        }],
-                        "temperature": 0.7,
-                        "max_tokens": 300
-                    }
-                )
-                if response.status_code == 200:
-                    return response.json()["choices"][0]["message"]["content"].strip()
-            except Exception:
-                pass
+                for text in llm_gateway.deepseek_stream(deepseek_payload(query)):
+                    parts.append(text)
+                    yield text
+                answer = "".join(parts).strip()
+                if answer:
+                    response_cache.set(key, answer)
+                    return
+            except Exception as e:
+                print(f"DeepSeek error: {e}")
+            if parts:
+                # Part of the answer is already shown; don't append another one
+                return
         
-        # Local LLM fallback
-        try:
-            if not hasattr(get_chatbot_response, 'llm'):
-                get_chatbot_response.llm = pipeline(
-                    "text-generation",
-                    model="gpt2",
-                    device="cpu"
-                )
-            result = get_chatbot_response.llm(
-                f"Food waste question: {query}\nAnswer:",
-                max_length=100,
-                temperature=0.7
-            )
-            return result[0]['generated_text'].split("Answer:")[-1].strip()
-        except Exception as e:
-            print(f"LLM error: {e}")
+        answer = get_local_llm_response(query)
+        if answer is not None:
+            response_cache.set(key, answer)
+            yield answer
+            return
+    
+    # 3. Final offline fallback (not cached, so a recovered backend is used next time)
+    yield random.choice(responses[get_answer_type(query)])
+
+def get_local_llm_response(query):
+    """Local LLM answer, or None if the model is unavailable"""
+    try:
+        # Batched with concurrent prompts on the warmed-up worker thread
+        text = local_llm.generate(f"Food waste question: {query}\nAnswer:")
+        return text.split("Answer:")[-1].strip()
+    except Exception as e:
+        print(f"LLM error: {e}")
+    return None
+
+def get_local_response(query, mode="auto"):
+    """Local LLM answer, or a canned offline answer"""
+    if mode != "offline":
+        answer = get_local_llm_response(query)
+        if answer is not None:
+            return answer
     
-    # 3. Final offline fallback
-    return random.choice(responses[get_answer_type(query)])
\ No newline at end of file
+    return random.choice(responses[get_answer_type(query)])
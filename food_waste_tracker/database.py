@@ -1,7 +1,12 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReadPreference
+from pymongo import monitoring
 from dotenv import load_dotenv
 import os
+import threading
+import time
 from datetime import datetime, date
+import rollups
+from units import to_kg
 
 load_dotenv()
 
@@ -9,21 +14,183 @@ MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 DB_NAME = "food_waste_tracker"
 COLLECTION_NAME = "waste_entries"
 
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
-waste_collection = db[COLLECTION_NAME]
-
-def unit_to_kg(quantity, unit):
-    conversion_factors = {
-        "g": 0.001,
-        "kg": 1,
-        "mg": 0.000001,
-        "lb": 0.453592,
-        "oz": 0.0283495,
-        "ltr": 1,
-        "ml": 0.001
+# Connection pool and timeout settings (see the MongoClient docs)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0")) or None
+
+# Read preference for regular reads, and for the dashboard's analytical
+# reads (aggregations), which can go to secondaries under load.
+# Values: primary, primaryPreferred, secondary, secondaryPreferred, nearest
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+MONGO_ANALYTICS_READ_PREFERENCE = os.getenv("MONGO_ANALYTICS_READ_PREFERENCE", MONGO_READ_PREFERENCE)
+
+# Write concern: "w" as a number or "majority", optionally journaled
+MONGO_WRITE_CONCERN_W = os.getenv("MONGO_WRITE_CONCERN_W", "1")
+MONGO_WRITE_CONCERN_J = os.getenv("MONGO_WRITE_CONCERN_J", "").lower() in ("1", "true", "yes")
+
+_READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+class _PoolStats(monitoring.ConnectionPoolListener):
+    """Counts connection pool events for pool_stats()"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {
+            "open": 0,
+            "checked_out": 0,
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "pool_cleared": 0,
+        }
+
+    def _bump(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self.counts[key] += delta
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    # Events that do not change the counters
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(pool_cleared=1)
+
+    def connection_created(self, event):
+        self._bump(created=1, open=1)
+
+    def connection_closed(self, event):
+        self._bump(closed=1, open=-1)
+
+    def connection_checked_out(self, event):
+        self._bump(checkouts=1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._bump(checked_out=-1)
+
+    def connection_check_out_failed(self, event):
+        self._bump(checkout_failures=1)
+
+_pool_stats = _PoolStats()
+_client = None
+_client_lock = threading.Lock()
+
+def _write_concern_options():
+    w = MONGO_WRITE_CONCERN_W
+    options = {"w": int(w) if w.isdigit() else w}
+    if MONGO_WRITE_CONCERN_J:
+        options["journal"] = True
+    return options
+
+def read_preference(analytics=False):
+    """MONGO_READ_PREFERENCE, or MONGO_ANALYTICS_READ_PREFERENCE for aggregation reads"""
+    name = MONGO_ANALYTICS_READ_PREFERENCE if analytics else MONGO_READ_PREFERENCE
+    return _READ_PREFERENCES.get(name, ReadPreference.PRIMARY)
+
+def client_options():
+    """Pool, timeout, read preference and write concern settings, as client
+    keyword arguments (shared by the pymongo and motor clients)"""
+    return dict(
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        read_preference=read_preference(),
+        **_write_concern_options()
+    )
+
+def get_client():
+    """The process-wide MongoClient, created on first use.
+
+    connect=False defers the first connection until an operation needs it,
+    so importing modules never blocks on the server.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(
+                    MONGO_URI,
+                    connect=False,
+                    event_listeners=[_pool_stats],
+                    **client_options()
+                )
+    return _client
+
+def get_db():
+    return get_client()[DB_NAME]
+
+def get_collection(name=COLLECTION_NAME, analytics=False):
+    """A collection on the shared client.
+
+    analytics=True applies MONGO_ANALYTICS_READ_PREFERENCE, for aggregation
+    reads that may be served by secondaries.
+    """
+    db = get_db()
+    if analytics:
+        return db.get_collection(name, read_preference=read_preference(analytics=True))
+    return db[name]
+
+def pool_stats():
+    """Connection pool usage of the shared client"""
+    stats = _pool_stats.snapshot()
+    stats["max_pool_size"] = MONGO_MAX_POOL_SIZE
+    stats["client_created"] = _client is not None
+    return stats
+
+def health_check():
+    """Ping the server and report latency and pool usage"""
+    started = time.perf_counter()
+    try:
+        get_client().admin.command("ping")
+        status = "ok"
+        error = None
+    except Exception as e:
+        status = "error"
+        error = str(e)
+    return {
+        "status": status,
+        "error": error,
+        "ping_ms": round((time.perf_counter() - started) * 1000, 2),
+        "pool": pool_stats(),
     }
-    return quantity * conversion_factors.get(unit, 1)
+
+client = get_client()
+db = get_db()
+waste_collection = get_collection()
+rollup_collection = get_collection(rollups.ROLLUP_COLLECTION_NAME)
+
+def unit_to_kg(quantity, unit, food_item=None):
+    return to_kg(quantity, unit, food_item)
 
 def add_waste_entry_to_db(food_item, category, quantity, unit, quantity_kg, date, reason, notes):
     entry = {
@@ -37,8 +204,11 @@ def add_waste_entry_to_db(food_item, category, quantity, unit, quantity_kg, date
         "notes": notes,
         "entry_timestamp": datetime.utcnow()
     }
-    result = waste_collection.insert_one(entry)
-    return str(result.inserted_id)
+    def write(session):
+        result = waste_collection.insert_one(entry, session=session)
+        rollups.apply_entries(rollup_collection, [entry], session=session)
+        return str(result.inserted_id)
+    return rollups.write_together(waste_collection, write)
 
 def get_all_waste_entries():
     return list(waste_collection.find())
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+"""
+Date-sorted index over the waste cube for arbitrary time windows.
+
+Rows of the (date, category, reason) cube are sorted by date once and
+prefix sums of quantity_kg and entry counts are kept next to them, overall
+and per category / reason. The total of any [start, end) window is then
+two binary searches and a subtraction, and week or month buckets are one
+vectorized searchsorted over the bucket edges.
+"""
+
+BUCKETS = {"week": "W-MON", "month": "MS"}
+GROUPS = ("category", "reason")
+
+def _prefix(values):
+    return np.concatenate([[0], np.cumsum(values)])
+
+class _Sorted:
+    """Sorted dates with prefix sums of quantity and count"""
+
+    def __init__(self, dates, quantity, count):
+        self.dates = dates
+        self.quantity = _prefix(quantity)
+        self.count = _prefix(count)
+
+    def span(self, start, end):
+        lo = 0 if start is None else int(np.searchsorted(self.dates, start, side="left"))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, end, side="left"))
+        return lo, max(lo, hi)
+
+    def total(self, start, end):
+        lo, hi = self.span(start, end)
+        return float(self.quantity[hi] - self.quantity[lo]), int(self.count[hi] - self.count[lo])
+
+class DateIndex:
+    """Range totals, grouped totals and calendar buckets of a waste cube"""
+
+    def __init__(self, cube):
+        """
+        Args:
+            cube (pd.DataFrame): `date`, `category`, `reason`, `quantity_kg`
+                and `count` columns, as held by WasteAggregates
+        """
+        if cube.empty or "date" not in cube.columns:
+            cube = pd.DataFrame({"date": pd.to_datetime([]), "quantity_kg": [], "count": []})
+        dates = pd.to_datetime(cube["date"], errors="coerce")
+        cube = cube.assign(date=dates)[dates.notna()].sort_values("date", kind="stable")
+
+        date_values = cube["date"].to_numpy(dtype="datetime64[ns]")
+        quantity = cube["quantity_kg"].to_numpy(dtype="float64")
+        count = cube["count"].to_numpy(dtype="int64")
+        self.rows = _Sorted(date_values, quantity, count)
+        # Distinct dates, for the "average per logged day" statistic
+        self.distinct_dates = np.unique(date_values)
+
+        self.groups = {}
+        for key in GROUPS:
+            if key not in cube.columns:
+                continue
+            codes, labels = pd.factorize(cube[key], use_na_sentinel=False)
+            self.groups[key] = {
+                label: _Sorted(date_values[codes == i], quantity[codes == i], count[codes == i])
+                for i, label in enumerate(labels)
+            }
+
+    @property
+    def empty(self):
+        return len(self.rows.dates) == 0
+
+    def bounds(self):
+        """(first, last) date in the index, or (None, None)"""
+        if self.empty:
+            return None, None
+        return pd.Timestamp(self.rows.dates[0]), pd.Timestamp(self.rows.dates[-1])
+
+    def total(self, start=None, end=None):
+        """(quantity_kg, count) of entries with start <= date < end"""
+        return self.rows.total(_as_datetime64(start), _as_datetime64(end))
+
+    def days(self, start=None, end=None):
+        """Number of distinct dates with entries in the window"""
+        lo = 0 if start is None else np.searchsorted(self.distinct_dates, _as_datetime64(start), side="left")
+        hi = len(self.distinct_dates) if end is None else np.searchsorted(self.distinct_dates, _as_datetime64(end), side="left")
+        return int(max(0, hi - lo))
+
+    def by(self, key, start=None, end=None):
+        """Total quantity_kg per category or reason in the window"""
+        start, end = _as_datetime64(start), _as_datetime64(end)
+        totals = {}
+        for label, rows in self.groups.get(key, {}).items():
+            quantity, count = rows.total(start, end)
+            if count:
+                totals[label] = quantity
+        return pd.Series(dict(sorted(totals.items(), key=lambda item: str(item[0]))), dtype="float64")
+
+    def buckets(self, freq, start=None, end=None):
+        """Total quantity_kg per week (starting Monday) or calendar month"""
+        if freq not in BUCKETS:
+            raise ValueError(f"Unknown bucket {freq!r}, expected one of {sorted(BUCKETS)}")
+        first, last = self.bounds()
+        if first is None:
+            return pd.Series(dtype="float64")
+
+        start = max(pd.Timestamp(_as_datetime64(start)), first) if start is not None else first
+        stop = last + pd.Timedelta(1)
+        if end is not None:
+            stop = min(pd.Timestamp(_as_datetime64(end)), stop)
+        if start >= stop:
+            return pd.Series(dtype="float64")
+
+        # Buckets start at the week/month containing `start`; the first and
+        # last bucket are clipped to the window
+        if freq == "month":
+            anchor = start.normalize().replace(day=1)
+        else:
+            anchor = start.normalize() - pd.Timedelta(days=start.weekday())
+        starts = pd.date_range(anchor, stop, freq=BUCKETS[freq])
+        inner = starts[(starts > start) & (starts < stop)]
+        labels = inner.insert(0, anchor)
+        edges = np.concatenate([
+            [np.datetime64(start.to_datetime64(), "ns")],
+            inner.to_numpy(dtype="datetime64[ns]"),
+            [np.datetime64(stop.to_datetime64(), "ns")]
+        ])
+
+        positions = np.searchsorted(self.rows.dates, edges, side="left")
+        sums = np.diff(self.rows.quantity[positions])
+        fmt = "%Y-%m" if freq == "month" else "%Y-%m-%d"
+        return pd.Series(sums, index=labels.strftime(fmt), dtype="float64")
+
+    def stats(self, start=None, end=None):
+        """process_stats_api numbers for the window"""
+        total, count = self.total(start, end)
+        if count == 0:
+            return None
+        by_category = self.by("category", start, end)
+        days = self.days(start, end)
+        return {
+            "total_waste_kg": total,
+            "avg_daily_waste_kg": total / days if days else 0.0,
+            "most_wasted_category": by_category.idxmax() if len(by_category) else "N/A",
+            "waste_by_category": {k: float(v) for k, v in by_category.items()},
+            "waste_by_reason": {k: float(v) for k, v in self.by("reason", start, end).items()},
+            "entry_count": count,
+        }
+
+# Window bound as naive datetime64[ns] (dates are stored naive, in UTC)
+def _as_datetime64(value):
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert("UTC").tz_localize(None)
+    return value.to_datetime64().astype("datetime64[ns]")
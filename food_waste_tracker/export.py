@@ -0,0 +1,218 @@
+import argparse
+import os
+import sys
+from itertools import islice
+import pandas as pd
+import food_waste_data
+import mongo_pipelines
+from food_waste_data import ALL_COLUMNS, DATE_COLUMNS, FLOAT_COLUMNS
+
+"""
+Streaming export of waste entries for audits.
+
+    python export.py entries.csv
+    python export.py entries.parquet --period year --category Dairy
+    python export.py entries.jsonl --batch-size 50000
+
+Entries are read from a database cursor in (date, _id) order, `batch_size`
+documents at a time, and each batch is encoded and written before the next
+one is read, so memory stays bounded however many entries there are. CSV
+and JSONL are written as plain text chunks; Parquet (needs pyarrow) gets
+one row group per batch. The server streams the same encoding from
+GET /api/export.
+"""
+
+# Content type of each export format
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Documents read, encoded and written at a time
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+
+EXPORT_SORT = [("date", 1), ("_id", 1)]
+
+# Format from the file extension unless given explicitly
+def detect_format(path, file_format=None):
+    if file_format:
+        return file_format
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    return {"ndjson": "jsonl", "pq": "parquet"}.get(extension, extension if extension in FORMATS else "csv")
+
+# Filter for an export: a stats period and optionally one category
+def export_match(period="all", category=None):
+    match = mongo_pipelines.period_match(period or "all")
+    if category:
+        match["category"] = category
+    return match
+
+# One batch of raw documents as a frame with a fixed column layout
+def entries_frame(docs, columns=ALL_COLUMNS):
+    frame = pd.DataFrame.from_records(docs, columns=list(columns))
+    if "_id" in frame.columns:
+        frame["_id"] = frame["_id"].map(lambda value: None if value is None else str(value))
+    for name in frame.columns:
+        if name in DATE_COLUMNS:
+            frame[name] = pd.to_datetime(frame[name], errors="coerce")
+        elif name in FLOAT_COLUMNS:
+            frame[name] = pd.to_numeric(frame[name], errors="coerce")
+    return frame
+
+# Dates as text for CSV / JSONL: the entry date as YYYY-MM-DD, as
+# importer.py reads it back, and the timestamp to the second
+def _text_dates(frame):
+    formats = {"date": "%Y-%m-%d", "entry_timestamp": "%Y-%m-%dT%H:%M:%S"}
+    return frame.assign(**{name: frame[name].dt.strftime(fmt)
+                           for name, fmt in formats.items() if name in frame.columns})
+
+class _CSVWriter:
+    """CSV text, header with the first batch"""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.header = True
+
+    def write(self, frame):
+        text = _text_dates(frame).to_csv(index=False, header=self.header)
+        self.header = False
+        return text.encode("utf-8")
+
+    def close(self):
+        # An empty export still gets its header
+        return self.write(entries_frame([], self.columns)) if self.header else b""
+
+class _JSONLWriter:
+    """One JSON object per line"""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+    def write(self, frame):
+        if frame.empty:
+            return b""
+        text = _text_dates(frame).to_json(orient="records", lines=True)
+        return (text if text.endswith("\n") else text + "\n").encode("utf-8")
+
+    def close(self):
+        return b""
+
+class _ChunkSink:
+    """Write-only file handing back what was written since the last take()"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def readable(self):
+        return False
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+class _ParquetWriter:
+    """Parquet file, one row group per batch"""
+
+    def __init__(self, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        types = {name: pa.string() for name in columns}
+        types.update({name: pa.float64() for name in FLOAT_COLUMNS if name in types})
+        types.update({name: pa.timestamp("us") for name in DATE_COLUMNS if name in types})
+        self.schema = pa.schema([(name, types[name]) for name in columns])
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema)
+
+    def write(self, frame):
+        if frame.empty:
+            return b""
+        table = self.pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+        self.writer.write_table(table, row_group_size=len(frame))
+        return self.sink.take()
+
+    def close(self):
+        self.writer.close()
+        return self.sink.take()
+
+_WRITERS = {"csv": _CSVWriter, "jsonl": _JSONLWriter, "parquet": _ParquetWriter}
+
+def make_writer(file_format, columns=ALL_COLUMNS):
+    """Encoder with write(frame) -> bytes per batch and close() -> trailing bytes"""
+    if file_format not in _WRITERS:
+        raise ValueError(f"Unknown export format {file_format!r}, expected one of {sorted(_WRITERS)}")
+    return _WRITERS[file_format](columns)
+
+# Matching documents from the store, `batch_size` at a time
+def iter_batches(match=None, batch_size=EXPORT_BATCH_SIZE, columns=ALL_COLUMNS, store=None):
+    store = store if store is not None else food_waste_data.store
+    cursor = iter(store.find(match, list(columns), EXPORT_SORT, batch_size=batch_size))
+    while True:
+        docs = list(islice(cursor, batch_size))
+        if not docs:
+            break
+        yield docs
+
+def stream_export(file_format="csv", match=None, batch_size=EXPORT_BATCH_SIZE, columns=ALL_COLUMNS):
+    """Yield the encoded export in chunks of at most `batch_size` entries"""
+    writer = make_writer(file_format, columns)
+    for docs in iter_batches(match, batch_size, columns):
+        chunk = writer.write(entries_frame(docs, columns))
+        if chunk:
+            yield chunk
+    tail = writer.close()
+    if tail:
+        yield tail
+
+def export_file(path, file_format=None, period="all", category=None, batch_size=EXPORT_BATCH_SIZE):
+    """Write matching entries to `path` and return how many were written"""
+    file_format = detect_format(path, file_format)
+    writer = make_writer(file_format)
+    rows = 0
+    with open(path, "wb") as f:
+        for docs in iter_batches(export_match(period, category), batch_size):
+            f.write(writer.write(entries_frame(docs)))
+            rows += len(docs)
+        f.write(writer.close())
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export waste entries to CSV, JSONL or Parquet")
+    parser.add_argument("path", help="Output file (.csv, .jsonl or .parquet)")
+    parser.add_argument("--format", choices=sorted(FORMATS), help="Override the format detected from the extension")
+    parser.add_argument("--period", default="all", help="7days, 30days, month, year or all")
+    parser.add_argument("--category", help="Only export this category")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    try:
+        rows = export_file(args.path, args.format, args.period, args.category, args.batch_size)
+    except ImportError as e:
+        sys.exit(f"Parquet export needs pyarrow: {e}")
+    print(f"Exported {rows} entries to {args.path}")
@@ -1,26 +1,86 @@
-from pymongo import MongoClient
-from bson.objectid import ObjectId
+import threading
+import time
+import weakref
+from itertools import islice
+import numpy as np
 import pandas as pd
 from datetime import datetime
+import mongo_pipelines
+import rollups
+import metrics
+from database import get_client, get_db, get_collection
+from storage import get_storage
+from aggregates import WasteAggregates
+from units import to_kg, to_kg_batch
 
-# MongoDB setup
-client = MongoClient("mongodb://localhost:27017/")
-db = client["food_waste_tracker"]
-collection = db["waste_entries"]
-
-# Convert unit to kg
-def convert_to_kg(quantity, unit):
-    factors = {
-        "kg": 1,
-        "lbs": 0.453592,
-        "servings": 0.25,
-        "items": 0.15
-    }
-    return quantity * factors.get(unit.lower(), 1)
+# MongoDB setup (shared, lazily connecting client from database.py)
+client = get_client()
+db = get_db()
+collection = get_collection()
+rollup_collection = get_collection(rollups.ROLLUP_COLLECTION_NAME)
+
+# Where entries are read and written: MongoDB, or an embedded SQLite /
+# DuckDB database (STORAGE_BACKEND, see storage.py)
+store = get_storage()
+
+_indexes_ready = False
+
+# Create the collection indexes, once per process
+def ensure_indexes():
+    global _indexes_ready
+    if not _indexes_ready:
+        store.ensure_indexes()
+        _indexes_ready = True
+
+# Column layout of a waste entry and the dtype each one is decoded into
+ALL_COLUMNS = (
+    "_id", "food_item", "category", "quantity", "unit",
+    "quantity_kg", "date", "reason", "notes", "entry_timestamp"
+)
+CATEGORICAL_COLUMNS = ("category", "unit", "reason")
+FLOAT_COLUMNS = ("quantity", "quantity_kg")
+DATE_COLUMNS = ("date", "entry_timestamp")
+
+# Everything the dashboard (stats, charts, chatbot) reads; notably no notes
+DASHBOARD_COLUMNS = ("_id", "date", "category", "reason", "quantity_kg")
+
+# Documents decoded per batch while reading a cursor
+DEFAULT_BATCH_SIZE = 5000
+
+# Documents sent per insert_many call by add_waste_entries
+DEFAULT_INSERT_BATCH_SIZE = 1000
+
+# Fields every new entry must provide
+REQUIRED_FIELDS = ('food_item', 'category', 'quantity', 'unit', 'date', 'reason')
 
-# Add a new entry to MongoDB
+# Process-wide cache of the materialized entries, one per column projection.
+# Streamlit reruns app.py on every interaction but keeps imported modules
+# alive, so each DataFrame is built once and then only topped up with
+# entries newer than its watermark.
+_cache_lock = threading.RLock()
+_caches = {}
+_version = 0
+
+# Signalled on every version bump, whether the change was written by this
+# process or picked up by the watcher
+_changed = threading.Condition(_cache_lock)
+
+# Memoized WasteAggregates keyed by the DataFrame (or server match) they
+# were computed from, valid for as long as the data version is unchanged.
+# Server-side results also expire after a few seconds since other
+# terminals may write to the collection.
+_aggregates_lock = threading.Lock()
+_aggregates_memo = {}
+AGGREGATES_MEMO_SIZE = 8
+SERVER_AGGREGATES_TTL = 5
+
+# Convert unit to kg (see units.py for the conversion table)
+def convert_to_kg(quantity, unit, food_item=None):
+    return to_kg(quantity, unit, food_item)
+
+# Add a new entry to the database
 def add_waste_entry(_, food_item, category, quantity, unit, date, reason, notes):
-    quantity_kg = convert_to_kg(quantity, unit)
+    quantity_kg = convert_to_kg(quantity, unit, food_item)
     dt = date if isinstance(date, datetime) else datetime.combine(date, datetime.min.time())
 
     entry = {
@@ -34,37 +94,476 @@ def add_waste_entry(_, food_item, category, quantity, unit, date, reason, notes)
         "notes": notes,
         "entry_timestamp": datetime.utcnow()
     }
-    collection.insert_one(entry)
-
-# Load all entries from MongoDB as DataFrame
-def initialize_data():
-    data = list(collection.find())
-    for item in data:
-        item["_id"] = str(item["_id"])
-    df = pd.DataFrame(data)
-
-    # Ensure date is datetime
-    if "date" in df.columns:
-        df["date"] = pd.to_datetime(df["date"], errors='coerce')
+    store.insert_one(entry)
+    _append_to_cache([entry])
+
+# Validate and convert a batch of raw rows column-wise.
+# Returns the ready-to-insert documents and {row label: error message}.
+def prepare_entries(rows):
+    errors = pd.Series(None, index=rows.index, dtype=object)
+
+    def fail(mask, message):
+        errors[mask & errors.isna()] = message
+
+    for field in REQUIRED_FIELDS:
+        if field not in rows.columns:
+            fail(pd.Series(True, index=rows.index), f"Missing required field: {field}")
+        else:
+            values = rows[field]
+            fail(values.isna() | (values.astype(str).str.strip() == ""),
+                 f"Missing required field: {field}")
+
+    quantity = pd.Series(float("nan"), index=rows.index)
+    dates = pd.Series(pd.NaT, index=rows.index)
+    if "quantity" in rows.columns:
+        quantity = pd.to_numeric(rows["quantity"], errors="coerce")
+        fail(quantity.isna(), "Invalid quantity")
+    if "date" in rows.columns:
+        dates = pd.to_datetime(rows["date"].astype(str), format="%Y-%m-%d", errors="coerce")
+        fail(dates.isna(), "Invalid date format. Use YYYY-MM-DD")
+
+    valid = errors.isna()
+    rows, quantity, dates = rows[valid], quantity[valid], dates[valid]
+    if rows.empty:
+        return [], errors.dropna().to_dict()
+
+    unit = rows["unit"].astype(str)
+    food_item = rows["food_item"].astype(str)
+    quantity_kg = to_kg_batch(quantity.to_numpy(), unit.to_numpy(), food_item.to_numpy())
+    notes = rows["notes"].fillna("") if "notes" in rows.columns else pd.Series("", index=rows.index)
+    now = datetime.utcnow()
+
+    columns = {
+        "food_item": food_item.tolist(),
+        "category": rows["category"].astype(str).tolist(),
+        "quantity": quantity.astype(float).tolist(),
+        "unit": unit.tolist(),
+        "quantity_kg": quantity_kg.tolist(),
+        "date": list(dates.dt.to_pydatetime()),
+        "reason": rows["reason"].astype(str).tolist(),
+        "notes": notes.astype(str).tolist()
+    }
+    docs = [dict(zip(columns, values), entry_timestamp=now) for values in zip(*columns.values())]
+    # Keep the row labels so insert failures can be reported per row
+    return list(zip(rows.index, docs)), errors.dropna().to_dict()
+
+# Add many entries at once. `rows` is a DataFrame (or list of dicts) with
+# the add_waste_entry fields; its index labels identify rows in the report.
+# Entries are validated column-wise and written with unordered insert_many
+# batches, so one bad row does not stop the rest.
+def add_waste_entries(rows, batch_size=DEFAULT_INSERT_BATCH_SIZE):
+    if not isinstance(rows, pd.DataFrame):
+        rows = pd.DataFrame(list(rows))
+
+    labelled, errors = prepare_entries(rows)
+    inserted = []
+
+    for start in range(0, len(labelled), batch_size):
+        batch = labelled[start:start + batch_size]
+        docs = [doc for _, doc in batch]
+        failed = store.insert_many(docs)
+        for i, message in failed.items():
+            errors[batch[i][0]] = message
+        inserted.extend(doc for i, doc in enumerate(docs) if i not in failed)
+
+    if inserted:
+        _append_to_cache(inserted)
+
+    return {
+        "inserted": len(inserted),
+        "errors": [{"row": row, "error": message} for row, message in sorted(errors.items())]
+    }
+
+# Decode one column of raw values into its typed representation
+def _typed_column(name, values):
+    if name == "_id":
+        return pd.Series([None if v is None else str(v) for v in values], dtype=object)
+    if name in CATEGORICAL_COLUMNS:
+        return pd.Series(pd.Categorical(values))
+    if name in FLOAT_COLUMNS:
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").astype("float64")
+    if name in DATE_COLUMNS:
+        return pd.Series(pd.to_datetime(values, errors="coerce"))
+    return pd.Series(values, dtype=object)
+
+# Build a typed DataFrame from a batch of raw Mongo documents
+def _decode_batch(docs, columns=None):
+    if columns is None:
+        # Unprojected read: known columns first, then anything extra
+        columns = list(ALL_COLUMNS)
+        for doc in docs:
+            columns.extend(key for key in doc if key not in columns)
+    return pd.DataFrame({name: _typed_column(name, [doc.get(name) for doc in docs])
+                         for name in columns})
+
+# Concatenate typed frames, keeping categorical columns categorical
+def _concat_frames(frames):
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return None
+    if len(frames) == 1:
+        return frames[0]
+
+    for name in CATEGORICAL_COLUMNS:
+        if not all(name in frame.columns for frame in frames):
+            continue
+        union = pd.api.types.union_categoricals(
+            [frame[name].array for frame in frames]
+        ).categories
+        frames = [frame.assign(**{name: frame[name].cat.set_categories(union)})
+                  for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+# Empty frame with the typed layout of the given columns
+def _empty_frame(columns=None):
+    return _decode_batch([], list(columns) if columns is not None else None)
+
+# Read matching documents in batches and decode them into a typed DataFrame.
+# Returns the frame and the last raw document seen (for watermarks).
+def _fetch(columns=None, query=None, sort=None, batch_size=DEFAULT_BATCH_SIZE):
+    cursor = store.find(query, columns, sort, batch_size=batch_size)
+
+    frames, last_doc = [], None
+    while True:
+        with metrics.span(f"{store.name}.fetch") as fetch_span:
+            batch = list(islice(cursor, batch_size))
+            fetch_span.rows = len(batch)
+        if not batch:
+            break
+        last_doc = batch[-1]
+        with metrics.span("dataframe.decode") as decode_span:
+            frames.append(_decode_batch(batch, columns))
+            decode_span.rows = len(batch)
+
+    with metrics.span("dataframe.concat"):
+        return _concat_frames(frames), last_doc
+
+# Cache slot for a column projection (None means every column)
+def _cache_key(columns):
+    return None if columns is None else frozenset(columns)
+
+# Query matching documents a cache slot has not seen yet
+def _newer_than_watermark(state):
+    if state["df"] is None:
+        return {}
+    if state["last_ts"] is None:
+        # Only legacy documents without a timestamp were loaded so far
+        return {"entry_timestamp": {"$ne": None}}
+    return {"$or": [
+        {"entry_timestamp": {"$gt": state["last_ts"]}},
+        {"entry_timestamp": state["last_ts"], "_id": {"$gt": state["last_id"]}},
+    ]}
+
+# Move the data version on and wake wait_for_change() callers.
+# The caller holds _cache_lock.
+def _bump_version():
+    global _version
+    _version += 1
+    _changed.notify_all()
+
+# Swap in a new cached DataFrame with the given rows appended
+def _extend_cache(state, frame):
+    if frame is None or frame.empty:
+        return
+    old_df = state["df"]
+    state["df"] = _concat_frames([old_df, frame])
+    _bump_version()
+    _carry_aggregates(old_df, state["df"], added=frame)
+
+# Make freshly inserted entries visible without another round trip.
+# `dedupe` skips entries a cache already holds (e.g. reported twice by the
+# change stream and the watermark fetch).
+def _append_to_cache(docs, dedupe=False):
+    with _cache_lock:
+        for state in _caches.values():
+            if state["df"] is None:
+                continue
+            batch = docs
+            if dedupe and not state["df"].empty:
+                ids = state["df"]["_id"]
+                known = set(ids[ids.isin([str(doc["_id"]) for doc in docs])])
+                batch = [doc for doc in docs if str(doc["_id"]) not in known]
+            if not batch:
+                continue
+            frame = _decode_batch(batch, state["columns"])
+            frame = frame.drop(columns=state["hidden"])
+            state["pending"].update(str(doc["_id"]) for doc in batch)
+            _extend_cache(state, frame)
+
+# Drop deleted entries from the cached DataFrames
+def _drop_from_cache(id_strs):
+    with _cache_lock:
+        for state in _caches.values():
+            df = state["df"]
+            state["pending"].difference_update(id_strs)
+            if state["fetching"]:
+                # A top-up in flight may have read these before they were deleted
+                state["dropped"].update(id_strs)
+            if df is None or df.empty:
+                continue
+            keep = ~df["_id"].isin(id_strs)
+            if not keep.all():
+                state["df"] = df[keep].reset_index(drop=True)
+                _bump_version()
+                _carry_aggregates(df, state["df"], removed=df[~keep])
+
+# Carry the memoized rollups of a cached DataFrame over to its replacement
+# by applying only the added / removed rows to the small cube
+def _carry_aggregates(old_df, new_df, added=None, removed=None):
+    with _aggregates_lock:
+        hit = _aggregates_memo.get(id(old_df))
+    if hit is None or hit[0]() is not old_df:
+        return
+
+    aggregates = hit[3]
+    if added is not None:
+        aggregates = aggregates.combine(WasteAggregates.from_frame(added))
+    if removed is not None:
+        aggregates = aggregates.combine(WasteAggregates.from_frame(removed), sign=-1)
+
+    with _aggregates_lock:
+        _aggregates_memo.pop(id(old_df), None)
+        _aggregates_memo[id(new_df)] = (weakref.ref(new_df), _version, float("inf"), aggregates)
+
+# Load entries from the database as a typed DataFrame.
+# Pass `columns` to project the read down to what the caller needs.
+# The first call per projection reads the whole collection; later calls only
+# fetch documents newer than the last seen (entry_timestamp, _id) pair.
+@metrics.timed()
+def initialize_data(columns=None):
+    key = _cache_key(columns)
+    with _cache_lock:
+        state = _caches.get(key)
+        if state is None:
+            fetched = None
+            hidden = []
+            if columns is not None:
+                # _id and entry_timestamp drive the watermark and in-place deletes
+                fetched = list(dict.fromkeys(["_id", *columns, "entry_timestamp"]))
+                hidden = [name for name in fetched if name not in columns and name != "_id"]
+            state = _caches[key] = {
+                "df": None,         # materialized DataFrame, replaced (never mutated) on change
+                "columns": fetched,  # projection sent to the database
+                "hidden": hidden,   # fetched only for bookkeeping, dropped from the frame
+                "last_ts": None,    # entry_timestamp of the newest fetched document
+                "last_id": None,    # _id of the newest fetched document (tie-breaker)
+                "pending": set(),   # ids appended locally that the watermark has not passed yet
+                "fetching": 0,      # top-ups currently reading from the database
+                "dropped": set(),   # ids deleted while a top-up was reading
+            }
+
+        if state["df"] is None:
+            # First load: keep the lock so concurrent callers don't each
+            # read the whole collection
+            _top_up(state, columns)
+            return state["df"]
+
+    _top_up(state, columns)
+    return state["df"]
+
+def _watermark(state):
+    return state["df"] is None, state["last_ts"], state["last_id"]
+
+# Fetch what a cache slot has not seen yet and append it. The database is
+# read without holding _cache_lock; if another top-up moves the watermark
+# in the meantime, the read is repeated from the new watermark.
+def _top_up(state, columns=None):
+    while True:
+        with _cache_lock:
+            watermark = _watermark(state)
+            query = _newer_than_watermark(state)
+            if not state["fetching"]:
+                state["dropped"].clear()
+            state["fetching"] += 1
+        try:
+            frame, newest = _fetch(state["columns"], query, sort=[("entry_timestamp", 1), ("_id", 1)])
+            with _cache_lock:
+                if _watermark(state) == watermark:
+                    _apply_top_up(state, frame, newest, columns)
+                    return
+        finally:
+            with _cache_lock:
+                state["fetching"] -= 1
+
+# Append a fetched batch to a cache slot and move its watermark (holding _cache_lock)
+def _apply_top_up(state, frame, newest, columns=None):
+    if newest is not None:
+        state["last_ts"] = newest.get("entry_timestamp")
+        state["last_id"] = newest["_id"]
+        frame = frame.drop(columns=state["hidden"])
+
+        # Skip entries this process already appended on insert
+        pending = state["pending"]
+        if pending:
+            seen = frame["_id"].isin(pending)
+            pending.difference_update(frame["_id"])
+            frame = frame[~seen]
+        if state["dropped"]:
+            frame = frame[~frame["_id"].isin(state["dropped"])]
+
+    if state["df"] is None:
+        state["df"] = frame if frame is not None else _empty_frame(columns)
+        _bump_version()
     else:
-        df["date"] = pd.NaT
+        _extend_cache(state, frame)
+
+# Bring every loaded cache slot up to date: fetch entries past each
+# watermark and drop entries that were deleted elsewhere. Used by the
+# watcher when change streams are not available. The database reads run
+# outside _cache_lock, which is only taken to apply what they returned.
+def poll_caches():
+    with _cache_lock:
+        states = [state for state in _caches.values() if state["df"] is not None]
+    if not states:
+        return
+    for state in states:
+        _top_up(state)
 
-    return df
+    # Deletes: only list ids when the row counts disagree. The cached ids
+    # are taken first, so entries inserted during the read aren't dropped.
+    cached = states[0]["df"]["_id"]
+    if len(cached) > store.estimated_count():
+        cached = set(cached)
+        live = {str(doc["_id"]) for doc in store.find(columns=["_id"])}
+        _drop_from_cache(list(cached - live))
 
-# Get summary stats
-def get_stats(df):
-    if df.empty:
-        return 0, 0, "N/A"
+# Apply changes reported by the watcher to the cached DataFrames
+def apply_changes(inserted=(), deleted_ids=()):
+    with _cache_lock:
+        if inserted:
+            _append_to_cache(list(inserted), dedupe=True)
+        if deleted_ids:
+            _drop_from_cache([str(i) for i in deleted_ids])
+        return _version
 
-    total = df["quantity_kg"].sum()
-    daily_avg = df.groupby("date")["quantity_kg"].sum().mean()
-    top_cat = df.groupby("category")["quantity_kg"].sum().idxmax()
-    return total, daily_avg, top_cat
+# The cached DataFrame of a projection as it is now, without asking the database
+# for newer entries (the watcher keeps it current); loads it on first use
+def get_cached_data(columns=None):
+    with _cache_lock:
+        state = _caches.get(_cache_key(columns))
+        if state is not None and state["df"] is not None:
+            return state["df"]
+    return initialize_data(columns)
+
+# One page of raw entries straight from the database, using the (field, _id)
+# indexes for both the filter and the sort. Pass `after` as the
+# (sort value, ObjectId) of the previous page's last entry to seek to the
+# next page instead of skipping over the earlier ones.
+def find_entries(match=None, sort="date", ascending=False, skip=0, limit=10, after=None):
+    query, sort_spec = mongo_pipelines.page_query(match, sort, ascending, after)
+    if after is not None:
+        skip = 0
+    return list(store.find(query, sort=sort_spec, skip=skip, limit=limit))
+
+# Number of entries matching a filter
+def count_entries(match=None):
+    return store.count(match)
+
+# Whether there are any entries at all (reads at most one id)
+def has_entries():
+    return next(iter(store.find(columns=["_id"], limit=1)), None) is not None
+
+# Drop the caches so the next load re-reads the whole collection
+def refresh_data(columns=None):
+    with _cache_lock:
+        _caches.clear()
+    return initialize_data(columns)
+
+# Version of the cached data, bumped whenever rows are added or removed
+def get_data_version():
+    return _version
+
+# Block until the data version differs from `version` (or `timeout` seconds
+# pass) and return the current version
+def wait_for_change(version, timeout=None):
+    with _changed:
+        _changed.wait_for(lambda: _version != version, timeout)
+        return _version
+
+# All rollups of a DataFrame, computed in one pass and shared by every
+# consumer until the data version changes. Without a DataFrame the rollups
+# are grouped by the database (optionally filtered by a $match).
+# DataFrames returned by initialize_data are never mutated, so their
+# identity is a safe memo key.
+def get_aggregates(df=None, match=None):
+    version = _version
+    if df is not None:
+        key = id(df)
+    else:
+        key = ("server", repr(sorted((match or {}).items())))
+
+    with _aggregates_lock:
+        hit = _aggregates_memo.get(key)
+        if hit is not None:
+            ref, hit_version, expires, aggregates = hit
+            if ref() is df and hit_version == version and time.monotonic() < expires:
+                metrics.cache_event("aggregates", True)
+                return aggregates
+    metrics.cache_event("aggregates", False)
+
+    if df is not None:
+        with metrics.span("aggregates.groupby") as groupby_span:
+            aggregates = WasteAggregates.from_frame(df)
+            groupby_span.rows = len(df)
+        ref, expires = weakref.ref(df), float("inf")
+    else:
+        with metrics.span(f"{store.name}.aggregate"):
+            cube = store.cube(match)
+        aggregates = WasteAggregates.from_cube(cube)
+        ref, expires = (lambda: None), time.monotonic() + SERVER_AGGREGATES_TTL
+
+    with _aggregates_lock:
+        if len(_aggregates_memo) >= AGGREGATES_MEMO_SIZE:
+            _aggregates_memo.pop(next(iter(_aggregates_memo)))
+        _aggregates_memo[key] = (ref, version, expires, aggregates)
+    return aggregates
+
+# Get summary stats (computed by the database when no DataFrame is given)
+@metrics.timed()
+def get_stats(df=None):
+    return get_aggregates(df).as_stats()
 
 # Delete entry by Mongo ID
 def delete_data_by_id(id_str):
-    collection.delete_one({"_id": ObjectId(id_str)})
+    if store.delete_one(id_str):
+        _drop_from_cache([id_str])
+
+# Recompute quantity_kg of every stored entry with the current unit table,
+# `batch_size` entries at a time in _id order. Only entries whose value
+# changes are written back. Returns (entries checked, entries changed).
+def renormalize_quantities(batch_size=DEFAULT_INSERT_BATCH_SIZE, dry_run=False):
+    columns = ["_id", "food_item", "quantity", "unit", "quantity_kg", "date", "category", "reason"]
+    checked = changed = 0
+    last_id = None
+    while True:
+        # Keyset pages, so writes never run under an open read cursor
+        match = {"_id": {"$gt": last_id}} if last_id is not None else None
+        docs = list(store.find(match, columns, [("_id", 1)], limit=batch_size))
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        checked += len(docs)
+
+        batch = pd.DataFrame.from_records(docs, columns=columns)
+        new_kg = to_kg_batch(batch["quantity"].to_numpy(), batch["unit"].to_numpy(), batch["food_item"].to_numpy())
+        old_kg = pd.to_numeric(batch["quantity_kg"], errors="coerce").to_numpy(dtype=float)
+        stale = np.flatnonzero(~np.isnan(new_kg) & ~np.isclose(new_kg, old_kg, rtol=1e-9, atol=1e-12))
+        changed += len(stale)
+        if len(stale) and not dry_run:
+            store.update_quantity_kg([docs[i] for i in stale], new_kg[stale].tolist())
+
+    if changed and not dry_run:
+        with _cache_lock:
+            _caches.clear()
+            _bump_version()
+    return checked, changed
+
+# Repair rollup buckets that drifted from the raw entries (e.g. a writer
+# died between the entry write and its rollup update on a standalone
+# server). Returns the number of buckets changed.
+def reconcile_rollups():
+    return store.reconcile_rollups()
 
 # Return raw list of all data (for tables)
 def get_all_data():
-    return list(collection.find())
+    return list(store.find())
@@ -0,0 +1,273 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+"""
+Projected daily waste per category (or per reason).
+
+Each series of daily totals gets two lightweight models:
+
+    ets             exponential smoothing with a weekly additive season,
+                    ETS(A,N,A); the smoothing weights (alpha for the level,
+                    gamma for the season) are picked from a small grid by
+                    one-step-ahead squared error
+    seasonal_naive  every weekday repeats the same weekday of last week
+
+and is forecast with whichever predicted its own history better. All
+series are fitted at once: the daily totals form one (series x days)
+matrix and every grid candidate of every series is smoothed in the same
+array pass. With FORECAST_POOL_MIN_SERIES or more series the rows are
+split across a process pool.
+
+Fits are cached per grouping. When new days arrive, series whose earlier
+days are unchanged only run the new days through their cached state;
+backdated edits, or FORECAST_REFIT_DAYS new days since the last grid
+search, refit the series from scratch. Today is still being logged, so
+series end at the last complete day.
+"""
+
+# Days of history in one season
+SEASON_DAYS = 7
+
+# Days forecast unless the caller asks otherwise
+FORECAST_HORIZON = int(os.getenv("FORECAST_HORIZON", "14"))
+
+# New days absorbed incrementally before the smoothing weights are re-picked
+FORECAST_REFIT_DAYS = int(os.getenv("FORECAST_REFIT_DAYS", "28"))
+
+# Series count from which full fits are spread over a process pool
+FORECAST_POOL_MIN_SERIES = int(os.getenv("FORECAST_POOL_MIN_SERIES", "64"))
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", str(os.cpu_count() or 1)))
+
+# Smoothing weight candidates
+ALPHAS = (0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9)
+GAMMAS = (0.0, 0.05, 0.1, 0.2, 0.3)
+
+# z-score of the prediction interval (95%)
+INTERVAL_Z = 1.96
+
+GROUP_FIELDS = ("category", "reason")
+
+_fits_lock = threading.Lock()
+_fits = {}
+_pool = None
+
+# Daily totals as a (series x days) matrix from the first day of data to the
+# last complete day, missing days counting as zero
+def daily_matrix(aggregates, group_by="category", today=None):
+    if group_by not in GROUP_FIELDS:
+        raise ValueError(f"Unknown group_by: {group_by}")
+    cube = aggregates.cube
+    empty = ([], pd.DatetimeIndex([]), np.empty((0, 0)))
+    if cube.empty or group_by not in cube.columns or "date" not in cube.columns:
+        return empty
+
+    today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+    days = pd.to_datetime(cube["date"]).dt.normalize()
+    complete = (days < today).to_numpy()
+    if not complete.any():
+        return empty
+    daily = (
+        cube.loc[complete, ["quantity_kg"]]
+        .assign(day=days[complete], group=cube.loc[complete, group_by].astype(str))
+        .groupby(["group", "day"], sort=True)["quantity_kg"].sum()
+        .unstack("day", fill_value=0.0)
+    )
+    calendar = pd.date_range(daily.columns.min(), daily.columns.max(), freq="D")
+    daily = daily.reindex(columns=calendar, fill_value=0.0)
+    return list(daily.index), calendar, daily.to_numpy(dtype="float64")
+
+# Run ETS(A,N,A) over the columns of y (series x days) for every candidate
+# at once. level, alpha, gamma are (series x candidates), season is
+# (series x candidates x SEASON_DAYS) indexed by absolute day % SEASON_DAYS;
+# t0 is the absolute day of y's first column. Returns the updated state and
+# the summed squared one-step errors.
+def _smooth(y, alpha, gamma, level, season, t0):
+    season = season.copy()
+    sse = np.zeros_like(level)
+    for j in range(y.shape[1]):
+        slot = (t0 + j) % SEASON_DAYS
+        previous = season[:, :, slot]
+        error = y[:, j, None] - (level + previous)
+        level = level + alpha * error
+        season[:, :, slot] = previous + gamma * error
+        sse += error * error
+    return level, season, sse
+
+def fit_series(y):
+    """
+    Fit every row of a (series x days) matrix from scratch.
+
+    Returns:
+        dict: Per-series arrays alpha, gamma, level, season, ets_sse,
+            naive_sse and n (days of one-step errors behind the sums)
+    """
+    k, days = y.shape
+    n = max(days - SEASON_DAYS, 0)
+    fit = {
+        "alpha": np.full(k, np.nan), "gamma": np.full(k, np.nan),
+        "level": np.full(k, np.nan), "season": np.full((k, SEASON_DAYS), np.nan),
+        "ets_sse": np.full(k, np.inf), "naive_sse": np.full(k, np.inf), "n": np.full(k, n),
+    }
+    if n == 0:
+        return fit
+
+    fit["naive_sse"] = ((y[:, SEASON_DAYS:] - y[:, :-SEASON_DAYS]) ** 2).sum(axis=1)
+    if days < 2 * SEASON_DAYS:
+        return fit
+
+    # First week sets the level and the season; the grid runs over the rest
+    alpha, gamma = (np.array(grid, dtype="float64").ravel()[None, :]
+                    for grid in np.meshgrid(ALPHAS, GAMMAS, indexing="ij"))
+    candidates = alpha.shape[1]
+    level0 = y[:, :SEASON_DAYS].mean(axis=1)
+    level = np.repeat(level0[:, None], candidates, axis=1)
+    season = np.repeat((y[:, :SEASON_DAYS] - level0[:, None])[:, None, :], candidates, axis=1)
+    level, season, sse = _smooth(y[:, SEASON_DAYS:], alpha, gamma, level, season, SEASON_DAYS)
+
+    best = sse.argmin(axis=1)
+    rows = np.arange(k)
+    fit.update(
+        alpha=alpha[0, best], gamma=gamma[0, best], level=level[rows, best],
+        season=season[rows, best], ets_sse=sse[rows, best]
+    )
+    return fit
+
+# Full fits, split across the process pool when there are many series
+def _fit_rows(y):
+    global _pool
+    workers = min(FORECAST_WORKERS, len(y))
+    if len(y) < FORECAST_POOL_MIN_SERIES or workers < 2:
+        return fit_series(y)
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=FORECAST_WORKERS)
+    parts = list(_pool.map(fit_series, np.array_split(y, workers)))
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+# Carry cached fits over new days with their smoothing weights unchanged
+def _extend(states, y, t_old):
+    new = y[:, t_old:]
+    naive = ((new - y[:, t_old - SEASON_DAYS:y.shape[1] - SEASON_DAYS]) ** 2).sum(axis=1)
+    alpha = np.array([[state["alpha"]] for state in states])
+    gamma = np.array([[state["gamma"]] for state in states])
+    level = np.array([[state["level"]] for state in states])
+    season = np.array([[state["season"]] for state in states])
+    level, season, sse = _smooth(new, alpha, gamma, level, season, t_old)
+    for i, state in enumerate(states):
+        state.update(
+            level=level[i, 0], season=season[i, 0],
+            ets_sse=state["ets_sse"] + sse[i, 0], naive_sse=state["naive_sse"] + naive[i],
+            n=state["n"] + new.shape[1]
+        )
+
+def _digest(row):
+    return hashlib.sha1(np.round(row, 6).tobytes()).hexdigest()
+
+# Fitted state of every series, reusing and extending the cached fits
+def _fitted(group_by, names, calendar, y):
+    days = len(calendar)
+    cached = _fits.get(group_by)
+    if cached is None or cached["start"] != calendar[0] or cached["days"] > days:
+        cached = {"start": calendar[0], "days": days, "states": {}}
+    t_old = cached["days"]
+
+    refit, extend = [], []
+    for i, name in enumerate(names):
+        state = cached["states"].get(name)
+        if (state is None or state["digest"] != _digest(y[i, :t_old])
+                or not np.isfinite(state["ets_sse"])
+                or days - state["fitted_days"] >= FORECAST_REFIT_DAYS):
+            refit.append(i)
+        elif days > t_old:
+            extend.append(i)
+
+    if extend:
+        _extend([cached["states"][names[i]] for i in extend], y[extend], t_old)
+    if refit:
+        fit = _fit_rows(y[refit])
+        for j, i in enumerate(refit):
+            cached["states"][names[i]] = dict(
+                {key: values[j] for key, values in fit.items()}, fitted_days=days
+            )
+
+    cached["states"] = {name: cached["states"][name] for name in names}
+    for i, name in enumerate(names):
+        cached["states"][name]["digest"] = _digest(y[i])
+    cached["days"] = days
+    _fits[group_by] = cached
+    return cached["states"]
+
+# Forecast, interval half-width and model name of one fitted series
+def _project(state, y, days, horizon):
+    steps = np.arange(1, horizon + 1)
+    ets_mse = state["ets_sse"] / state["n"] if state["n"] else np.inf
+    naive_mse = state["naive_sse"] / state["n"] if state["n"] else np.inf
+
+    if np.isfinite(ets_mse) and ets_mse <= naive_mse:
+        forecast = state["level"] + state["season"][(days + steps - 1) % SEASON_DAYS]
+        variance = ets_mse * (1 + (steps - 1) * state["alpha"] ** 2)
+        model = "ets"
+    elif np.isfinite(naive_mse):
+        forecast = y[days - SEASON_DAYS + (steps - 1) % SEASON_DAYS]
+        variance = naive_mse * ((steps - 1) // SEASON_DAYS + 1)
+        model = "seasonal_naive"
+    else:
+        # Less than a week of history: its mean
+        forecast = np.full(horizon, y.mean())
+        variance = np.full(horizon, y.var())
+        model = "mean"
+    return np.clip(forecast, 0, None), INTERVAL_Z * np.sqrt(variance), model
+
+def forecast(aggregates, horizon=FORECAST_HORIZON, group_by="category", today=None):
+    """
+    Daily waste forecast per category (or reason) and in total.
+
+    Args:
+        aggregates (WasteAggregates): Rollups of the waste data
+        horizon (int): Days to forecast after the last complete day
+        group_by (str): "category" or "reason"
+        today (date, optional): Day still being logged, defaults to today
+
+    Returns:
+        dict: "dates" of the forecast days, "history_end", and per series
+            under "series" (plus summed under "total") the model,
+            forecast_kg, lower_kg and upper_kg arrays
+    """
+    horizon = int(horizon)
+    if horizon < 1:
+        raise ValueError("horizon must be at least 1")
+    names, calendar, y = daily_matrix(aggregates, group_by, today)
+    if not names:
+        return {"dates": pd.DatetimeIndex([]), "history_end": None, "series": {}, "total": None}
+
+    with _fits_lock:
+        states = _fitted(group_by, names, calendar, y)
+        projections = [_project(states[name], y[i], len(calendar), horizon) for i, name in enumerate(names)]
+
+    series = {}
+    for i, (name, (values, spread, model)) in enumerate(zip(names, projections)):
+        state = states[name]
+        series[name] = {
+            "model": model,
+            "alpha": None if model != "ets" else float(state["alpha"]),
+            "gamma": None if model != "ets" else float(state["gamma"]),
+            "forecast_kg": values,
+            "lower_kg": np.clip(values - spread, 0, None),
+            "upper_kg": values + spread,
+        }
+    # Series errors taken as independent
+    total = np.sum([values for values, _, _ in projections], axis=0)
+    total_spread = np.sqrt(np.sum([spread ** 2 for _, spread, _ in projections], axis=0))
+    return {
+        "dates": pd.date_range(calendar[-1] + pd.Timedelta(days=1), periods=horizon, freq="D"),
+        "history_end": calendar[-1],
+        "series": series,
+        "total": {
+            "forecast_kg": total,
+            "lower_kg": np.clip(total - total_spread, 0, None),
+            "upper_kg": total + total_spread,
+        },
+    }
@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+from food_waste_data import add_waste_entries, DEFAULT_INSERT_BATCH_SIZE
+
+"""
+Command-line importer for waste entries exported from POS / kitchen systems.
+
+    python importer.py kitchen_log.csv
+    python importer.py kitchen_log.jsonl --batch-size 5000
+
+Files are streamed in chunks, validated column-wise and written with
+unordered insert_many batches. Rows that fail are listed with their line
+number; the rest are imported.
+"""
+
+# Rows read from the file at a time
+DEFAULT_CHUNK_SIZE = 20000
+
+# File format from the extension unless given explicitly
+def detect_format(path, file_format=None):
+    if file_format:
+        return file_format
+    return "jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson") else "csv"
+
+# Stream a CSV or JSONL file as DataFrame chunks with running row labels
+def read_chunks(path, file_format=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    if detect_format(path, file_format) == "jsonl":
+        # Keep values as written; dates and quantities are validated later
+        return pd.read_json(path, lines=True, chunksize=chunk_size,
+                            dtype=False, convert_dates=False)
+    return pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+
+# Import a file and return the combined report
+def import_file(path, file_format=None, batch_size=DEFAULT_INSERT_BATCH_SIZE,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    inserted, errors = 0, []
+    for chunk in read_chunks(path, file_format, chunk_size):
+        report = add_waste_entries(chunk, batch_size=batch_size)
+        inserted += report["inserted"]
+        errors.extend(report["errors"])
+    return {"inserted": inserted, "errors": errors}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import waste entries from CSV or JSONL")
+    parser.add_argument("path", help="CSV or JSONL file with the waste entry fields")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="File format (default: from extension)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_INSERT_BATCH_SIZE,
+                        help="Entries per insert_many call")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Rows read from the file at a time")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    report = import_file(args.path, args.format, args.batch_size, args.chunk_size)
+    elapsed = time.perf_counter() - started
+
+    # Row labels are 0-based data rows; CSV files have a header line first
+    offset = 2 if detect_format(args.path, args.format) == "csv" else 1
+    for error in report["errors"]:
+        print(f"line {error['row'] + offset}: {error['error']}", file=sys.stderr)
+
+    rate = report["inserted"] / elapsed if elapsed > 0 else 0
+    print(f"Imported {report['inserted']} entries, {len(report['errors'])} failed "
+          f"({elapsed:.1f}s, {rate:.0f} rows/s)")
@@ -0,0 +1,98 @@
+import argparse
+from pymongo import ASCENDING
+
+"""
+Index management and query diagnostics for the waste entries collection.
+
+Every index ends with _id so range queries, sorts and the (field, _id)
+tie-break used for stable paging are all answered from the index.
+Run `python indexes.py` to create the indexes and print which one each
+of the app's typical queries uses.
+"""
+
+WASTE_INDEXES = {
+    "date_id": [("date", ASCENDING), ("_id", ASCENDING)],
+    "category_date_id": [("category", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)],
+    "reason_date_id": [("reason", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)],
+    "entry_timestamp_id": [("entry_timestamp", ASCENDING), ("_id", ASCENDING)],
+    # The other waste log sort orders (app.LOG_SORT_FIELDS)
+    "quantity_kg_id": [("quantity_kg", ASCENDING), ("_id", ASCENDING)],
+    "food_item_id": [("food_item", ASCENDING), ("_id", ASCENDING)],
+    "category_id": [("category", ASCENDING), ("_id", ASCENDING)],
+}
+
+# Create any missing index (create_index is a no-op for existing ones)
+def ensure_indexes(collection):
+    for name, keys in WASTE_INDEXES.items():
+        collection.create_index(keys, name=name)
+    return list(WASTE_INDEXES)
+
+# Find the index (or COLLSCAN) used by a winning plan
+def _plan_summary(plan):
+    stages = []
+    index = None
+    while plan:
+        stages.append(plan.get("stage"))
+        if plan.get("indexName"):
+            index = plan["indexName"]
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    if index is None:
+        index = "COLLSCAN" if "COLLSCAN" in stages else None
+    return index, stages
+
+# Which index a find() with this filter and sort uses
+def explain(collection, match=None, sort=None, limit=0):
+    cursor = collection.find(match or {})
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    plan = cursor.explain()
+
+    planner = plan.get("queryPlanner", {})
+    winning = planner.get("winningPlan", {})
+    # Newer servers nest the classic plan under queryPlan
+    winning = winning.get("queryPlan", winning)
+    index, stages = _plan_summary(winning)
+    stats = plan.get("executionStats", {})
+    return {
+        "filter": match or {},
+        "sort": sort or [],
+        "index": index,
+        "stages": stages,
+        "in_memory_sort": "SORT" in stages,
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+    }
+
+# Explain the queries the dashboard and API issue most often
+def diagnostics(collection):
+    from mongo_pipelines import period_match
+
+    queries = [(f"stats period={period}", period_match(period), None)
+               for period in ("7days", "30days", "month", "year")]
+    queries += [
+        ("entries newest first", {}, [("date", -1), ("_id", -1)]),
+        ("entries by category", {"category": "Vegetables"}, [("date", -1), ("_id", -1)]),
+        ("entries by reason", {"reason": "Expired"}, [("date", -1), ("_id", -1)]),
+        ("entries largest first", {}, [("quantity_kg", -1), ("_id", -1)]),
+        ("entries by food item", {}, [("food_item", 1), ("_id", 1)]),
+        ("entries by category name", {}, [("category", 1), ("_id", 1)]),
+        ("cache watermark", {"entry_timestamp": {"$gt": period_match("7days")["date"]["$gte"]}},
+         [("entry_timestamp", 1), ("_id", 1)]),
+    ]
+    return {label: explain(collection, match, sort) for label, match, sort in queries}
+
+if __name__ == "__main__":
+    from food_waste_data import collection
+
+    parser = argparse.ArgumentParser(description="Create indexes and show query plans")
+    parser.add_argument("--no-create", action="store_true", help="Only print the query plans")
+    args = parser.parse_args()
+
+    if not args.no_create:
+        print("Indexes:", ", ".join(ensure_indexes(collection)))
+    for label, summary in diagnostics(collection).items():
+        sort_note = " (in-memory sort)" if summary["in_memory_sort"] else ""
+        print(f"{label}: {summary['index']}{sort_note}")
@@ -0,0 +1,116 @@
+import json
+import os
+import re
+
+"""
+Keyword intent router for the chatbot.
+
+Intents and their trigger phrases live in intents.json (or the file named by
+CHATBOT_INTENTS). All phrases are compiled once into a single regex shaped
+like a trie, so a message is scanned in one pass whose cost depends on the
+message, not on how many intents or phrases there are. Phrases match whole
+words; a trailing `*` matches any word ending (`reduc*` -> reduce, reducing).
+
+An intent can answer from the waste aggregates (`aggregate` + `template`)
+and/or name the canned `response` group used by the offline fallback.
+"""
+
+INTENTS_PATH = os.getenv(
+    "CHATBOT_INTENTS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents.json")
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Values an intent can read from WasteAggregates; None if not available
+AGGREGATE_QUERIES = {
+    "total": lambda a: a.total,
+    "count": lambda a: a.count,
+    "daily_avg": lambda a: a.daily_avg if len(a.daily) else None,
+    "top_category": lambda a: a.top_category if len(a.by_category) else None,
+    "top_reason": lambda a: a.by_reason.idxmax() if len(a.by_reason) else None,
+}
+
+def normalize(text):
+    return _WHITESPACE.sub(" ", str(text).casefold()).strip()
+
+# Regex source for a trie of (phrase, tag) pairs. Each phrase ends in an
+# empty named group, so match.lastgroup tells which phrase matched.
+def _trie_regex(phrases):
+    trie = {}
+    for phrase, tag in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node.setdefault("", tag)
+
+    def emit(node):
+        branches = []
+        for char in sorted(key for key in node if key):
+            piece = r"\w*" if char == "*" else re.escape(char)
+            branches.append(piece + emit(node[char]))
+        # Longer phrases are tried first, then the phrase ending here
+        if "" in node:
+            branches.append(f"(?P<{node['']}>)")
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return emit(trie)
+
+class IntentEngine:
+    """Classifies messages against a fixed set of intents"""
+
+    def __init__(self, intents):
+        """
+        Args:
+            intents (list): Intent dicts with `name`, `priority` and
+                `patterns`, plus `aggregate` and `template` and/or `response`
+        """
+        for intent in intents:
+            aggregate = intent.get("aggregate")
+            if aggregate is not None and aggregate not in AGGREGATE_QUERIES:
+                raise ValueError(f"Intent {intent['name']!r} uses unknown aggregate {aggregate!r}")
+
+        self.intents = sorted(intents, key=lambda intent: intent.get("priority", 100))
+        self._tags = {}
+        phrases = []
+        for rank, intent in enumerate(self.intents):
+            for pattern in intent["patterns"]:
+                tag = f"t{len(self._tags)}"
+                self._tags[tag] = rank
+                phrases.append((normalize(pattern), tag))
+
+        self._regex = re.compile(r"(?<!\w)" + _trie_regex(phrases) + r"(?!\w)") if phrases else None
+
+    def classify(self, text):
+        """Matched intents, highest priority first"""
+        if self._regex is None:
+            return []
+        ranks = {self._tags[m.lastgroup] for m in self._regex.finditer(normalize(text))}
+        return [self.intents[rank] for rank in sorted(ranks)]
+
+    def answer_type(self, text):
+        """Canned response group of the best matching intent, or "fallback" """
+        for intent in self.classify(text):
+            if intent.get("response"):
+                return intent["response"]
+        return "fallback"
+
+    def answer_from_aggregates(self, text, aggregates):
+        """Answer of the best matching data intent, or None"""
+        for intent in self.classify(text):
+            aggregate = intent.get("aggregate")
+            if aggregate is None:
+                continue
+            value = AGGREGATE_QUERIES[aggregate](aggregates)
+            if value is not None:
+                return intent["template"].format(value=value)
+        return None
+
+def load_intents(path=INTENTS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return IntentEngine(json.load(f)["intents"])
+
+# Built once per process
+engine = load_intents()
@@ -0,0 +1,246 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+
+"""
+Shared HTTP gateway for the hosted LLM backends (DeepSeek, Anthropic).
+
+One keep-alive session is reused for every call, each request has separate
+connect and read timeouts, and transient failures (connection errors,
+timeouts, 429 and 5xx) are retried a bounded number of times with jittered
+exponential backoff. A circuit breaker per backend stops calling a backend
+that keeps failing, so callers go straight to the local fallback until it
+has had time to recover. Backend URLs can be pointed at a local mock server
+with DEEPSEEK_URL / ANTHROPIC_URL.
+"""
+
+DEEPSEEK_URL = os.getenv("DEEPSEEK_URL", "https://api.deepseek.com/v1/chat/completions")
+ANTHROPIC_URL = os.getenv("ANTHROPIC_URL", "https://api.anthropic.com/v1/messages")
+ANTHROPIC_VERSION = "2023-06-01"
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3.05"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "0.5"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))
+
+# Consecutive failures that open a backend's circuit, and how long it
+# stays open before one trial request is let through
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURES", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class LLMError(Exception):
+    """A hosted LLM backend could not produce an answer"""
+
+class CircuitOpenError(LLMError):
+    """The backend's circuit is open, so no request was made"""
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open after a cool-down"""
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """Whether a request may be made now"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            # Let a single trial request through once the cool-down is over
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """End a call without an outcome (e.g. cancelled by the caller)"""
+        with self._lock:
+            self._trial_running = False
+
+    def snapshot(self):
+        return {"state": self.state, "failures": self.failures}
+
+_breakers = {"deepseek": CircuitBreaker(), "anthropic": CircuitBreaker()}
+
+def breaker(backend):
+    """Circuit breaker of a backend ("deepseek" or "anthropic")"""
+    return _breakers[backend]
+
+def circuit_status():
+    return {name: b.snapshot() for name, b in _breakers.items()}
+
+@contextmanager
+def circuit_guard(backend):
+    """
+    Admit one call to a backend through its circuit breaker.
+
+    The block is the whole call, parsing included: it counts as a success if
+    it completes and as a failure if it raises, so a half-open trial always
+    ends. Cancellation or a stream the caller stops reading only releases it.
+    """
+    circuit = breaker(backend)
+    if not circuit.allow():
+        raise CircuitOpenError(f"{backend} is unavailable (circuit open)")
+    try:
+        yield circuit
+    except Exception:
+        circuit.record_failure()
+        raise
+    except BaseException:
+        circuit.release()
+        raise
+    circuit.record_success()
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Process-wide keep-alive session"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=LLM_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+# Full-jitter exponential backoff before retry `attempt` (1-based)
+def backoff_delay(attempt):
+    return random.uniform(0, LLM_BACKOFF * (2 ** (attempt - 1)))
+
+# POST with timeouts and retries. Returns the (possibly streaming) response
+# of the first successful attempt; call it inside circuit_guard().
+def _post(backend, url, headers, payload, stream=False):
+    with metrics.span(f"llm.{backend}"):
+        return _post_with_retries(backend, url, headers, payload, stream)
+
+# Attempts of one _post call, with backoff between them
+def _post_with_retries(backend, url, headers, payload, stream):
+    last_error = None
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(backoff_delay(attempt))
+        try:
+            response = get_session().post(
+                url,
+                headers=headers,
+                json=payload,
+                timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT),
+                stream=stream
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            last_error = e
+            continue
+        except requests.RequestException as e:
+            last_error = e
+            break
+
+        if response.status_code == 200:
+            return response
+        last_error = LLMError(f"{backend} returned HTTP {response.status_code}")
+        response.close()
+        if response.status_code not in RETRY_STATUSES:
+            break
+
+    raise LLMError(f"{backend} request failed: {last_error}")
+
+# Data payloads of a server-sent events stream
+def _sse_data(response):
+    with response:
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data:"):
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    return
+                yield json.loads(data)
+
+# Events of a streamed completion. The stream as a whole is one call for the
+# circuit breaker, so a connection that dies mid-answer counts as a failure.
+def _stream(backend, url, headers, payload):
+    with circuit_guard(backend):
+        response = _post(backend, url, headers, {**payload, "stream": True}, stream=True)
+        yield from _sse_data(response)
+
+# ---- DeepSeek ----
+
+def deepseek_headers():
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    if not api_key:
+        raise LLMError("DEEPSEEK_API_KEY is not set")
+    return {"Authorization": f"Bearer {api_key}"}
+
+def deepseek_chat(payload):
+    """Response body of a DeepSeek chat completion"""
+    headers = deepseek_headers()
+    with circuit_guard("deepseek"):
+        return _post("deepseek", DEEPSEEK_URL, headers, payload).json()
+
+def deepseek_stream(payload):
+    """Yield answer text as DeepSeek streams it"""
+    for event in _stream("deepseek", DEEPSEEK_URL, deepseek_headers(), payload):
+        for choice in event.get("choices", []):
+            text = (choice.get("delta") or {}).get("content")
+            if text:
+                yield text
+
+# ---- Anthropic ----
+
+def anthropic_headers():
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not api_key:
+        raise LLMError("ANTHROPIC_API_KEY is not set")
+    return {"x-api-key": api_key, "anthropic-version": ANTHROPIC_VERSION}
+
+def anthropic_message(payload):
+    """Answer text of an Anthropic messages call"""
+    headers = anthropic_headers()
+    with circuit_guard("anthropic"):
+        body = _post("anthropic", ANTHROPIC_URL, headers, payload).json()
+        return "".join(block.get("text", "") for block in body.get("content", []))
+
+def anthropic_stream(payload):
+    """Yield answer text as Anthropic streams it"""
+    for event in _stream("anthropic", ANTHROPIC_URL, anthropic_headers(), payload):
+        if event.get("type") == "content_block_delta":
+            text = event.get("delta", {}).get("text")
+            if text:
+                yield text
@@ -0,0 +1,168 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+import metrics
+
+"""
+Local GPT-2 fallback for the chatbot.
+
+transformers is only imported on the worker thread, so importing chatbot or
+api stays cheap. warm_up() loads the model in the background at startup,
+and concurrent prompts are collected for up to LOCAL_LLM_MAX_WAIT_MS and
+generated together in one batched pipeline call.
+"""
+
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "gpt2")
+
+# Prompts generated per pipeline call, and how long to wait for more
+# prompts once the first one arrives
+LOCAL_LLM_MAX_BATCH = int(os.getenv("LOCAL_LLM_MAX_BATCH", "8"))
+LOCAL_LLM_MAX_WAIT_MS = float(os.getenv("LOCAL_LLM_MAX_WAIT_MS", "20"))
+
+# How long a caller waits for an answer (including a cold model load)
+LOCAL_LLM_TIMEOUT = float(os.getenv("LOCAL_LLM_TIMEOUT", "60"))
+
+GENERATION_KWARGS = {"max_length": 100, "temperature": 0.7}
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+_state = {
+    "loaded": False,
+    "load_error": None,
+    "load_seconds": None,
+}
+_metrics_lock = threading.Lock()
+_request_latencies = deque(maxlen=1000)   # seconds from submit to answer
+_batch_latencies = deque(maxlen=1000)     # seconds per pipeline call
+_batch_sizes = deque(maxlen=1000)
+_counters = {"requests": 0, "batches": 0, "errors": 0}
+
+def _load_pipeline():
+    from transformers import pipeline
+
+    llm = pipeline("text-generation", model=LOCAL_LLM_MODEL, device="cpu")
+    # GPT-2 has no pad token; batched generation needs one, padded on the left
+    if llm.tokenizer.pad_token_id is None:
+        llm.tokenizer.pad_token_id = llm.model.config.eos_token_id
+    llm.tokenizer.padding_side = "left"
+    return llm
+
+def _next_batch():
+    batch = [_queue.get()]
+    deadline = time.monotonic() + LOCAL_LLM_MAX_WAIT_MS / 1000
+    while len(batch) < LOCAL_LLM_MAX_BATCH:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+# Complete a future unless the caller already cancelled it
+def _settle(future, result=None, error=None):
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+# Generate one batch and hand each caller its text. Nothing is handed out
+# until the whole batch is known to be good.
+def _generate(llm, batch):
+    prompts = [prompt for prompt, _, _ in batch]
+    generation_started = time.perf_counter()
+    results = llm(prompts, batch_size=len(prompts), **GENERATION_KWARGS)
+    if len(results) != len(batch):
+        raise RuntimeError(f"Local LLM returned {len(results)} results for {len(batch)} prompts")
+    texts = [result[0]['generated_text'] for result in results]
+
+    finished = time.perf_counter()
+    with _metrics_lock:
+        _counters["batches"] += 1
+        _batch_sizes.append(len(batch))
+        _batch_latencies.append(finished - generation_started)
+        for _, _, submitted in batch:
+            _request_latencies.append(finished - submitted)
+
+    for (_, future, _), text in zip(batch, texts):
+        _settle(future, text)
+
+def _run():
+    started = time.perf_counter()
+    try:
+        llm = _load_pipeline()
+        _state.update(loaded=True, load_seconds=time.perf_counter() - started)
+    except Exception as e:
+        _state.update(load_error=str(e), load_seconds=time.perf_counter() - started)
+        llm = None
+
+    # Whatever goes wrong with a batch fails its callers, never the worker
+    while True:
+        batch = _next_batch()
+        if llm is None:
+            for _, future, _ in batch:
+                _settle(future, error=RuntimeError(f"Local LLM unavailable: {_state['load_error']}"))
+            continue
+        try:
+            _generate(llm, batch)
+        except Exception as e:
+            with _metrics_lock:
+                _counters["errors"] += 1
+            for _, future, _ in batch:
+                _settle(future, error=e)
+
+def warm_up():
+    """Start the worker thread, which loads the model in the background"""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_run, name="local-llm", daemon=True)
+                _worker.start()
+
+def submit(prompt):
+    """Queue a prompt and return a Future with the generated text"""
+    warm_up()
+    future = Future()
+    with _metrics_lock:
+        _counters["requests"] += 1
+    _queue.put((prompt, future, time.perf_counter()))
+    return future
+
+def generate(prompt, timeout=LOCAL_LLM_TIMEOUT):
+    """Generated text for a prompt, batched with concurrent callers"""
+    with metrics.span("llm.local"):
+        return submit(prompt).result(timeout=timeout)
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def get_metrics():
+    """Model state, queue depth, batch sizes and latency percentiles"""
+    with _metrics_lock:
+        requests = list(_request_latencies)
+        batches = list(_batch_latencies)
+        sizes = list(_batch_sizes)
+        counters = dict(_counters)
+    return {
+        **_state,
+        **counters,
+        "queue_depth": _queue.qsize(),
+        "avg_batch_size": sum(sizes) / len(sizes) if sizes else None,
+        "request_latency_p50": _percentile(requests, 0.5),
+        "request_latency_p95": _percentile(requests, 0.95),
+        "generation_latency_p50": _percentile(batches, 0.5),
+        "generation_latency_p95": _percentile(batches, 0.95),
+    }
@@ -0,0 +1,224 @@
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+import pandas as pd
+
+"""
+Timings of the hot paths: MongoDB reads, DataFrame decoding, rollups,
+the process_*_api functions, chart building and LLM calls.
+
+Functions decorated with @timed() and blocks wrapped in `with span(name):`
+record a latency histogram, the rows they handled and how often they
+raised; cache lookups are counted with cache_event(). The numbers are
+served as Prometheus text (GET /metrics on server.py), as JSON
+(process_metrics_api) and in the Streamlit debug panel.
+
+Recording is off unless METRICS_ENABLED=1 (or enable() is called). While
+it is off a decorated call costs one flag check and span() hands back a
+shared no-op context manager.
+"""
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes", "on")
+
+# Histogram bucket upper bounds in seconds; cached paths land in the low
+# buckets, LLM calls in the high ones
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+_enabled = METRICS_ENABLED
+_lock = threading.Lock()
+_timings = {}
+_caches = {}
+
+class _Timing:
+    """Latency histogram, row and error counts of one instrumented name"""
+    __slots__ = ("buckets", "count", "sum", "max", "rows", "errors")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.errors = 0
+
+    def percentile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        rank, seen = q * self.count, 0
+        for bound, n in zip(LATENCY_BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+def enable(on=True):
+    """Turn recording on or off at runtime"""
+    global _enabled
+    _enabled = bool(on)
+
+def enabled():
+    return _enabled
+
+def reset():
+    """Forget everything recorded so far"""
+    with _lock:
+        _timings.clear()
+        _caches.clear()
+
+def observe(name, seconds, rows=None, error=False):
+    """Record one timed call of `name`"""
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = _Timing()
+        timing.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        timing.count += 1
+        timing.sum += seconds
+        timing.max = max(timing.max, seconds)
+        if rows:
+            timing.rows += rows
+        if error:
+            timing.errors += 1
+
+def cache_event(cache, hit):
+    """Count a hit or miss of a named cache"""
+    if not _enabled:
+        return
+    with _lock:
+        counts = _caches.get(cache)
+        if counts is None:
+            counts = _caches[cache] = [0, 0]
+        counts[0 if hit else 1] += 1
+
+# Rows a call handled: the DataFrame it returned, else the first it was given
+def _row_count(result, args, kwargs):
+    for value in (result, *args, *kwargs.values()):
+        if isinstance(value, pd.DataFrame):
+            return len(value)
+    return None
+
+class _Span:
+    """Times a `with` block; set `.rows` inside it to record a row count"""
+    __slots__ = ("name", "rows", "_started")
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self._started, self.rows, exc_type is not None)
+        return False
+
+class _NoSpan:
+    """Shared stand-in for _Span while recording is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+_NO_SPAN = _NoSpan()
+
+def span(name):
+    """Context manager timing a block under `name`"""
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name)
+
+def timed(name=None):
+    """Decorator timing every call of a function (under its name by default)"""
+    def decorate(func):
+        metric = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                observe(metric, time.perf_counter() - started, error=True)
+                raise
+            observe(metric, time.perf_counter() - started, _row_count(result, args, kwargs))
+            return result
+        return wrapper
+    return decorate
+
+def snapshot():
+    """Recorded timings (milliseconds) and cache counts as plain dicts"""
+    with _lock:
+        timings = [
+            {
+                "name": name,
+                "calls": t.count,
+                "errors": t.errors,
+                "rows": t.rows,
+                "mean_ms": t.sum / t.count * 1000 if t.count else 0.0,
+                "p50_ms": t.percentile(0.5) * 1000,
+                "p95_ms": t.percentile(0.95) * 1000,
+                "max_ms": t.max * 1000,
+                "total_ms": t.sum * 1000,
+            }
+            for name, t in _timings.items()
+        ]
+        caches = {
+            cache: {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else None}
+            for cache, (hits, misses) in _caches.items()
+        }
+    timings.sort(key=lambda row: row["total_ms"], reverse=True)
+    return {"enabled": _enabled, "timings": timings, "caches": caches}
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus_text(prefix="food_waste"):
+    """Everything recorded, in the Prometheus text exposition format"""
+    with _lock:
+        timings = {name: (list(t.buckets), t.sum, t.count, t.rows, t.errors) for name, t in _timings.items()}
+        caches = {cache: tuple(counts) for cache, counts in _caches.items()}
+
+    lines = [
+        f"# HELP {prefix}_metrics_enabled Whether timings are being recorded",
+        f"# TYPE {prefix}_metrics_enabled gauge",
+        f"{prefix}_metrics_enabled {int(_enabled)}",
+        f"# HELP {prefix}_latency_seconds Latency of instrumented functions and blocks",
+        f"# TYPE {prefix}_latency_seconds histogram",
+    ]
+    for name, (buckets, total, count, _, _) in sorted(timings.items()):
+        label = _label(name)
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, buckets):
+            cumulative += n
+            lines.append(f'{prefix}_latency_seconds_bucket{{name="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'{prefix}_latency_seconds_bucket{{name="{label}",le="+Inf"}} {count}')
+        lines.append(f'{prefix}_latency_seconds_sum{{name="{label}"}} {total}')
+        lines.append(f'{prefix}_latency_seconds_count{{name="{label}"}} {count}')
+
+    lines += [f"# HELP {prefix}_rows_total Rows handled by instrumented calls",
+              f"# TYPE {prefix}_rows_total counter"]
+    lines += [f'{prefix}_rows_total{{name="{_label(name)}"}} {rows}'
+              for name, (_, _, _, rows, _) in sorted(timings.items())]
+    lines += [f"# HELP {prefix}_errors_total Instrumented calls that raised",
+              f"# TYPE {prefix}_errors_total counter"]
+    lines += [f'{prefix}_errors_total{{name="{_label(name)}"}} {errors}'
+              for name, (_, _, _, _, errors) in sorted(timings.items())]
+
+    lines += [f"# HELP {prefix}_cache_requests_total Cache lookups by result",
+              f"# TYPE {prefix}_cache_requests_total counter"]
+    for cache, (hits, misses) in sorted(caches.items()):
+        lines.append(f'{prefix}_cache_requests_total{{cache="{_label(cache)}",result="hit"}} {hits}')
+        lines.append(f'{prefix}_cache_requests_total{{cache="{_label(cache)}",result="miss"}} {misses}')
+    return "\n".join(lines) + "\n"
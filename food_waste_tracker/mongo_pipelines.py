@@ -0,0 +1,91 @@
+import re
+import pandas as pd
+from datetime import datetime
+
+"""
+MongoDB queries for the dashboard statistics and the waste log. The sums
+behind the statistics and charts are grouped by the server into one small
+(date, category, reason) cube, so only that travels over the wire instead
+of every waste entry.
+"""
+
+# (start, end) of the periods understood by process_stats_api; either may be
+# None for an open end
+def period_bounds(period, today=None):
+    today = pd.Timestamp(today or datetime.now().date()).normalize()
+
+    if period == '7days':
+        return (today - pd.Timedelta(days=7)).to_pydatetime(), None
+    elif period == '30days':
+        return (today - pd.Timedelta(days=30)).to_pydatetime(), None
+    elif period == 'month':
+        start = today.replace(day=1)
+        return start.to_pydatetime(), (start + pd.offsets.MonthBegin(1)).to_pydatetime()
+    elif period == 'year':
+        start = today.replace(month=1, day=1)
+        return start.to_pydatetime(), (start + pd.offsets.YearBegin(1)).to_pydatetime()
+    return None, None  # 'all' or any invalid value
+
+# Match stage for a date window
+def range_match(start=None, end=None):
+    date = {}
+    if start is not None:
+        date["$gte"] = start
+    if end is not None:
+        date["$lt"] = end
+    return {"date": date} if date else {}
+
+# Match stage for the periods understood by process_stats_api
+def period_match(period, today=None):
+    return range_match(*period_bounds(period, today))
+
+# Case-insensitive substring filter on a text field
+def search_match(field, text):
+    return {field: {"$regex": re.escape(text), "$options": "i"}}
+
+def _with_match(match, stages):
+    return ([{"$match": match}] if match else []) + stages
+
+# Sums per (date, category, reason), the cube behind WasteAggregates
+def cube_pipeline(match=None):
+    return _with_match(match, [{"$group": {
+        "_id": {"date": "$date", "category": "$category", "reason": "$reason"},
+        "quantity_kg": {"$sum": "$quantity_kg"},
+        "count": {"$sum": 1}
+    }}])
+
+# Filter for entries that come after (value, _id) in a (sort, _id) ordering
+def keyset_match(sort, ascending, value, oid):
+    after = "$gt" if ascending else "$lt"
+    ties = {sort: value, "_id": {after: oid}}
+    # Missing values sort before every other value
+    if value is None:
+        return {"$or": [{sort: {"$ne": None}}, ties]} if ascending else ties
+    if ascending:
+        return {"$or": [{sort: {after: value}}, ties]}
+    return {"$or": [{sort: {after: value}}, {sort: None}, ties]}
+
+# Filter and sort spec for a page ordered by (sort, _id), optionally
+# continuing after the (value, _id) of the previous page's last entry
+def page_query(match, sort, ascending, after=None):
+    direction = 1 if ascending else -1
+    query = match or {}
+    if after is not None:
+        keyset = keyset_match(sort, ascending, *after)
+        query = {"$and": [query, keyset]} if query else keyset
+    return query, [(sort, direction), ("_id", direction)]
+
+# Grouped (date, category, reason, quantity_kg, count) DataFrame
+def cube(collection, match=None):
+    return cube_frame(collection.aggregate(cube_pipeline(match)))
+
+# Cube DataFrame from the documents returned by cube_pipeline
+def cube_frame(groups):
+    groups = list(groups)
+    return pd.DataFrame({
+        "date": pd.to_datetime([g["_id"].get("date") for g in groups], errors="coerce"),
+        "category": [g["_id"].get("category") for g in groups],
+        "reason": [g["_id"].get("reason") for g in groups],
+        "quantity_kg": [float(g["quantity_kg"]) for g in groups],
+        "count": [g["count"] for g in groups]
+    })
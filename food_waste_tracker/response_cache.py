@@ -0,0 +1,133 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import metrics
+
+"""
+Cache of chatbot and Anthropic answers.
+
+Answers are keyed by the normalized question, the backend that produced
+them and a fingerprint of the data they were based on, so a new entry
+makes the next question go to the LLM again while repeated questions
+against unchanged data are served from memory. Set RESPONSE_CACHE_DB to a
+file path to keep answers in SQLite across restarts.
+"""
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "")
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+# Lowercase, collapse whitespace and drop trailing ?!. so trivially
+# different spellings of a question share an answer
+def normalize_query(query):
+    query = _WHITESPACE.sub(" ", str(query).lower()).strip()
+    return _TRAILING_PUNCTUATION.sub("", query)
+
+# Cache key of a question for a backend and data fingerprint
+def make_key(query, backend, fingerprint=None):
+    raw = "\0".join([backend, str(fingerprint or "-"), normalize_query(query)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """In-memory LRU with a TTL, optionally backed by a SQLite file"""
+
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, path=None):
+        """
+        Args:
+            max_size (int): Answers kept in memory
+            ttl (float): Seconds an answer stays valid
+            path (str, optional): SQLite file for the on-disk tier
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+            self._db.commit()
+
+    def _remember(self, key, value, expires):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key):
+        """Cached answer for a key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    metrics.cache_event("responses", True)
+                    return entry[1]
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires FROM responses WHERE key = ? AND expires > ?",
+                    (key, now)
+                ).fetchone()
+                if row is not None:
+                    self._remember(key, row[0], row[1])
+                    self._counters["disk_hits"] += 1
+                    metrics.cache_event("responses", True)
+                    return row[0]
+
+            self._counters["misses"] += 1
+            metrics.cache_event("responses", False)
+            return None
+
+    def set(self, key, value):
+        """Store an answer for the cache TTL"""
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)",
+                    (key, value, expires)
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self):
+        """Hit / miss counters and the current size"""
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        return {
+            **counters,
+            "size": size,
+            "hit_rate": hits / lookups if lookups else None,
+            "persistent": self._db is not None,
+        }
+
+# Process-wide cache shared by the chatbot, the API and the server
+response_cache = ResponseCache(path=RESPONSE_CACHE_DB or None)
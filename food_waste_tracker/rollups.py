@@ -0,0 +1,169 @@
+import argparse
+import math
+from collections import defaultdict
+from datetime import datetime
+import pandas as pd
+from pymongo import UpdateOne
+from pymongo.read_concern import ReadConcern
+import mongo_pipelines
+
+"""
+Pre-aggregated waste totals per (day, category, reason).
+
+Writers keep the rollup collection current with atomic $inc updates, so the
+dashboard can read a handful of documents per day instead of every entry.
+On replica sets and sharded clusters an entry write and its $inc commit in
+one transaction (write_together). Standalone servers have no transactions,
+so a crash between the two writes can leave a bucket off; reconcile()
+repairs that, and is scheduled periodically by the app. Run
+`python rollups.py reconcile` after importing entries that bypassed
+add_waste_entry. Reconciling only $inc's each bucket by its difference,
+so it is safe while writers are running.
+"""
+
+ROLLUP_COLLECTION_NAME = "waste_rollups"
+
+# Clients already asked whether they support transactions, by id
+_transactions = {}
+
+# Rollup key of an entry: its day and grouping fields
+def _rollup_key(entry):
+    day = entry.get("date")
+    if isinstance(day, datetime):
+        day = datetime(day.year, day.month, day.day)
+    return day, entry.get("category"), entry.get("reason")
+
+# Upsert operations adding (sign=1) or removing (sign=-1) entries, and the
+# rollup keys they touch
+def rollup_operations(entries, sign=1):
+    totals = defaultdict(lambda: [0.0, 0])
+    for entry in entries:
+        bucket = totals[_rollup_key(entry)]
+        bucket[0] += float(entry.get("quantity_kg") or 0)
+        bucket[1] += 1
+
+    operations = []
+    keys = []
+    for (day, category, reason), (quantity_kg, count) in totals.items():
+        key = {"date": day, "category": category, "reason": reason}
+        keys.append(key)
+        operations.append(UpdateOne(
+            {"_id": key},
+            {
+                "$setOnInsert": key,
+                "$inc": {"quantity_kg": sign * quantity_kg, "count": sign * count}
+            },
+            upsert=True
+        ))
+    return operations, keys
+
+# Filter for buckets whose entries were all deleted
+def empty_buckets(keys):
+    return {"_id": {"$in": keys}, "count": {"$lte": 0}}
+
+# Add (sign=1) or remove (sign=-1) entries from the rollups
+def apply_entries(rollup_collection, entries, sign=1, session=None):
+    operations, keys = rollup_operations(entries, sign)
+    if not operations:
+        return
+    rollup_collection.bulk_write(operations, ordered=False, session=session)
+    if sign < 0:
+        rollup_collection.delete_many(empty_buckets(keys), session=session)
+
+# Whether a `hello` reply comes from a deployment that runs multi-document
+# transactions (a replica set member or mongos)
+def transactions_supported(hello):
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+def _client_supports_transactions(client):
+    supported = _transactions.get(id(client))
+    if supported is None:
+        try:
+            supported = transactions_supported(client.admin.command("hello"))
+        except Exception:
+            # Unreachable servers and test doubles: plain writes
+            supported = False
+        _transactions[id(client)] = supported
+    return supported
+
+# Run `write(session)` so an entry write and its rollup update commit
+# together: in a transaction (retried on conflicts) where the deployment
+# supports them, otherwise as separate writes with session=None
+def write_together(collection, write, **transaction_options):
+    client = collection.database.client
+    if not _client_supports_transactions(client):
+        return write(None)
+    with client.start_session() as session:
+        return session.with_transaction(write, **transaction_options)
+
+# Rollup documents as a (date, category, reason, quantity_kg, count) cube DataFrame
+def cube_frame(docs):
+    return pd.DataFrame({
+        "date": pd.to_datetime([doc.get("date") for doc in docs], errors="coerce"),
+        "category": [doc.get("category") for doc in docs],
+        "reason": [doc.get("reason") for doc in docs],
+        "quantity_kg": [float(doc.get("quantity_kg", 0)) for doc in docs],
+        "count": [doc.get("count", 0) for doc in docs]
+    })
+
+# Rollups as a (date, category, reason, quantity_kg, count) cube DataFrame.
+# `match` filters on the same date/category/reason fields as raw entries.
+def cube(rollup_collection, match=None):
+    return cube_frame(list(rollup_collection.find(match or {}, {"_id": 0})))
+
+# Operations moving each rollup bucket to the totals of the raw entries
+# (the groups of mongo_pipelines.cube_pipeline): an $inc by the difference,
+# so $inc's from concurrent writers are kept
+def reconcile_operations(groups, buckets):
+    expected = defaultdict(lambda: [0.0, 0])
+    for group in groups:
+        bucket = expected[_rollup_key(group["_id"])]
+        bucket[0] += float(group.get("quantity_kg") or 0)
+        bucket[1] += group.get("count", 0)
+    current = {_rollup_key(doc): (float(doc.get("quantity_kg") or 0), doc.get("count", 0)) for doc in buckets}
+
+    operations = []
+    keys = []
+    for day, category, reason in expected.keys() | current.keys():
+        want = expected.get((day, category, reason), (0.0, 0))
+        have = current.get((day, category, reason), (0.0, 0))
+        quantity_kg = want[0] - have[0]
+        count = want[1] - have[1]
+        if count == 0 and math.isclose(quantity_kg, 0, abs_tol=1e-9):
+            continue
+        key = {"date": day, "category": category, "reason": reason}
+        keys.append(key)
+        operations.append(UpdateOne(
+            {"_id": key},
+            {"$setOnInsert": key, "$inc": {"quantity_kg": quantity_kg, "count": count}},
+            upsert=True
+        ))
+    return operations, keys
+
+# Correct every rollup bucket that disagrees with the raw entries and
+# return how many were changed. In a transaction both collections are read
+# from one snapshot; without one, a write landing between the two reads
+# can leave its bucket off until the next reconcile.
+def reconcile(collection, rollup_collection):
+    def fix(session):
+        groups = list(collection.aggregate(mongo_pipelines.cube_pipeline(), session=session))
+        buckets = list(rollup_collection.find({}, {"_id": 0}, session=session))
+        operations, keys = reconcile_operations(groups, buckets)
+        if operations:
+            rollup_collection.bulk_write(operations, ordered=False, session=session)
+            rollup_collection.delete_many(empty_buckets(keys), session=session)
+        return len(operations)
+
+    return write_together(collection, fix, read_concern=ReadConcern("snapshot"))
+
+if __name__ == "__main__":
+    from food_waste_data import collection, rollup_collection
+
+    parser = argparse.ArgumentParser(description="Maintain the waste rollup collection")
+    parser.add_argument("command", choices=["reconcile"],
+                        help="reconcile: correct rollups that disagree with the raw entries")
+    args = parser.parse_args()
+
+    if args.command == "reconcile":
+        changed = reconcile(collection, rollup_collection)
+        print(f"Reconciled {changed} rollup buckets with {collection.name}")
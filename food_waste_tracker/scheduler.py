@@ -0,0 +1,176 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+"""
+In-process background jobs, so expensive work happens off the request path.
+
+    scheduler = get_scheduler()
+    future = scheduler.submit(func, *args, priority=HIGH, key=("tip", prompt))
+    scheduler.every(30, precompute_dashboard, key="dashboard")
+
+A small pool of worker threads takes jobs from a priority queue (lower
+runs first, FIFO within a priority). submit() returns a
+concurrent.futures.Future; a job submitted with the `key` of a job that is
+still queued or running is not queued again, the caller gets the existing
+future instead. every() runs a function periodically under its key, so a
+tick that comes round while the previous run is still busy is skipped,
+and registering the same key again (e.g. on every Streamlit rerun) keeps
+the existing schedule.
+"""
+
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "2"))
+
+# Job priorities, lower runs first
+HIGH = 0
+NORMAL = 10
+LOW = 20
+
+class Scheduler:
+    """Worker threads running prioritized, deduplicated and periodic jobs"""
+
+    def __init__(self, workers=SCHEDULER_WORKERS):
+        self.workers = workers
+        self._queue = []            # (priority, sequence, future, key, func, args, kwargs)
+        self._sequence = itertools.count()
+        self._active = {}           # key -> future of a queued or running job
+        self._periodic = {}         # key -> [interval, next due, func, args, kwargs, priority]
+        self._counts = {"submitted": 0, "deduplicated": 0, "completed": 0, "failed": 0}
+        self._running = 0
+        self._lock = threading.Lock()
+        self._job_ready = threading.Condition(self._lock)
+        self._schedule_changed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start the worker and clock threads (idempotent)"""
+        with self._lock:
+            self._stop.clear()
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            if not self._threads:
+                for i in range(self.workers):
+                    self._threads.append(threading.Thread(target=self._work, name=f"scheduler-{i}", daemon=True))
+                self._threads.append(threading.Thread(target=self._clock, name="scheduler-clock", daemon=True))
+                for thread in self._threads:
+                    thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the threads; queued jobs are cancelled"""
+        self._stop.set()
+        with self._lock:
+            for _, _, future, _, _, _, _ in self._queue:
+                future.cancel()
+            self._queue.clear()
+            self._active.clear()
+            self._job_ready.notify_all()
+            self._schedule_changed.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, func, *args, priority=NORMAL, key=None, **kwargs):
+        """Queue `func(*args, **kwargs)`; returns its Future"""
+        with self._lock:
+            if key is not None:
+                active = self._active.get(key)
+                if active is not None:
+                    self._counts["deduplicated"] += 1
+                    return active
+            future = Future()
+            if key is not None:
+                self._active[key] = future
+            heapq.heappush(self._queue, (priority, next(self._sequence), future, key, func, args, kwargs))
+            self._counts["submitted"] += 1
+            self._job_ready.notify()
+        return future
+
+    def every(self, interval, func, *args, priority=LOW, key=None, run_now=True, **kwargs):
+        """Run `func(*args, **kwargs)` every `interval` seconds under `key`"""
+        key = key if key is not None else ("every", getattr(func, "__qualname__", repr(func)))
+        with self._lock:
+            if key in self._periodic:
+                return key
+            due = time.monotonic() + (0 if run_now else interval)
+            self._periodic[key] = [interval, due, func, args, kwargs, priority]
+            self._schedule_changed.notify()
+        return key
+
+    def cancel(self, key):
+        """Stop a periodic job"""
+        with self._lock:
+            return self._periodic.pop(key, None) is not None
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counts,
+                workers=self.workers,
+                queued=len(self._queue),
+                running=self._running,
+                periodic=sorted(str(key) for key in self._periodic),
+            )
+
+    def _work(self):
+        while not self._stop.is_set():
+            with self._lock:
+                while not self._queue and not self._stop.is_set():
+                    self._job_ready.wait()
+                if self._stop.is_set():
+                    return
+                _, _, future, key, func, args, kwargs = heapq.heappop(self._queue)
+                self._running += 1
+
+            started = future.set_running_or_notify_cancel()
+            result, error = None, None
+            if started:
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    error = e
+
+            # Release the key first, so callbacks can queue the job again
+            with self._lock:
+                self._running -= 1
+                if started:
+                    self._counts["failed" if error is not None else "completed"] += 1
+                if key is not None and self._active.get(key) is future:
+                    del self._active[key]
+            if started:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    # Submit periodic jobs as they come due
+    def _clock(self):
+        while not self._stop.is_set():
+            due = []
+            with self._lock:
+                now = time.monotonic()
+                wait = None
+                for key, task in self._periodic.items():
+                    if task[1] <= now:
+                        task[1] = now + task[0]
+                        due.append((key, task))
+                    wait = task[1] - now if wait is None else min(wait, task[1] - now)
+                if not due:
+                    self._schedule_changed.wait(wait)
+                    continue
+            for key, (_, _, func, args, kwargs, priority) in due:
+                self.submit(func, *args, priority=priority, key=key, **kwargs)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """The process-wide scheduler, started on first use"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = Scheduler().start()
+    return _scheduler
@@ -0,0 +1,556 @@
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import pandas as pd
+from aiohttp import web, ClientError, ClientSession, ClientTimeout
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+import api
+import export
+import forecast
+import llm_gateway
+import local_llm
+import metrics
+import mongo_pipelines
+import rollups
+from response_cache import response_cache, make_key
+from aggregates import WasteAggregates
+from chatbot import (
+    answer_from_aggregates,
+    deepseek_payload,
+    parse_deepseek_response,
+    get_local_response,
+    get_local_llm_response,
+    CHATBOT_MODE
+)
+from database import MONGO_URI, DB_NAME, COLLECTION_NAME, client_options, read_preference
+from storage import STATS_BACKEND
+from food_waste_data import (
+    prepare_entries,
+    get_aggregates,
+    DEFAULT_INSERT_BATCH_SIZE,
+    SERVER_AGGREGATES_TTL,
+    REQUIRED_FIELDS,
+    ALL_COLUMNS
+)
+
+"""
+Asyncio HTTP service exposing the Food Waste Tracker API to integrations.
+
+    python server.py --port 8080            # MongoDB through motor
+    python server.py --port 8080 --memory   # in-memory store, e.g. for tests
+
+Endpoints mirror the process_*_api functions:
+    POST /api/chat         {"message": ...}
+    POST /api/waste        one entry, fields as in process_add_waste_api
+    POST /api/waste/bulk   list of entries
+    GET  /api/stats        ?period=7days|30days|month|year|all or ?start&end,
+                           &group_by=week|month|category|reason
+    GET  /api/forecast     ?horizon=14&group_by=category|reason, projected
+                           daily waste per series with a 95% interval
+    GET  /api/entries      ?limit&offset&cursor&sort&order&period&category
+    GET  /api/export       ?format=csv|jsonl|parquet&period&category&batch_size,
+                           streamed in batches
+    POST /api/anthropic    {"message": ...}
+    GET  /api/health
+    GET  /api/llm/metrics  local LLM queue depth and latency
+    GET  /api/llm/circuits  hosted LLM circuit breaker states
+    GET  /api/cache/responses  response cache hits and misses
+    GET  /api/metrics      hot path timings and cache hit rates (METRICS_ENABLED=1)
+    GET  /metrics          the same in the Prometheus text format
+
+Database access uses the async motor driver and LLM calls use aiohttp, so one
+worker serves many requests at once. Blocking pandas work runs in a bounded
+thread pool.
+"""
+
+# Threads available for blocking pandas / local LLM work
+EXECUTOR_WORKERS = int(os.getenv("API_EXECUTOR_WORKERS", "4"))
+
+# Overall cap per upstream LLM request in seconds (connect and read
+# timeouts come from llm_gateway)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+
+# Largest ?batch_size= accepted by the bulk insert and export endpoints
+MAX_BATCH_SIZE = 100000
+
+
+BACKEND = web.AppKey("backend", object)
+EXECUTOR = web.AppKey("executor", ThreadPoolExecutor)
+HTTP = web.AppKey("http", ClientSession)
+
+class MemoryBackend:
+    """Entries kept in memory, served by the DataFrame paths of api.py"""
+
+    def __init__(self, run_blocking):
+        self.run_blocking = run_blocking
+        self.frame = pd.DataFrame(columns=list(ALL_COLUMNS)).astype(
+            {"date": "datetime64[ns]", "quantity": "float64", "quantity_kg": "float64"}
+        )
+        self._lock = asyncio.Lock()
+
+    async def add_entries(self, rows, batch_size=DEFAULT_INSERT_BATCH_SIZE):
+        labelled, errors = await self.run_blocking(prepare_entries, pd.DataFrame(rows))
+        docs = [dict(doc, _id=str(ObjectId())) for _, doc in labelled]
+        if docs:
+            new_rows = pd.DataFrame(docs)
+            new_rows["date"] = pd.to_datetime(new_rows["date"])
+            async with self._lock:
+                # Replace rather than mutate, so memoized rollups stay valid
+                frames = [frame for frame in (self.frame, new_rows) if not frame.empty]
+                self.frame = pd.concat(frames, ignore_index=True)
+        return _report(len(docs), errors)
+
+    async def stats(self, query):
+        return await self.run_blocking(
+            api.process_stats_api, query.get("period", "all"), self.frame,
+            query.get("start"), query.get("end"), query.get("group_by")
+        )
+
+    async def entries(self, params):
+        return await self.run_blocking(api.process_entries_api, params, self.frame)
+
+    async def forecast(self, query):
+        return await self.run_blocking(
+            api.process_forecast_api, query.get("horizon", forecast.FORECAST_HORIZON),
+            self.frame, query.get("group_by", "category")
+        )
+
+    async def aggregates(self):
+        return await self.run_blocking(get_aggregates, self.frame)
+
+    async def recent_entries(self, n=3):
+        frame = self.frame
+        if frame.empty:
+            return []
+        return frame.sort_values('date', ascending=False).head(n).to_dict('records')
+
+    async def export_batches(self, period, category, batch_size):
+        frame = api.filter_period(self.frame, period)
+        if category:
+            frame = frame[frame['category'] == category]
+        frame = frame.sort_values(['date', '_id'], kind='stable')
+        for start in range(0, len(frame), batch_size):
+            yield frame.iloc[start:start + batch_size].to_dict('records')
+
+    async def health(self):
+        return {"status": "ok", "backend": "memory", "entries": len(self.frame)}
+
+    async def close(self):
+        pass
+
+class MotorBackend:
+    """Entries in MongoDB, accessed with the async motor driver"""
+
+    def __init__(self, run_blocking, uri=MONGO_URI):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        self.run_blocking = run_blocking
+        # Same pool, read preference and write concern as the pymongo client
+        self.client = AsyncIOMotorClient(uri, **client_options())
+        db = self.client[DB_NAME]
+        self.collection = db[COLLECTION_NAME]
+        # Aggregation reads, which may be routed to secondaries
+        self.analytics_collection = db.get_collection(COLLECTION_NAME, read_preference=read_preference(analytics=True))
+        self.rollup_collection = db[rollups.ROLLUP_COLLECTION_NAME]
+        self.analytics_rollup_collection = db.get_collection(
+            rollups.ROLLUP_COLLECTION_NAME, read_preference=read_preference(analytics=True)
+        )
+        self._cached_aggregates = None
+        self._transactions = None
+
+    # Await `write(session)` so entries and their rollups commit together,
+    # as rollups.write_together does for the blocking driver
+    async def _write_together(self, write):
+        if self._transactions is None:
+            try:
+                self._transactions = rollups.transactions_supported(await self.client.admin.command("hello"))
+            except Exception:
+                self._transactions = False
+        if not self._transactions:
+            return await write(None)
+        async with await self.client.start_session() as session:
+            return await session.with_transaction(write)
+
+    async def add_entries(self, rows, batch_size=DEFAULT_INSERT_BATCH_SIZE):
+        labelled, errors = await self.run_blocking(prepare_entries, pd.DataFrame(rows))
+        inserted = []
+
+        for start in range(0, len(labelled), batch_size):
+            batch = labelled[start:start + batch_size]
+            docs = [doc for _, doc in batch]
+            failed = set()
+
+            async def write(session):
+                pending = [i for i in range(len(docs)) if i not in failed]
+                try:
+                    await self.collection.insert_many([docs[i] for i in pending], ordered=False, session=session)
+                except BulkWriteError as e:
+                    for write_error in e.details.get("writeErrors", []):
+                        index = pending[write_error["index"]]
+                        failed.add(index)
+                        errors[batch[index][0]] = write_error.get("errmsg", "Insert failed")
+                    if session is not None:
+                        # The transaction is aborted; it is retried without these
+                        raise
+                operations, _ = rollups.rollup_operations([docs[i] for i in pending if i not in failed])
+                if operations:
+                    await self.rollup_collection.bulk_write(operations, ordered=False, session=session)
+
+            while True:
+                known = len(failed)
+                try:
+                    await self._write_together(write)
+                    break
+                except BulkWriteError:
+                    if len(failed) == known:
+                        raise
+            inserted.extend(doc for i, doc in enumerate(docs) if i not in failed)
+
+        self._cached_aggregates = None
+        return _report(len(inserted), errors)
+
+    async def _aggregates(self):
+        cached = self._cached_aggregates
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+        if STATS_BACKEND == "rollup":
+            docs = await self.analytics_rollup_collection.find({}, {"_id": 0}).to_list(None)
+            cube = partial(rollups.cube_frame, docs)
+        else:
+            groups = await self.analytics_collection.aggregate(mongo_pipelines.cube_pipeline()).to_list(None)
+            cube = partial(mongo_pipelines.cube_frame, groups)
+        aggregates = await self.run_blocking(lambda: WasteAggregates.from_cube(cube()))
+        self._cached_aggregates = (time.monotonic() + SERVER_AGGREGATES_TTL, aggregates)
+        return aggregates
+
+    async def stats(self, query):
+        try:
+            window = api.stats_window(query.get("period", "all"), query.get("start"), query.get("end"))
+            # Range sums from the date index of the (briefly cached) full cube
+            aggregates = await self._aggregates()
+            return await self.run_blocking(
+                api.stats_from_index, aggregates.date_index, *window, group_by=query.get("group_by")
+            )
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def forecast(self, query):
+        try:
+            aggregates = await self._aggregates()
+            return await self.run_blocking(
+                api.forecast_from_aggregates, aggregates,
+                int(query.get("horizon", forecast.FORECAST_HORIZON)), query.get("group_by", "category")
+            )
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def entries(self, params):
+        query = api.entries_query(params)
+        if query['sort'] not in ALL_COLUMNS:
+            query['sort'] = 'date'
+        match = api.mongo_entries_match(query)
+        after = api.mongo_entries_after(query)
+        find_filter, sort_spec = mongo_pipelines.page_query(match, query['sort'], query['ascending'], after)
+
+        cursor = self.collection.find(find_filter).sort(sort_spec)
+        if after is None:
+            cursor = cursor.skip(query['skip'])
+        docs = await cursor.limit(query['limit'] + 1).to_list(None)
+        total = await self.collection.count_documents(match)
+        return api.entries_page_from_docs(query, docs, total)
+
+    async def aggregates(self):
+        return await self._aggregates()
+
+    async def recent_entries(self, n=3):
+        cursor = self.collection.find({}).sort([("date", -1), ("_id", -1)]).limit(n)
+        return await cursor.to_list(None)
+
+    async def export_batches(self, period, category, batch_size):
+        match = export.export_match(period, category)
+        cursor = self.collection.find(match).sort(export.EXPORT_SORT).batch_size(batch_size)
+        while True:
+            docs = await cursor.to_list(batch_size)
+            if not docs:
+                break
+            yield docs
+
+    async def health(self):
+        try:
+            await self.client.admin.command("ping")
+            return {"status": "ok", "backend": "mongodb"}
+        except Exception as e:
+            return {"status": "error", "backend": "mongodb", "error": str(e)}
+
+    async def close(self):
+        self.client.close()
+
+def _report(inserted, errors):
+    return {
+        "inserted": inserted,
+        "errors": [{"row": row, "error": message} for row, message in sorted(errors.items())]
+    }
+
+# ?batch_size= clamped to [1, MAX_BATCH_SIZE]; ValueError when not a number
+def _batch_size(request, default):
+    try:
+        batch_size = int(request.query.get("batch_size", default))
+    except ValueError:
+        raise ValueError("batch_size must be an integer") from None
+    return min(max(batch_size, 1), MAX_BATCH_SIZE)
+
+def _respond(result, status=200):
+    if "error" in result and status == 200:
+        status = 400
+    return web.json_response(result, status=status)
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except Exception:
+        return None
+
+# ---- LLM calls over async HTTP ----
+
+# POST with the gateway's retry policy and circuit breaker; returns the
+# JSON body of the first successful attempt
+async def _post_llm(http, backend, url, headers, payload):
+    with llm_gateway.circuit_guard(backend), metrics.span(f"llm.{backend}"):
+        last_error = None
+        for attempt in range(llm_gateway.LLM_MAX_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(llm_gateway.backoff_delay(attempt))
+            try:
+                async with http.post(url, headers=headers, json=payload) as response:
+                    if response.status == 200:
+                        return await response.json()
+                    last_error = f"HTTP {response.status}"
+                    if response.status not in llm_gateway.RETRY_STATUSES:
+                        break
+            except (ClientError, asyncio.TimeoutError) as e:
+                last_error = repr(e)
+
+        raise llm_gateway.LLMError(f"{backend} request failed: {last_error}")
+
+async def _deepseek_answer(http, message):
+    if not os.getenv("DEEPSEEK_API_KEY"):
+        return None
+    try:
+        body = await _post_llm(http, "deepseek", llm_gateway.DEEPSEEK_URL,
+                               llm_gateway.deepseek_headers(), deepseek_payload(message))
+        return parse_deepseek_response(body)
+    except Exception:
+        return None
+
+async def _anthropic_answer(http, message, data_context):
+    body = await _post_llm(http, "anthropic", llm_gateway.ANTHROPIC_URL,
+                           llm_gateway.anthropic_headers(),
+                           api.anthropic_payload(message, data_context))
+    return "".join(block.get("text", "") for block in body.get("content", []))
+
+# ---- Handlers ----
+
+async def chat(request):
+    body = await _json_body(request) or {}
+    message = body.get("message")
+    if not message:
+        return _respond({"error": "Missing 'message' field"})
+
+    aggregates = await request.app[BACKEND].aggregates()
+    mode = CHATBOT_MODE
+    key = make_key(message, f"chatbot:{mode}", None if aggregates.empty else aggregates.fingerprint)
+    answer = response_cache.get(key)
+    if answer is not None:
+        return _respond({"response": answer})
+
+    answer = answer_from_aggregates(message, aggregates)
+    if answer is None and mode == "online":
+        answer = await _deepseek_answer(request.app[HTTP], message)
+    if answer is None and mode != "offline":
+        loop = asyncio.get_running_loop()
+        answer = await loop.run_in_executor(request.app[EXECUTOR], get_local_llm_response, message)
+    if answer is None:
+        return _respond({"response": get_local_response(message, "offline")})
+
+    response_cache.set(key, answer)
+    return _respond({"response": answer})
+
+async def add_waste(request):
+    data = await _json_body(request)
+    if not isinstance(data, dict):
+        return _respond({"error": "Expected a JSON object"})
+
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            return _respond({"error": f"Missing required field: {field}"})
+
+    report = await request.app[BACKEND].add_entries([data])
+    if report["errors"]:
+        return _respond({"error": report["errors"][0]["error"]})
+    return _respond({"success": True, "message": "Waste entry added successfully"})
+
+async def add_waste_bulk(request):
+    data = await _json_body(request)
+    if not isinstance(data, list):
+        return _respond({"error": "Expected a list of waste entries"})
+
+    try:
+        batch_size = _batch_size(request, DEFAULT_INSERT_BATCH_SIZE)
+    except ValueError as e:
+        return _respond({"error": str(e)}, status=400)
+    report = await request.app[BACKEND].add_entries(data, batch_size)
+    return _respond({
+        "success": not report["errors"],
+        "inserted": report["inserted"],
+        "failed": len(report["errors"]),
+        "errors": report["errors"]
+    })
+
+async def stats(request):
+    return _respond(await request.app[BACKEND].stats(request.query))
+
+async def forecast_waste(request):
+    return _respond(await request.app[BACKEND].forecast(request.query))
+
+async def entries(request):
+    try:
+        return _respond(await request.app[BACKEND].entries(dict(request.query)))
+    except Exception as e:
+        return _respond({"error": str(e)})
+
+# Streamed export: each batch is encoded off the event loop and sent
+# before the next one is read
+async def export_entries(request):
+    file_format = request.query.get("format", "csv")
+    try:
+        batch_size = _batch_size(request, export.EXPORT_BATCH_SIZE)
+        writer = export.make_writer(file_format)
+    except ValueError as e:
+        return _respond({"error": str(e)}, status=400)
+    except ImportError:
+        return _respond({"error": "Parquet export needs pyarrow"}, status=501)
+
+    backend = request.app[BACKEND]
+    response = web.StreamResponse(headers={
+        "Content-Type": export.FORMATS[file_format],
+        "Content-Disposition": f'attachment; filename="waste_entries.{file_format}"'
+    })
+    await response.prepare(request)
+    batches = backend.export_batches(request.query.get("period", "all"), request.query.get("category"), batch_size)
+    async for docs in batches:
+        chunk = await backend.run_blocking(lambda: writer.write(export.entries_frame(docs)))
+        if chunk:
+            await response.write(chunk)
+    await response.write(await backend.run_blocking(writer.close))
+    await response.write_eof()
+    return response
+
+async def anthropic(request):
+    body = await _json_body(request) or {}
+    message = body.get("message")
+    if not message:
+        return _respond({"error": "Missing 'message' field"})
+    if not os.environ.get("ANTHROPIC_API_KEY"):
+        return _respond({
+            "error": "ANTHROPIC_API_KEY is not set. Please set up your API key in the environment variables."
+        })
+
+    backend = request.app[BACKEND]
+    aggregates, recent = await asyncio.gather(backend.aggregates(), backend.recent_entries(3))
+    data_context = ""
+    if not aggregates.empty:
+        data_context = api.anthropic_data_context(aggregates.as_stats(), recent)
+
+    key = api.anthropic_cache_key(message, data_context)
+    answer = response_cache.get(key)
+    if answer is not None:
+        return _respond({"response": answer})
+
+    try:
+        answer = await _anthropic_answer(request.app[HTTP], message, data_context)
+    except Exception as e:
+        return _respond({"error": str(e)}, status=502)
+    response_cache.set(key, answer)
+    return _respond({"response": answer})
+
+async def health(request):
+    return _respond(await request.app[BACKEND].health())
+
+async def llm_metrics(request):
+    return _respond(api.process_llm_metrics_api())
+
+async def llm_circuits(request):
+    return _respond(api.process_llm_circuits_api())
+
+async def cache_stats(request):
+    return _respond(api.process_response_cache_api())
+
+async def timings(request):
+    return _respond(api.process_metrics_api())
+
+async def prometheus(request):
+    return web.Response(text=metrics.prometheus_text(),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+# ---- Application ----
+
+def create_app(memory=False, executor_workers=EXECUTOR_WORKERS):
+    """Build the aiohttp application; memory=True uses the in-memory store"""
+    app = web.Application()
+    executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="api-worker")
+    app[EXECUTOR] = executor
+
+    async def run_blocking(func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+    async def on_startup(app):
+        app[HTTP] = ClientSession(timeout=ClientTimeout(
+            total=LLM_TIMEOUT,
+            sock_connect=llm_gateway.LLM_CONNECT_TIMEOUT,
+            sock_read=llm_gateway.LLM_READ_TIMEOUT
+        ))
+        app[BACKEND] = MemoryBackend(run_blocking) if memory else MotorBackend(run_blocking)
+        if CHATBOT_MODE != "offline":
+            local_llm.warm_up()
+
+    async def on_cleanup(app):
+        await app[HTTP].close()
+        await app[BACKEND].close()
+        executor.shutdown(wait=False)
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.add_routes([
+        web.post("/api/chat", chat),
+        web.post("/api/waste", add_waste),
+        web.post("/api/waste/bulk", add_waste_bulk),
+        web.get("/api/stats", stats),
+        web.get("/api/forecast", forecast_waste),
+        web.get("/api/entries", entries),
+        web.get("/api/export", export_entries),
+        web.post("/api/anthropic", anthropic),
+        web.get("/api/health", health),
+        web.get("/api/llm/metrics", llm_metrics),
+        web.get("/api/llm/circuits", llm_circuits),
+        web.get("/api/cache/responses", cache_stats),
+        web.get("/api/metrics", timings),
+        web.get("/metrics", prometheus),
+    ])
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Food Waste Tracker API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--memory", action="store_true", help="Keep entries in memory instead of MongoDB")
+    parser.add_argument("--workers", type=int, default=EXECUTOR_WORKERS,
+                        help="Threads for blocking pandas / local LLM work")
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.memory, args.workers), host=args.host, port=args.port)
@@ -0,0 +1,555 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import indexes
+import mongo_pipelines
+import rollups
+from database import get_collection, health_check
+
+"""
+Storage engines behind food_waste_data.
+
+Every engine offers the same operations on waste entry documents:
+
+    insert_one(doc)         store one entry (sets doc["_id"]), returns its id
+    insert_many(docs)       unordered bulk insert, returns {index: error message}
+    delete_one(id_str)      delete by id, returns the deleted entry or None
+    update_quantity_kg(entries, values)
+                            overwrite quantity_kg of stored entries in bulk
+    find(match, columns, sort, skip, limit, batch_size)
+                            iterate the entries matching a filter
+    count(match), estimated_count()
+    cube(match)             quantity_kg sums and counts per (date, category, reason)
+    reconcile_rollups()     repair pre-aggregated totals, returns buckets changed
+    ensure_indexes(), health()
+
+Filters and sort specs use the MongoDB syntax the app already builds
+(mongo_pipelines.range_match and page_query, the cache watermark); the SQL
+engines translate that subset (equality, $gt/$gte/$lt/$lte/$ne/$in,
+$regex with the "i" option, $and, $or) into WHERE clauses.
+
+    STORAGE_BACKEND=mongo    MongoDB through pymongo (default)
+    STORAGE_BACKEND=sqlite   embedded SQLite database at STORAGE_PATH
+    STORAGE_BACKEND=duckdb   embedded DuckDB database (needs the duckdb package)
+
+The embedded engines run the sums, groupbys and period filters in-process
+with SQL, so a single-site install needs no database server, and
+STORAGE_PATH=:memory: gives a throwaway store for tests and benchmarks.
+"""
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+STORAGE_PATH = os.getenv("STORAGE_PATH", "food_waste.db")
+
+# Where MongoStorage.cube (and the API server) read the statistics from:
+# "pipeline" groups the raw entries, "rollup" reads the pre-aggregated
+# collection. The rollups are maintained on every MongoDB write whichever
+# is chosen, so switching to "rollup" needs no backfill; "pipeline" stays
+# the default because it is exact even on standalone servers, where a
+# rollup can be off until the next reconcile (see rollups.py).
+STATS_BACKEND = os.getenv("STATS_BACKEND", "pipeline")
+
+# Fields returned by delete_one, enough to reverse the entry's rollups
+_DELETED_FIELDS = ("_id", "date", "category", "reason", "quantity_kg")
+
+class MongoStorage:
+    """Entries in the waste_entries collection, rollups maintained on write
+    (in the same transaction where the deployment supports them)"""
+
+    name = "mongo"
+
+    def __init__(self, collection=None, rollup_collection=None):
+        self.collection = collection if collection is not None else get_collection()
+        self.rollup_collection = (rollup_collection if rollup_collection is not None
+                                  else get_collection(rollups.ROLLUP_COLLECTION_NAME))
+        # Aggregation reads, which may be routed to secondaries
+        if collection is None:
+            self.analytics_collection = get_collection(analytics=True)
+            self.analytics_rollup_collection = get_collection(rollups.ROLLUP_COLLECTION_NAME, analytics=True)
+        else:
+            self.analytics_collection = self.collection
+            self.analytics_rollup_collection = self.rollup_collection
+
+    def insert_one(self, doc):
+        def write(session):
+            result = self.collection.insert_one(doc, session=session)
+            rollups.apply_entries(self.rollup_collection, [doc], session=session)
+            return str(result.inserted_id)
+        return rollups.write_together(self.collection, write)
+
+    def insert_many(self, docs):
+        failed = {}
+        if not docs:
+            return failed
+
+        def write(session):
+            pending = [i for i in range(len(docs)) if i not in failed]
+            try:
+                self.collection.insert_many([docs[i] for i in pending], ordered=False, session=session)
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    failed[pending[write_error["index"]]] = write_error.get("errmsg", "Insert failed")
+                if session is not None:
+                    # The transaction is aborted; it is retried without these
+                    raise
+            inserted = [docs[i] for i in pending if i not in failed]
+            if inserted:
+                rollups.apply_entries(self.rollup_collection, inserted, session=session)
+
+        while True:
+            known = len(failed)
+            try:
+                rollups.write_together(self.collection, write)
+                return failed
+            except BulkWriteError:
+                if len(failed) == known:
+                    raise
+
+    def delete_one(self, id_str):
+        def write(session):
+            deleted = self.collection.find_one_and_delete(
+                {"_id": ObjectId(id_str)},
+                projection={name: 1 for name in _DELETED_FIELDS},
+                session=session
+            )
+            if deleted:
+                rollups.apply_entries(self.rollup_collection, [deleted], sign=-1, session=session)
+            return deleted
+        return rollups.write_together(self.collection, write)
+
+    def update_quantity_kg(self, entries, values):
+        if not entries:
+            return 0
+
+        def write(session):
+            result = self.collection.bulk_write([
+                UpdateOne({"_id": entry["_id"]}, {"$set": {"quantity_kg": value}})
+                for entry, value in zip(entries, values)
+            ], ordered=False, session=session)
+            # Add the new totals before removing the old ones so no bucket
+            # passes through zero and gets dropped
+            rollups.apply_entries(self.rollup_collection,
+                                  [dict(entry, quantity_kg=value) for entry, value in zip(entries, values)],
+                                  session=session)
+            rollups.apply_entries(self.rollup_collection, entries, sign=-1, session=session)
+            return result.modified_count
+        return rollups.write_together(self.collection, write)
+
+    def reconcile_rollups(self):
+        return rollups.reconcile(self.collection, self.rollup_collection)
+
+    def find(self, match=None, columns=None, sort=None, skip=0, limit=None, batch_size=None):
+        projection = None
+        if columns is not None:
+            projection = {name: 1 for name in columns}
+            if "_id" not in columns:
+                projection["_id"] = 0
+
+        cursor = self.collection.find(match or {}, projection)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    def count(self, match=None):
+        return self.collection.count_documents(match or {})
+
+    def estimated_count(self):
+        return self.collection.estimated_document_count()
+
+    def cube(self, match=None):
+        if STATS_BACKEND == "rollup":
+            return rollups.cube(self.analytics_rollup_collection, match)
+        return mongo_pipelines.cube(self.analytics_collection, match)
+
+    def ensure_indexes(self):
+        return indexes.ensure_indexes(self.collection)
+
+    def health(self):
+        return dict(health_check(), backend=self.name)
+
+# Mongo comparison operators and their SQL equivalents
+_COMPARISONS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+# SQLite's `value REGEXP pattern` operator
+def _regexp(pattern, value):
+    return value is not None and re.search(pattern, str(value)) is not None
+
+class SQLiteStorage:
+    """Entries in one table of an embedded SQLite database"""
+
+    name = "sqlite"
+    TABLE = "waste_entries"
+    # Dates are stored as fixed-width ISO text, which sorts chronologically
+    COLUMN_TYPES = {
+        "_id": "TEXT PRIMARY KEY",
+        "food_item": "TEXT",
+        "category": "TEXT",
+        "quantity": "REAL",
+        "unit": "TEXT",
+        "quantity_kg": "REAL",
+        "date": "TEXT",
+        "reason": "TEXT",
+        "notes": "TEXT",
+        "entry_timestamp": "TEXT",
+    }
+    DATE_COLUMNS = ("date", "entry_timestamp")
+    FETCH_SIZE = 5000
+
+    def __init__(self, path=STORAGE_PATH):
+        self.path = path
+        self.columns = list(self.COLUMN_TYPES)
+        self._lock = threading.RLock()
+        self._conn = self._connect(path)
+        columns = ", ".join(f"{name} {kind}" for name, kind in self.COLUMN_TYPES.items())
+        with self._lock:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} ({columns})")
+
+    def _connect(self, path):
+        # Autocommit; multi-row writes open their own transaction
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.create_function("REGEXP", 2, _regexp, deterministic=True)
+        return conn
+
+    def _regex_clause(self, column):
+        return f"{column} REGEXP ?"
+
+    # ---- Values in and out of SQL ----
+
+    def _param(self, value):
+        if isinstance(value, ObjectId):
+            return str(value)
+        if isinstance(value, pd.Timestamp):
+            value = value.to_pydatetime()
+        elif isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = pd.Timestamp(value).tz_convert("UTC").tz_localize(None).to_pydatetime()
+            return value.isoformat(sep=" ", timespec="microseconds")
+        if isinstance(value, date):
+            return datetime.combine(value, datetime.min.time()).isoformat(sep=" ", timespec="microseconds")
+        return value
+
+    def _value(self, name, value):
+        if name in self.DATE_COLUMNS and isinstance(value, str):
+            return datetime.fromisoformat(value)
+        return value
+
+    def _document(self, columns, row):
+        return {name: self._value(name, value) for name, value in zip(columns, row)}
+
+    def _row(self, doc):
+        if doc.get("_id") is None:
+            doc["_id"] = ObjectId()
+        return tuple(self._param(doc.get(name)) for name in self.columns)
+
+    # ---- Mongo filters as SQL ----
+
+    def _column(self, field):
+        if field not in self.COLUMN_TYPES:
+            raise ValueError(f"Unknown field {field!r}")
+        return field
+
+    def _where(self, match, params):
+        clauses = []
+        for field, condition in (match or {}).items():
+            if field in ("$and", "$or"):
+                parts = [f"({self._where(part, params)})" for part in condition]
+                if parts:
+                    clauses.append("(" + f" {field[1:].upper()} ".join(parts) + ")")
+                else:
+                    clauses.append("1 = 1" if field == "$and" else "1 = 0")
+                continue
+
+            column = self._column(field)
+            if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+                for op, value in condition.items():
+                    if op in _COMPARISONS:
+                        clauses.append(f"{column} {_COMPARISONS[op]} ?")
+                        params.append(self._param(value))
+                    elif op == "$ne":
+                        if value is None:
+                            clauses.append(f"{column} IS NOT NULL")
+                        else:
+                            clauses.append(f"({column} IS NULL OR {column} <> ?)")
+                            params.append(self._param(value))
+                    elif op == "$regex":
+                        flags = "(?i)" if "i" in condition.get("$options", "") else ""
+                        clauses.append(self._regex_clause(column))
+                        params.append(flags + value)
+                    elif op == "$options":
+                        continue
+                    elif op == "$in":
+                        values = [self._param(v) for v in value]
+                        if values:
+                            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                            params.extend(values)
+                        else:
+                            clauses.append("1 = 0")
+                    else:
+                        raise ValueError(f"Unsupported operator {op!r}")
+            elif condition is None:
+                clauses.append(f"{column} IS NULL")
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(self._param(condition))
+        return " AND ".join(clauses) or "1 = 1"
+
+    # Missing values sort first ascending and last descending, as in MongoDB
+    def _order_by(self, sort):
+        return ", ".join(
+            f"{self._column(field)} {'ASC NULLS FIRST' if direction > 0 else 'DESC NULLS LAST'}"
+            for field, direction in sort
+        )
+
+    # ---- Storage operations ----
+
+    def _insert_sql(self):
+        return f"INSERT INTO {self.TABLE} ({', '.join(self.columns)}) VALUES ({', '.join('?' * len(self.columns))})"
+
+    def _bulk_insert(self, rows):
+        self._conn.executemany(self._insert_sql(), rows)
+
+    # Insert rows one by one in a single transaction, recording the rejected
+    # ones in `failed`. A failing statement only undoes itself in SQLite.
+    def _insert_each(self, rows, failed):
+        sql = self._insert_sql()
+        self._conn.execute("BEGIN TRANSACTION")
+        try:
+            for i, row in enumerate(rows):
+                try:
+                    self._conn.execute(sql, row)
+                except Exception as e:
+                    failed[i] = str(e)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def insert_one(self, doc):
+        row = self._row(doc)
+        with self._lock:
+            self._conn.execute(self._insert_sql(), row)
+        return str(doc["_id"])
+
+    def insert_many(self, docs):
+        failed = {}
+        if not docs:
+            return failed
+        rows = [self._row(doc) for doc in docs]
+        with self._lock:
+            self._conn.execute("BEGIN TRANSACTION")
+            try:
+                self._bulk_insert(rows)
+                self._conn.execute("COMMIT")
+                return failed
+            except Exception:
+                self._conn.execute("ROLLBACK")
+
+            # Some row was rejected: insert one by one to report which
+            self._insert_each(rows, failed)
+        return failed
+
+    def delete_one(self, id_str):
+        key = str(ObjectId(id_str))  # same validation as MongoDB ids
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_DELETED_FIELDS)} FROM {self.TABLE} WHERE _id = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(f"DELETE FROM {self.TABLE} WHERE _id = ?", (key,))
+        return self._document(_DELETED_FIELDS, row)
+
+    def update_quantity_kg(self, entries, values):
+        rows = [(self._param(value), self._param(entry["_id"])) for entry, value in zip(entries, values)]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN TRANSACTION")
+            try:
+                self._conn.executemany(f"UPDATE {self.TABLE} SET quantity_kg = ? WHERE _id = ?", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def find(self, match=None, columns=None, sort=None, skip=0, limit=None, batch_size=None):
+        columns = [name for name in (columns or self.columns) if name in self.COLUMN_TYPES]
+        params = []
+        sql = f"SELECT {', '.join(columns)} FROM {self.TABLE} WHERE {self._where(match, params)}"
+        if sort:
+            sql += f" ORDER BY {self._order_by(sort)}"
+        if limit or skip:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit or 2 ** 62, skip])
+        return self._iterate(sql, params, columns, batch_size or self.FETCH_SIZE)
+
+    # Rows of a query as documents, read `batch_size` at a time
+    def _iterate(self, sql, params, columns, batch_size):
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute(sql, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield self._document(columns, row)
+
+    def count(self, match=None):
+        params = []
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM {self.TABLE} WHERE {self._where(match, params)}", params
+            ).fetchone()[0]
+
+    def estimated_count(self):
+        return self.count()
+
+    def reconcile_rollups(self):
+        # cube() groups the table itself; there are no rollups to drift
+        return 0
+
+    def cube(self, match=None):
+        params = []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT date, category, reason, SUM(quantity_kg), COUNT(*) FROM {self.TABLE} "
+                f"WHERE {self._where(match, params)} GROUP BY date, category, reason",
+                params
+            ).fetchall()
+        frame = pd.DataFrame(rows, columns=["date", "category", "reason", "quantity_kg", "count"])
+        frame["date"] = pd.to_datetime(frame["date"], errors="coerce")
+        frame["quantity_kg"] = frame["quantity_kg"].astype("float64")
+        return frame
+
+    def ensure_indexes(self):
+        with self._lock:
+            for name, keys in indexes.WASTE_INDEXES.items():
+                fields = ", ".join(self._column(field) for field, _ in keys)
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {self.TABLE} ({fields})")
+        return list(indexes.WASTE_INDEXES)
+
+    def health(self):
+        started = time.perf_counter()
+        try:
+            entries = self.count()
+            status, error = "ok", None
+        except Exception as e:
+            entries, status, error = None, "error", str(e)
+        return {
+            "status": status,
+            "error": error,
+            "ping_ms": round((time.perf_counter() - started) * 1000, 2),
+            "backend": self.name,
+            "path": self.path,
+            "entries": entries,
+        }
+
+class DuckDBStorage(SQLiteStorage):
+    """Entries in an embedded DuckDB database (columnar, vectorized aggregation)"""
+
+    name = "duckdb"
+    COLUMN_TYPES = {
+        "_id": "VARCHAR PRIMARY KEY",
+        "food_item": "VARCHAR",
+        "category": "VARCHAR",
+        "quantity": "DOUBLE",
+        "unit": "VARCHAR",
+        "quantity_kg": "DOUBLE",
+        "date": "TIMESTAMP",
+        "reason": "VARCHAR",
+        "notes": "VARCHAR",
+        "entry_timestamp": "TIMESTAMP",
+    }
+
+    def _connect(self, path):
+        import duckdb
+        return duckdb.connect(path)
+
+    def _regex_clause(self, column):
+        return f"regexp_matches({column}, ?)"
+
+    # One vectorized INSERT ... SELECT from the batch as a DataFrame
+    # instead of a statement per row
+    def _bulk_insert(self, rows):
+        columns = ", ".join(self.columns)
+        self._conn.register("incoming_entries", pd.DataFrame.from_records(rows, columns=self.columns))
+        try:
+            self._conn.execute(f"INSERT INTO {self.TABLE} ({columns}) SELECT {columns} FROM incoming_entries")
+        finally:
+            self._conn.unregister("incoming_entries")
+
+    # Any error aborts a whole DuckDB transaction, so it is restarted
+    # without each rejected row until the rest goes through
+    def _insert_each(self, rows, failed):
+        sql = self._insert_sql()
+        while True:
+            self._conn.execute("BEGIN TRANSACTION")
+            for i, row in enumerate(rows):
+                if i in failed:
+                    continue
+                try:
+                    self._conn.execute(sql, row)
+                except Exception as e:
+                    self._conn.execute("ROLLBACK")
+                    failed[i] = str(e)
+                    break
+            else:
+                self._conn.execute("COMMIT")
+                return
+
+    def _param(self, value):
+        if isinstance(value, (datetime, date, pd.Timestamp)):
+            value = pd.Timestamp(value)
+            if value.tzinfo is not None:
+                value = value.tz_convert("UTC").tz_localize(None)
+            return value.to_pydatetime()
+        return super()._param(value)
+
+    def ensure_indexes(self):
+        # Range filters are served by DuckDB's per-block min/max (zonemaps);
+        # secondary ART indexes would only slow down bulk inserts
+        return []
+
+_ENGINES = {
+    "mongo": MongoStorage,
+    "sqlite": SQLiteStorage,
+    "duckdb": DuckDBStorage,
+}
+
+def create_storage(backend=STORAGE_BACKEND, path=STORAGE_PATH):
+    """A new storage engine by name ("mongo", "sqlite" or "duckdb")"""
+    if backend not in _ENGINES:
+        raise ValueError(f"Unknown storage backend {backend!r}, expected one of {sorted(_ENGINES)}")
+    if backend == "mongo":
+        return MongoStorage()
+    return _ENGINES[backend](path)
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """The process-wide storage engine selected by STORAGE_BACKEND"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
@@ -0,0 +1,157 @@
+import argparse
+import numpy as np
+import pandas as pd
+from bson.objectid import ObjectId
+from food_waste_data import CATEGORICAL_COLUMNS, FLOAT_COLUMNS
+from units import to_kg_batch
+
+"""
+Synthetic waste entries for benchmarks and demos.
+
+Entries use the categories, reasons and units of the entry form with
+skewed frequencies, log-normal quantities per unit, more waste on weekends
+and a mild seasonal swing, spread over several years of dates. Rows are
+generated vectorized in chunks, so even 10M entries stay within memory.
+
+    python synthetic.py 100000 entries.csv     # write a file for importer.py
+"""
+
+CATEGORIES = {
+    "Vegetables": 0.27, "Fruits": 0.21, "Dairy": 0.16,
+    "Grains": 0.13, "Meat": 0.11, "Others": 0.12,
+}
+REASONS = {
+    "Expired": 0.30, "Spoiled": 0.26, "Leftover": 0.24,
+    "Overcooked": 0.08, "Others": 0.12,
+}
+FOOD_ITEMS = {
+    "Vegetables": ["Lettuce", "Tomatoes", "Spinach", "Carrots", "Potatoes", "Cucumber"],
+    "Fruits": ["Bananas", "Apples", "Strawberries", "Oranges", "Grapes"],
+    "Dairy": ["Milk", "Yogurt", "Cheese", "Cream", "Butter"],
+    "Grains": ["Bread", "Rice", "Pasta", "Bagels", "Tortillas"],
+    "Meat": ["Chicken", "Beef", "Pork", "Fish", "Sausages"],
+    "Others": ["Soup", "Sauce", "Eggs", "Salad", "Sandwiches"],
+}
+# Unit mix and log-normal (median, sigma) quantity in that unit
+UNITS = {
+    "kg": (0.55, 0.8, 0.6),
+    "lbs": (0.15, 1.5, 0.6),
+    "servings": (0.20, 3.0, 0.5),
+    "items": (0.10, 4.0, 0.7),
+}
+
+DEFAULT_CHUNK_SIZE = 500_000
+
+def _choice(rng, table, n):
+    labels = list(table)
+    weights = np.array(list(table.values()), dtype="float64")
+    return rng.choice(len(labels), size=n, p=weights / weights.sum()), labels
+
+# Day offsets weighted towards weekends and the winter holidays
+def _dates(rng, n, start, days):
+    calendar = pd.date_range(start, periods=days, freq="D")
+    weights = np.where(calendar.dayofweek >= 5, 1.4, 1.0)
+    weights = weights * (1 + 0.15 * np.cos(2 * np.pi * (calendar.dayofyear.to_numpy() - 355) / 365.25))
+    picks = rng.choice(days, size=n, p=weights / weights.sum())
+    seconds = rng.integers(6 * 3600, 23 * 3600, size=n)
+    return calendar.values[picks] + seconds.astype("timedelta64[s]")
+
+def generate_chunk(n, rng, start, days):
+    """One chunk of synthetic entries as a DataFrame of raw field values"""
+    category_codes, categories = _choice(rng, CATEGORIES, n)
+    reason_codes, reasons = _choice(rng, REASONS, n)
+    unit_codes, units = _choice(rng, {unit: spec[0] for unit, spec in UNITS.items()}, n)
+
+    medians = np.array([UNITS[unit][1] for unit in units])[unit_codes]
+    sigmas = np.array([UNITS[unit][2] for unit in units])[unit_codes]
+    quantity = np.round(medians * np.exp(sigmas * rng.standard_normal(n)), 2).clip(0.01)
+
+    # Item within the category
+    item_index = rng.integers(0, 1 << 30, size=n)
+    items = np.empty(n, dtype=object)
+    for code, category in enumerate(categories):
+        rows = category_codes == code
+        names = np.array(FOOD_ITEMS[category], dtype=object)
+        items[rows] = names[item_index[rows] % len(names)]
+
+    unit_values = np.array(units, dtype=object)[unit_codes]
+    quantity_kg = to_kg_batch(quantity, unit_values, items)
+
+    dates = _dates(rng, n, start, days)
+    return pd.DataFrame({
+        "food_item": items,
+        "category": np.array(categories, dtype=object)[category_codes],
+        "quantity": quantity,
+        "unit": unit_values,
+        "quantity_kg": quantity_kg,
+        # Entries are logged on the day, without a time of day
+        "date": dates.astype("datetime64[D]").astype("datetime64[ns]"),
+        "reason": np.array(reasons, dtype=object)[reason_codes],
+        "notes": "",
+        "entry_timestamp": dates,
+    })
+
+def iter_entries(n, years=3, seed=0, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield `n` synthetic entries in DataFrame chunks, ending today (or `end`)"""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or pd.Timestamp.now()).normalize()
+    days = int(365.25 * years)
+    start = end - pd.Timedelta(days=days - 1)
+    for offset in range(0, n, chunk_size):
+        yield generate_chunk(min(chunk_size, n - offset), rng, start, days)
+
+def generate_entries(n, years=3, seed=0, end=None):
+    """`n` (>= 1) synthetic entries as one DataFrame of raw field values"""
+    return pd.concat(iter_entries(n, years, seed, end), ignore_index=True)
+
+_HEX = np.array([f"{byte:02x}" for byte in range(256)])
+
+def object_ids(n):
+    """`n` distinct ObjectId strings, built without creating ObjectId objects"""
+    prefix = np.frombuffer(ObjectId().binary[:8], dtype=np.uint8)
+    counter = np.arange(n, dtype=">u4").view(np.uint8).reshape(n, 4)
+    raw = np.hstack([np.broadcast_to(prefix, (n, 8)), counter])
+    # 12 two-character hex strings per row, viewed as one 24-character string
+    return pd.Series(np.ascontiguousarray(_HEX[raw]).view("<U24").ravel(), dtype=object)
+
+def typed_frame(entries, columns=None):
+    """Entries in the typed layout initialize_data produces (with fresh ids)"""
+    columns = list(columns) if columns is not None else ["_id", *entries.columns]
+    frame = {}
+    for name in columns:
+        if name == "_id":
+            frame[name] = object_ids(len(entries))
+        elif name in CATEGORICAL_COLUMNS:
+            frame[name] = pd.Categorical(entries[name])
+        elif name in FLOAT_COLUMNS:
+            frame[name] = entries[name].to_numpy(dtype="float64")
+        else:
+            frame[name] = entries[name].to_numpy()
+    return pd.DataFrame(frame)
+
+def to_documents(entries):
+    """Entries as MongoDB documents"""
+    records = entries.to_dict("records")
+    for record in records:
+        record["date"] = record["date"].to_pydatetime()
+        record["entry_timestamp"] = record["entry_timestamp"].to_pydatetime()
+    return records
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic waste entries to CSV or JSONL")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("path", help="Output file (.csv or .jsonl)")
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    jsonl = args.path.lower().endswith((".jsonl", ".ndjson"))
+    with open(args.path, "w", newline="", encoding="utf-8") as f:
+        for i, chunk in enumerate(iter_entries(args.rows, args.years, args.seed)):
+            chunk = chunk.drop(columns=["quantity_kg", "entry_timestamp"])
+            chunk["date"] = chunk["date"].dt.strftime("%Y-%m-%d")
+            if jsonl:
+                chunk.to_json(f, orient="records", lines=True)
+            else:
+                chunk.to_csv(f, index=False, header=(i == 0))
+    print(f"Wrote {args.rows} entries to {args.path}")
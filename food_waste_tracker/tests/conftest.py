@@ -0,0 +1,25 @@
+import os
+import sys
+import pytest
+
+# The app modules import each other by bare name (import api), as when run
+# from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the suite hermetic: embedded throwaway store, no LLM calls, no
+# persistent response cache
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+os.environ.setdefault("CHATBOT_MODE", "offline")
+os.environ.setdefault("RESPONSE_CACHE_DB", "")
+
+@pytest.fixture
+def fresh_store(monkeypatch):
+    """An empty embedded store behind food_waste_data, with nothing cached"""
+    import food_waste_data
+    import storage
+
+    store = storage.SQLiteStorage(":memory:")
+    monkeypatch.setattr(food_waste_data, "store", store)
+    monkeypatch.setattr(food_waste_data, "_caches", {})
+    return store
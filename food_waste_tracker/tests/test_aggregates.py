@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aggregates import WasteAggregates
+
+# Raw entries with times of day, so daily buckets have to normalize
+def _entries(n=500, seed=7):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "date": pd.Timestamp("2023-11-20") + pd.to_timedelta(rng.integers(0, 90 * 24, n), unit="h"),
+        "category": rng.choice(["Dairy", "Fruits", "Grains", "Meat"], n),
+        "reason": rng.choice(["Expired", "Spoiled", "Leftover"], n),
+        "quantity_kg": rng.lognormal(0, 1, n),
+    })
+
+def _same(series, expected):
+    pd.testing.assert_series_equal(series.sort_index(), expected.sort_index(), check_names=False,
+                                   check_index_type=False, check_freq=False)
+
+def test_rollups_match_pandas_groupbys():
+    df = _entries()
+    aggregates = WasteAggregates.from_frame(df)
+
+    assert aggregates.count == len(df)
+    assert aggregates.total == pytest.approx(df["quantity_kg"].sum())
+    _same(aggregates.by_category, df.groupby("category")["quantity_kg"].sum())
+    _same(aggregates.by_reason, df.groupby("reason")["quantity_kg"].sum())
+
+    daily = df.groupby(df["date"].dt.normalize())["quantity_kg"].sum()
+    _same(aggregates.daily_by_day, daily)
+    monthly = df.groupby(df["date"].dt.strftime("%Y-%m"))["quantity_kg"].sum()
+    _same(aggregates.monthly, monthly)
+
+    total, daily_avg, top_category = aggregates.as_stats()
+    by_date = df.groupby("date")["quantity_kg"].sum()
+    assert daily_avg == pytest.approx(by_date.mean())
+    assert top_category == df.groupby("category")["quantity_kg"].sum().idxmax()
+
+def test_combine_adds_and_removes_entries():
+    df = _entries()
+    head, tail = df.iloc[:300], df.iloc[300:]
+    full = WasteAggregates.from_frame(df)
+
+    combined = WasteAggregates.from_frame(head).combine(WasteAggregates.from_frame(tail))
+    assert combined.count == full.count
+    _same(combined.by_category, full.by_category)
+    _same(combined.daily_by_day, full.daily_by_day)
+
+    removed = full.combine(WasteAggregates.from_frame(tail), sign=-1)
+    assert removed.count == len(head)
+    _same(removed.by_reason, head.groupby("reason")["quantity_kg"].sum())
+
+def test_empty_data():
+    aggregates = WasteAggregates.from_frame(pd.DataFrame())
+    assert aggregates.empty
+    assert aggregates.as_stats() == (0, 0, "N/A")
+
+def test_fingerprint_ignores_row_order():
+    df = _entries()
+    shuffled = df.sample(frac=1, random_state=1)
+    assert WasteAggregates.from_frame(df).fingerprint == WasteAggregates.from_frame(shuffled).fingerprint
+    assert WasteAggregates.from_frame(df).fingerprint != WasteAggregates.from_frame(df.iloc[1:]).fingerprint
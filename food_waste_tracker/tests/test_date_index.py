@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aggregates import WasteAggregates
+from date_index import DateIndex
+
+def _entries(n=400, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 120, n), unit="D"),
+        "category": rng.choice(["Dairy", "Fruits", "Meat"], n),
+        "reason": rng.choice(["Expired", "Spoiled"], n),
+        "quantity_kg": rng.lognormal(0, 1, n),
+    })
+
+# Windows including open ends, empty ones and bounds outside the data
+WINDOWS = [
+    (None, None),
+    ("2024-01-15", "2024-02-15"),
+    ("2024-02-01", None),
+    (None, "2024-01-10"),
+    ("2024-03-05 12:00", "2024-03-06"),
+    ("2023-06-01", "2023-07-01"),
+    ("2024-04-01", "2024-03-01"),
+    ("2023-12-01", "2025-01-01"),
+]
+
+def _window(df, start, end):
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= df["date"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= df["date"] < pd.Timestamp(end)
+    return df[mask]
+
+@pytest.fixture(scope="module")
+def data():
+    df = _entries()
+    return df, WasteAggregates.from_frame(df).date_index
+
+@pytest.mark.parametrize("start,end", WINDOWS)
+def test_window_totals_match_a_brute_force_filter(data, start, end):
+    df, index = data
+    expected = _window(df, start, end)
+
+    quantity, count = index.total(start, end)
+    assert count == len(expected)
+    assert quantity == pytest.approx(expected["quantity_kg"].sum())
+    assert index.days(start, end) == expected["date"].nunique()
+
+    for key in ("category", "reason"):
+        by = index.by(key, start, end)
+        brute = expected.groupby(key)["quantity_kg"].sum()
+        assert list(by.index) == sorted(brute.index)
+        assert by.to_numpy() == pytest.approx(brute.sort_index().to_numpy())
+
+@pytest.mark.parametrize("start,end", WINDOWS[:4])
+def test_buckets_match_a_brute_force_resample(data, start, end):
+    df, index = data
+    expected = _window(df, start, end)
+
+    months = index.buckets("month", start, end)
+    brute = expected.groupby(expected["date"].dt.strftime("%Y-%m"))["quantity_kg"].sum()
+    assert months[months > 0].to_dict() == pytest.approx(brute.to_dict())
+
+    weeks = index.buckets("week", start, end)
+    monday = expected["date"] - pd.to_timedelta(expected["date"].dt.weekday, unit="D")
+    brute = expected.groupby(monday.dt.strftime("%Y-%m-%d"))["quantity_kg"].sum()
+    assert weeks[weeks > 0].to_dict() == pytest.approx(brute.to_dict())
+
+def test_stats_of_an_empty_window():
+    index = DateIndex(WasteAggregates.from_frame(_entries()).cube)
+    assert index.stats("2020-01-01", "2020-02-01") is None
+    assert DateIndex(pd.DataFrame()).empty
+    with pytest.raises(ValueError):
+        index.buckets("fortnight")
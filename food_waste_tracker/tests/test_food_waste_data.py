@@ -0,0 +1,63 @@
+from datetime import datetime
+import food_waste_data
+
+def _entry(food_item, quantity_kg, day, **fields):
+    return {"food_item": food_item, "category": "Dairy", "quantity": quantity_kg, "unit": "kg",
+            "quantity_kg": quantity_kg, "date": datetime(2024, 3, day), "reason": "Expired",
+            "notes": "", "entry_timestamp": datetime.utcnow(), **fields}
+
+# Record the queries initialize_data sends to the store
+def _spy_fetches(monkeypatch):
+    queries = []
+    fetch = food_waste_data._fetch
+
+    def spy(columns=None, query=None, *args, **kwargs):
+        queries.append(query)
+        return fetch(columns, query, *args, **kwargs)
+
+    monkeypatch.setattr(food_waste_data, "_fetch", spy)
+    return queries
+
+def test_later_loads_only_fetch_new_entries(fresh_store, monkeypatch):
+    fresh_store.insert_many([_entry("Milk", 1.0, 1), _entry("Cheese", 0.5, 2)])
+    first = food_waste_data.initialize_data()
+    assert sorted(first["food_item"]) == ["Cheese", "Milk"]
+
+    queries = _spy_fetches(monkeypatch)
+    # Nothing new: the cached frame itself comes back
+    assert food_waste_data.initialize_data() is first
+    # Written by another process
+    fresh_store.insert_one(_entry("Yogurt", 0.2, 3))
+    topped_up = food_waste_data.initialize_data()
+
+    assert sorted(topped_up["food_item"]) == ["Cheese", "Milk", "Yogurt"]
+    assert len(first) == 2  # replaced, never mutated
+    # Each top-up asked only for entries past the watermark
+    assert len(queries) == 2 and all(queries)
+
+def test_local_writes_update_the_cache_without_reloading(fresh_store, monkeypatch):
+    fresh_store.insert_one(_entry("Milk", 1.0, 1))
+    food_waste_data.initialize_data()
+    version = food_waste_data.get_data_version()
+
+    food_waste_data.add_waste_entry(None, "Bread", "Grains", 2, "kg", datetime(2024, 3, 2), "Spoiled", "")
+    cached = food_waste_data.get_cached_data()
+    assert sorted(cached["food_item"]) == ["Bread", "Milk"]
+    assert food_waste_data.get_data_version() > version
+
+    # The top-up skips the entry it already holds
+    assert len(food_waste_data.initialize_data()) == 2
+
+    bread = cached.loc[cached["food_item"] == "Bread", "_id"].iloc[0]
+    food_waste_data.delete_data_by_id(bread)
+    assert list(food_waste_data.get_cached_data()["food_item"]) == ["Milk"]
+    assert fresh_store.count() == 1
+
+def test_projections_are_cached_separately(fresh_store):
+    fresh_store.insert_one(_entry("Milk", 1.0, 1))
+    narrow = food_waste_data.initialize_data(["date", "quantity_kg"])
+    assert list(narrow.columns) == ["_id", "date", "quantity_kg"]
+
+    food_waste_data.add_waste_entry(None, "Bread", "Grains", 2, "kg", datetime(2024, 3, 2), "Spoiled", "")
+    assert len(food_waste_data.initialize_data(["date", "quantity_kg"])) == 2
+    assert len(food_waste_data.initialize_data()) == 2
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+import forecast
+from aggregates import WasteAggregates
+
+START = pd.Timestamp("2024-01-01")  # a Monday
+
+# Aggregates of one entry per day and series with the given daily values
+def _aggregates(series):
+    rows = [
+        {"date": START + pd.Timedelta(days=day), "category": name, "reason": "Expired", "quantity_kg": value}
+        for name, values in series.items()
+        for day, value in enumerate(values)
+    ]
+    return WasteAggregates.from_frame(pd.DataFrame(rows))
+
+@pytest.fixture(autouse=True)
+def no_cached_fits(monkeypatch):
+    monkeypatch.setattr(forecast, "_fits", {})
+
+def test_forecast_shape_and_intervals():
+    rng = np.random.default_rng(11)
+    weekly = np.tile([3, 2, 2, 2, 4, 6, 5], 8)
+    aggregates = _aggregates({"Dairy": weekly + rng.normal(0, 0.3, 56), "Meat": weekly * 0.5 + 1})
+    today = START + pd.Timedelta(days=56)
+
+    result = forecast.forecast(aggregates, horizon=10, today=today)
+
+    assert result["history_end"] == today - pd.Timedelta(days=1)
+    assert list(result["dates"]) == list(pd.date_range(today, periods=10, freq="D"))
+    assert sorted(result["series"]) == ["Dairy", "Meat"]
+    for series in result["series"].values():
+        assert series["model"] in ("ets", "seasonal_naive")
+        for name in ("forecast_kg", "lower_kg", "upper_kg"):
+            assert series[name].shape == (10,)
+        assert (series["lower_kg"] <= series["forecast_kg"]).all()
+        assert (series["forecast_kg"] <= series["upper_kg"]).all()
+    assert result["total"]["forecast_kg"] == pytest.approx(
+        sum(series["forecast_kg"] for series in result["series"].values())
+    )
+    # A clean weekly pattern is projected as that pattern
+    assert result["series"]["Meat"]["forecast_kg"][:7] == pytest.approx(weekly[:7] * 0.5 + 1)
+
+def test_short_history_falls_back_to_seasonal_naive():
+    # Under two weeks: too short to fit the smoothing weights
+    values = [1, 2, 3, 4, 5, 6, 7, 2, 3, 4]
+    result = forecast.forecast(_aggregates({"Fruits": values}), horizon=9, today=START + pd.Timedelta(days=10))
+
+    series = result["series"]["Fruits"]
+    assert series["model"] == "seasonal_naive"
+    assert series["alpha"] is None
+    # Each day repeats the same weekday of the last week of history
+    assert list(series["forecast_kg"]) == [4, 5, 6, 7, 2, 3, 4, 4, 5]
+
+def test_under_a_week_forecasts_the_mean():
+    result = forecast.forecast(_aggregates({"Grains": [2, 4, 6]}), horizon=3, today=START + pd.Timedelta(days=3))
+    series = result["series"]["Grains"]
+    assert series["model"] == "mean"
+    assert list(series["forecast_kg"]) == [4, 4, 4]
+
+def test_new_days_extend_the_cached_fit():
+    weekly = np.tile([3, 2, 2, 2, 4, 6, 5], 6).astype(float)
+    aggregates = _aggregates({"Dairy": weekly})
+    forecast.forecast(aggregates, today=START + pd.Timedelta(days=35))
+    fitted_days = forecast._fits["category"]["states"]["Dairy"]["fitted_days"]
+
+    # New days are run through the cached state instead of a new grid search
+    forecast.forecast(aggregates, today=START + pd.Timedelta(days=42))
+    state = forecast._fits["category"]["states"]["Dairy"]
+    assert state["fitted_days"] == fitted_days
+    assert forecast._fits["category"]["days"] == 42
+
+def test_bad_arguments():
+    aggregates = _aggregates({"Dairy": [1.0] * 14})
+    with pytest.raises(ValueError):
+        forecast.forecast(aggregates, horizon=0)
+    with pytest.raises(ValueError):
+        forecast.forecast(aggregates, group_by="food_item")
+    assert forecast.forecast(WasteAggregates.from_frame(pd.DataFrame()))["series"] == {}
@@ -0,0 +1,60 @@
+import api
+import food_waste_data
+import importer
+from units import to_kg
+
+ROWS = [
+    {"food_item": "Milk", "category": "Dairy", "quantity": 2, "unit": "ltr", "date": "2024-03-01", "reason": "Expired"},
+    {"food_item": "Bread", "category": "Grains", "quantity": 1, "unit": "items", "date": "2024-03-02", "reason": "Spoiled"},
+    {"food_item": "Apples", "category": "Fruits", "quantity": "lots", "unit": "kg", "date": "2024-03-03", "reason": "Spoiled"},
+    {"food_item": "Cheese", "category": "Dairy", "quantity": 500, "unit": "g", "date": "03/04/2024", "reason": "Leftover"},
+    {"food_item": "Rice", "category": "", "quantity": 2, "unit": "servings", "date": "2024-03-05", "reason": "Leftover"},
+    {"food_item": "Yogurt", "category": "Dairy", "quantity": 0.5, "unit": "kg", "date": "2024-03-06", "reason": "Expired"},
+]
+
+def test_bulk_api_reports_each_rejected_row(fresh_store):
+    report = api.process_bulk_add_waste_api(ROWS, batch_size=2)
+
+    assert (report["success"], report["inserted"], report["failed"]) == (False, 3, 3)
+    assert report["errors"] == [
+        {"row": 2, "error": "Invalid quantity"},
+        {"row": 3, "error": "Invalid date format. Use YYYY-MM-DD"},
+        {"row": 4, "error": "Missing required field: category"},
+    ]
+    assert fresh_store.count() == 3
+    # Units are converted on the way in, as for single entries
+    kg = {doc["food_item"]: doc["quantity_kg"] for doc in fresh_store.find()}
+    assert kg == {row["food_item"]: to_kg(row["quantity"], row["unit"], row["food_item"])
+                  for row in (ROWS[0], ROWS[1], ROWS[5])}
+
+def test_rows_rejected_by_the_database_are_reported(fresh_store, monkeypatch):
+    insert_many = fresh_store.insert_many
+
+    def reject_bread(docs):
+        failed = {i: "Document failed validation" for i, doc in enumerate(docs) if doc["food_item"] == "Bread"}
+        insert_many([doc for i, doc in enumerate(docs) if i not in failed])
+        return failed
+
+    monkeypatch.setattr(fresh_store, "insert_many", reject_bread)
+    food_waste_data.initialize_data()
+    report = food_waste_data.add_waste_entries([ROWS[0], ROWS[1], ROWS[5]], batch_size=2)
+
+    assert report == {"inserted": 2, "errors": [{"row": 1, "error": "Document failed validation"}]}
+    # Only the stored entries reach the cache
+    assert sorted(food_waste_data.get_cached_data()["food_item"]) == ["Milk", "Yogurt"]
+
+def test_import_file_labels_rows_across_chunks(fresh_store, tmp_path):
+    path = tmp_path / "kitchen_log.csv"
+    fields = ["food_item", "category", "quantity", "unit", "date", "reason"]
+    lines = [",".join(fields)] + [",".join(str(row[field]) for field in fields) for row in ROWS]
+    path.write_text("\n".join(lines) + "\n")
+
+    report = importer.import_file(str(path), chunk_size=4, batch_size=3)
+    assert report["inserted"] == 3
+    assert [error["row"] for error in report["errors"]] == [2, 3, 4]
+    assert fresh_store.count() == 3
+
+def test_jsonl_files_are_detected_by_extension():
+    assert importer.detect_format("log.jsonl") == "jsonl"
+    assert importer.detect_format("log.CSV") == "csv"
+    assert importer.detect_format("log.txt", "jsonl") == "jsonl"
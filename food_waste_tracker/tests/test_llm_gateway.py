@@ -0,0 +1,187 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import llm_gateway
+from llm_gateway import CircuitBreaker, CircuitOpenError, LLMError
+
+class _MockLLMHandler(BaseHTTPRequestHandler):
+    """Answers each POST with the next scripted (status, body) of the server.
+    A list body is sent as a chunked server-sent events stream, cut off
+    without its final chunk at a None event; a bytes body is sent as is."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        status, payload = self.server.script.pop(0) if self.server.script else (200, {})
+        self.send_response(status)
+        if isinstance(payload, list):
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for event in payload:
+                if event is None:
+                    return
+                data = event if isinstance(event, str) else json.dumps(event)
+                chunk = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def mock_llm(monkeypatch):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _MockLLMHandler)
+    httpd.script, httpd.requests = [], []
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+
+    url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    monkeypatch.setattr(llm_gateway, "DEEPSEEK_URL", url + "/deepseek")
+    monkeypatch.setattr(llm_gateway, "ANTHROPIC_URL", url + "/anthropic")
+    monkeypatch.setattr(llm_gateway, "LLM_BACKOFF", 0)
+    monkeypatch.setattr(llm_gateway, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    # Fresh breakers per test
+    for name in ("deepseek", "anthropic"):
+        monkeypatch.setitem(llm_gateway._breakers, name, CircuitBreaker(failure_threshold=2, reset_seconds=0.2))
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+ANSWER = {"choices": [{"message": {"content": "Freeze it"}}]}
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_retries_transient_status_then_succeeds(mock_llm, status):
+    mock_llm.script = [(status, {}), (status, {}), (200, ANSWER)]
+    assert llm_gateway.deepseek_chat({"messages": []}) == ANSWER
+    assert len(mock_llm.requests) == 3
+    assert llm_gateway.breaker("deepseek").snapshot() == {"state": "closed", "failures": 0}
+
+def test_gives_up_after_max_retries(mock_llm):
+    mock_llm.script = [(503, {})] * 5
+    with pytest.raises(LLMError, match="HTTP 503"):
+        llm_gateway.deepseek_chat({"messages": []})
+    # One attempt plus LLM_MAX_RETRIES retries
+    assert len(mock_llm.requests) == 3
+    assert llm_gateway.breaker("deepseek").failures == 1
+
+def test_client_errors_are_not_retried(mock_llm):
+    mock_llm.script = [(400, {}), (200, ANSWER)]
+    with pytest.raises(LLMError, match="HTTP 400"):
+        llm_gateway.deepseek_chat({"messages": []})
+    assert len(mock_llm.requests) == 1
+
+def test_backoff_is_full_jitter(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_BACKOFF", 0.5)
+    bounds = []
+    monkeypatch.setattr(llm_gateway.random, "uniform", lambda low, high: bounds.append((low, high)) or high)
+    assert [llm_gateway.backoff_delay(attempt) for attempt in (1, 2, 3)] == [0.5, 1.0, 2.0]
+    assert bounds == [(0, 0.5), (0, 1.0), (0, 2.0)]
+
+def test_breaker_trips_and_recovers(mock_llm):
+    circuit = llm_gateway.breaker("anthropic")
+    mock_llm.script = [(500, {})] * 6
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            llm_gateway.anthropic_message({"messages": []})
+    assert circuit.state == "open"
+
+    # Open: fails fast without touching the backend
+    sent = len(mock_llm.requests)
+    with pytest.raises(CircuitOpenError):
+        llm_gateway.anthropic_message({"messages": []})
+    assert len(mock_llm.requests) == sent
+
+    # Half-open after the cool-down: one trial request, which fails and reopens
+    time.sleep(0.25)
+    assert circuit.state == "half-open"
+    mock_llm.script = [(500, {})] * 3
+    with pytest.raises(LLMError):
+        llm_gateway.anthropic_message({"messages": []})
+    assert circuit.state == "open"
+
+    # A successful trial closes it again
+    time.sleep(0.25)
+    mock_llm.script = [(200, {"content": [{"type": "text", "text": "Compost "}, {"type": "text", "text": "peels"}]})]
+    assert llm_gateway.anthropic_message({"messages": []}) == "Compost peels"
+    assert circuit.snapshot() == {"state": "closed", "failures": 0}
+
+def test_half_open_lets_one_trial_through():
+    circuit = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    circuit.record_failure()
+    assert circuit.state == "half-open"
+    assert circuit.allow() is True
+    assert circuit.allow() is False
+    circuit.record_success()
+    assert circuit.allow() is True
+
+def test_deepseek_stream_assembles_tokens(mock_llm):
+    events = [{"choices": [{"delta": {"role": "assistant"}}]}]
+    events += [{"choices": [{"delta": {"content": token}}]} for token in ("Plan ", "your ", "meals.")]
+    mock_llm.script = [(200, events + ["[DONE]", {"choices": [{"delta": {"content": "ignored"}}]}])]
+    assert "".join(llm_gateway.deepseek_stream({"messages": []})) == "Plan your meals."
+    assert mock_llm.requests[0]["stream"] is True
+
+def test_anthropic_stream_assembles_tokens(mock_llm):
+    mock_llm.script = [(200, [
+        {"type": "message_start", "message": {}},
+        {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Store "}},
+        {"type": "ping"},
+        {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "herbs in water."}},
+        {"type": "message_stop"},
+    ])]
+    assert "".join(llm_gateway.anthropic_stream({"messages": []})) == "Store herbs in water."
+
+def test_stream_retries_before_the_first_byte(mock_llm):
+    mock_llm.script = [(429, {}), (200, [{"type": "content_block_delta", "delta": {"text": "ok"}}])]
+    assert list(llm_gateway.anthropic_stream({"messages": []})) == ["ok"]
+    assert len(mock_llm.requests) == 2
+
+def test_unparseable_answer_ends_the_half_open_trial(mock_llm):
+    circuit = llm_gateway.breaker("anthropic")
+    circuit.failures, circuit.opened_at = 2, time.monotonic() - 1
+    assert circuit.state == "half-open"
+
+    mock_llm.script = [(200, b"not json")]
+    with pytest.raises(ValueError):
+        llm_gateway.anthropic_message({"messages": []})
+    # The failed trial reopened the circuit instead of leaving it half-open
+    assert circuit.state == "open"
+    time.sleep(0.25)
+    mock_llm.script = [(200, {"content": [{"type": "text", "text": "ok"}]})]
+    assert llm_gateway.anthropic_message({"messages": []}) == "ok"
+    assert circuit.state == "closed"
+
+def test_stream_dying_mid_answer_counts_as_failure(mock_llm):
+    mock_llm.script = [(200, [{"type": "content_block_delta", "delta": {"text": "Freeze "}}, None])]
+    received = []
+    with pytest.raises(Exception):
+        for text in llm_gateway.anthropic_stream({"messages": []}):
+            received.append(text)
+    assert received == ["Freeze "]
+    assert llm_gateway.breaker("anthropic").failures == 1
+
+def test_abandoned_stream_releases_the_trial(mock_llm):
+    circuit = llm_gateway.breaker("deepseek")
+    circuit.failures, circuit.opened_at = 2, time.monotonic() - 1
+    tokens = [{"choices": [{"delta": {"content": token}}]} for token in ("a", "b")]
+    mock_llm.script = [(200, tokens + ["[DONE]"])] * 2
+
+    stream = llm_gateway.deepseek_stream({"messages": []})
+    assert next(stream) == "a"
+    stream.close()
+    # Not counted either way, but the next call may try again
+    assert circuit.state == "half-open"
+    assert "".join(llm_gateway.deepseek_stream({"messages": []})) == "ab"
+    assert circuit.snapshot() == {"state": "closed", "failures": 0}
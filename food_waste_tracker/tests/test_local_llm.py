@@ -0,0 +1,20 @@
+import pytest
+
+import local_llm
+
+# Stands in for the transformers pipeline: echoes prompts, but answers a
+# "garbled" prompt with output the worker can't unpack
+def fake_pipeline(prompts, batch_size, **kwargs):
+    if "garbled" in prompts:
+        return [{"unexpected": True} for _ in prompts]
+    return [[{"generated_text": f"echo: {prompt}"}] for prompt in prompts]
+
+def test_bad_batch_fails_its_callers_and_worker_keeps_going(monkeypatch):
+    monkeypatch.setattr(local_llm, "_load_pipeline", lambda: fake_pipeline)
+    errors_before = local_llm.get_metrics()["errors"]
+
+    with pytest.raises(KeyError):
+        local_llm.generate("garbled", timeout=5)
+
+    assert local_llm.generate("hello", timeout=5) == "echo: hello"
+    assert local_llm.get_metrics()["errors"] == errors_before + 1
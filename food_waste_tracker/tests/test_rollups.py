@@ -0,0 +1,65 @@
+from datetime import datetime
+import pytest
+import rollups
+from storage import MongoStorage
+
+mongomock = pytest.importorskip("mongomock")
+
+def _entry(day, quantity_kg, category="Dairy", reason="Expired", hour=12):
+    return {"food_item": "Milk", "category": category, "reason": reason, "quantity_kg": quantity_kg,
+            "date": datetime(2024, 3, day, hour)}
+
+# {(day, category, reason): (quantity_kg, count)} of the rollup collection
+def _buckets(collection):
+    return {
+        (doc["date"].day, doc["category"], doc["reason"]): (round(doc["quantity_kg"], 9), doc["count"])
+        for doc in collection.find()
+    }
+
+@pytest.fixture
+def mongo_store():
+    db = mongomock.MongoClient().food_waste_db
+    return MongoStorage(db.waste_entries, db[rollups.ROLLUP_COLLECTION_NAME])
+
+def test_inserts_increment_day_buckets(mongo_store):
+    mongo_store.insert_one(_entry(1, 1.5, hour=8))
+    mongo_store.insert_many([_entry(1, 2.0, hour=20), _entry(2, 0.5, reason="Spoiled")])
+
+    assert _buckets(mongo_store.rollup_collection) == {
+        (1, "Dairy", "Expired"): (3.5, 2),
+        (2, "Dairy", "Spoiled"): (0.5, 1),
+    }
+    cube = rollups.cube(mongo_store.rollup_collection, {"reason": "Expired"})
+    assert list(cube["quantity_kg"]) == [3.5]
+
+def test_deletes_decrement_and_drop_empty_buckets(mongo_store):
+    first = mongo_store.insert_one(_entry(1, 1.5))
+    mongo_store.insert_one(_entry(1, 2.0))
+    only = mongo_store.insert_one(_entry(2, 0.5))
+
+    mongo_store.delete_one(first)
+    mongo_store.delete_one(only)
+    assert _buckets(mongo_store.rollup_collection) == {(1, "Dairy", "Expired"): (2.0, 1)}
+
+def test_quantity_updates_move_the_totals(mongo_store):
+    mongo_store.insert_one(_entry(1, 1.0))
+    entries = list(mongo_store.find())
+    mongo_store.update_quantity_kg(entries, [4.0])
+    assert _buckets(mongo_store.rollup_collection) == {(1, "Dairy", "Expired"): (4.0, 1)}
+
+def test_reconcile_repairs_drifted_buckets(mongo_store):
+    mongo_store.insert_one(_entry(1, 1.0))
+    mongo_store.insert_one(_entry(2, 2.0))
+    # A write that never reached the rollups, a bucket without entries and
+    # a bucket with a wrong total
+    mongo_store.collection.insert_one(_entry(3, 3.0))
+    rollups.apply_entries(mongo_store.rollup_collection, [_entry(4, 9.0)])
+    rollups.apply_entries(mongo_store.rollup_collection, [_entry(1, 0.25)])
+
+    assert rollups.reconcile(mongo_store.collection, mongo_store.rollup_collection) > 0
+    assert _buckets(mongo_store.rollup_collection) == {
+        (1, "Dairy", "Expired"): (1.0, 1),
+        (2, "Dairy", "Expired"): (2.0, 1),
+        (3, "Dairy", "Expired"): (3.0, 1),
+    }
+    assert mongo_store.reconcile_rollups() == 0
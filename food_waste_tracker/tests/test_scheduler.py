@@ -0,0 +1,85 @@
+import threading
+import pytest
+from scheduler import Scheduler, HIGH, LOW
+
+@pytest.fixture
+def scheduler():
+    running = Scheduler(workers=1).start()
+    yield running
+    running.stop(1)
+
+# A job that blocks the worker until released
+def _blocker():
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+        return "done"
+    return job, started, release
+
+def test_jobs_with_the_same_key_run_once(scheduler):
+    job, started, release = _blocker()
+    first = scheduler.submit(job, key="tip")
+    assert started.wait(5)
+    # Running: the caller gets the existing future
+    assert scheduler.submit(job, key="tip") is first
+    release.set()
+    assert first.result(5) == "done"
+
+    # Finished: the key can be queued again
+    again = scheduler.submit(lambda: "again", key="tip")
+    assert again is not first and again.result(5) == "again"
+    stats = scheduler.stats()
+    assert (stats["submitted"], stats["deduplicated"], stats["completed"]) == (2, 1, 2)
+
+def test_queued_jobs_run_by_priority(scheduler):
+    job, started, release = _blocker()
+    scheduler.submit(job)
+    assert started.wait(5)
+
+    order = []
+    low = scheduler.submit(order.append, "low", priority=LOW)
+    queued = scheduler.submit(order.append, "high", priority=HIGH, key="high")
+    assert scheduler.submit(order.append, "high", priority=HIGH, key="high") is queued
+    release.set()
+    low.result(5)
+    assert order == ["high", "low"]
+
+def test_failures_reach_the_future(scheduler):
+    def fail():
+        raise RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        scheduler.submit(fail, key="fail").result(5)
+    assert scheduler.stats()["failed"] == 1
+    assert scheduler.submit(lambda: 1, key="fail").result(5) == 1
+
+def test_periodic_ticks_skip_a_busy_run(scheduler):
+    runs, release = [], threading.Event()
+
+    def tick():
+        runs.append(1)
+        release.wait(5)
+
+    key = scheduler.every(0.01, tick, key="precompute")
+    # Registering again (as every rerun does) keeps the one schedule
+    assert scheduler.every(0.01, tick, key="precompute") == key
+    assert scheduler.stats()["periodic"] == ["precompute"]
+
+    # Ticks while the first run is busy are deduplicated, not queued
+    threading.Event().wait(0.2)
+    assert len(runs) == 1
+    assert scheduler.stats()["deduplicated"] > 0
+    assert scheduler.stats()["queued"] == 0
+    assert scheduler.cancel(key)
+    release.set()
+
+def test_stop_cancels_queued_jobs():
+    scheduler = Scheduler(workers=1).start()
+    job, started, release = _blocker()
+    scheduler.submit(job)
+    assert started.wait(5)
+    queued = scheduler.submit(lambda: None)
+    scheduler.stop(0.1)
+    assert queued.cancelled()
+    release.set()
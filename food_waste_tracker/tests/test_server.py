@@ -0,0 +1,122 @@
+import asyncio
+import csv
+import io
+import json
+from aiohttp.test_utils import TestClient, TestServer
+import server
+
+ENTRIES = [
+    {"food_item": "Milk", "category": "Dairy", "quantity": 2, "unit": "ltr",
+     "date": "2024-03-01", "reason": "Expired"},
+    {"food_item": "Bread", "category": "Grains", "quantity": 1, "unit": "items",
+     "date": "2024-03-02", "reason": "Spoiled"},
+    {"food_item": "Apples", "category": "Fruits", "quantity": 1.5, "unit": "kg",
+     "date": "2024-03-03", "reason": "Spoiled"},
+    {"food_item": "Cheese", "category": "Dairy", "quantity": 500, "unit": "g",
+     "date": "2024-03-04", "reason": "Leftover", "notes": "party"},
+    {"food_item": "Rice", "category": "Grains", "quantity": 2, "unit": "servings",
+     "date": "2024-03-05", "reason": "Leftover"},
+]
+
+# Run `scenario(client)` against a fresh in-memory server
+def run(scenario, entries=ENTRIES):
+    async def main():
+        async with TestClient(TestServer(server.create_app(memory=True))) as client:
+            if entries:
+                response = await client.post("/api/waste/bulk", json=entries)
+                assert response.status == 200
+            return await scenario(client)
+    return asyncio.run(main())
+
+def test_add_single_entry():
+    async def scenario(client):
+        response = await client.post("/api/waste", json=ENTRIES[0])
+        assert response.status == 200
+        assert (await response.json())["success"] is True
+
+        response = await client.post("/api/waste", json={"food_item": "Milk"})
+        assert response.status == 400
+        assert "Missing required field" in (await response.json())["error"]
+
+        stats = await (await client.get("/api/stats")).json()
+        assert stats["entry_count"] == 1
+    run(scenario, entries=None)
+
+def test_bulk_add_reports_rejected_rows():
+    async def scenario(client):
+        rows = ENTRIES[:2] + [dict(ENTRIES[2], date="03/03/2024"), dict(ENTRIES[3], quantity="lots")]
+        response = await client.post("/api/waste/bulk?batch_size=1", json=rows)
+        assert response.status == 200
+        report = await response.json()
+        assert (report["success"], report["inserted"], report["failed"]) == (False, 2, 2)
+        assert [error["row"] for error in report["errors"]] == [2, 3]
+
+        response = await client.post("/api/waste/bulk", json={"not": "a list"})
+        assert response.status == 400
+        response = await client.post("/api/waste/bulk?batch_size=abc", json=ENTRIES)
+        assert response.status == 400
+    run(scenario, entries=None)
+
+def test_stats():
+    async def scenario(client):
+        stats = await (await client.get("/api/stats")).json()
+        assert stats["entry_count"] == 5
+        # Milk by density, a loaf of bread, apples, cheese in g, servings of rice
+        assert abs(stats["total_waste_kg"] - (2 * 1.03 + 0.5 + 1.5 + 0.5 + 2 * 0.18)) < 1e-6
+        assert stats["most_wasted_category"] == "Dairy"
+
+        window = await (await client.get("/api/stats?start=2024-03-02&end=2024-03-03&group_by=category")).json()
+        assert window["entry_count"] == 2
+        assert window["buckets"] == {"Fruits": 1.5, "Grains": 0.5}
+
+        response = await client.get("/api/stats?start=2024-03-05&end=2024-03-01")
+        assert response.status == 400
+    run(scenario)
+
+def test_entries_cursor_round_trip():
+    async def scenario(client):
+        first = await (await client.get("/api/entries?limit=2&sort=date&order=asc")).json()
+        assert first["total"] == 5
+        assert [e["date"] for e in first["entries"]] == ["2024-03-01", "2024-03-02"]
+
+        seen = [e["food_item"] for e in first["entries"]]
+        cursor = first["next_cursor"]
+        while cursor:
+            page = await (await client.get(
+                "/api/entries", params={"limit": 2, "sort": "date", "order": "asc", "cursor": cursor}
+            )).json()
+            seen += [e["food_item"] for e in page["entries"]]
+            cursor = page["next_cursor"]
+        assert seen == ["Milk", "Bread", "Apples", "Cheese", "Rice"]
+
+        dairy = await (await client.get("/api/entries?category=Dairy&search=chee")).json()
+        assert [e["food_item"] for e in dairy["entries"]] == ["Cheese"]
+        assert dairy["entries"][0]["notes"] == "party"
+    run(scenario)
+
+def test_export_csv_and_jsonl():
+    async def scenario(client):
+        response = await client.get("/api/export?format=csv&batch_size=2")
+        assert response.status == 200
+        assert response.headers["Content-Type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(await response.text())))
+        assert [row["food_item"] for row in rows] == ["Milk", "Bread", "Apples", "Cheese", "Rice"]
+        assert rows[0]["date"] == "2024-03-01"
+
+        response = await client.get("/api/export?format=jsonl&category=Grains")
+        lines = [json.loads(line) for line in (await response.text()).splitlines()]
+        assert [line["food_item"] for line in lines] == ["Bread", "Rice"]
+
+        response = await client.get("/api/export?format=xls")
+        assert response.status == 400
+    run(scenario)
+
+def test_chat_answers_from_the_data():
+    async def scenario(client):
+        response = await client.post("/api/chat", json={"message": "What's my total waste?"})
+        assert response.status == 200
+        assert "kg" in (await response.json())["response"]
+
+        response = await client.post("/api/chat", json={})
+        assert response.status == 400
+    run(scenario)
@@ -0,0 +1,47 @@
+from datetime import datetime
+import numpy as np
+import pytest
+import food_waste_data
+from units import to_kg, to_kg_batch
+
+UNITS = ["kg", "g", "lbs", "LB", " oz ", "ltr", "ml", "servings", "items", "Item", "bushels", "", None]
+ITEMS = ["Milk", "bananas", "Bread", "Tomatoes", "Gravel", None]
+
+def test_batch_matches_scalar_conversion():
+    rng = np.random.default_rng(5)
+    pairs = [(unit, item) for unit in UNITS for item in ITEMS]
+    quantity = rng.uniform(0, 10, len(pairs))
+    units = [unit for unit, _ in pairs]
+    items = [item for _, item in pairs]
+
+    expected = [to_kg(q, unit, item) for q, (unit, item) in zip(quantity, pairs)]
+    assert to_kg_batch(quantity, units, items) == pytest.approx(expected)
+
+def test_batch_broadcasts_scalars_and_flags_bad_quantities():
+    assert to_kg_batch([1, 2], "lbs") == pytest.approx([0.453592, 0.907184])
+    assert to_kg_batch([1, 1], ["ltr", "ltr"], "Milk") == pytest.approx([1.03, 1.03])
+    converted = to_kg_batch(["3", "lots", None], ["kg", "kg", "kg"])
+    assert converted[0] == 3 and np.isnan(converted[1:]).all()
+
+def test_renormalize_rewrites_stale_quantities(fresh_store):
+    rows = [("Milk", 2, "ltr", 2.0), ("Bread", 1, "items", 0.5), ("Apples", 3, "items", 0.54),
+            ("Rice", 4, "servings", 1.0), ("Cheese", 500, "g", 0.5)]
+    fresh_store.insert_many([
+        {"food_item": item, "category": "Others", "quantity": quantity, "unit": unit, "quantity_kg": kg,
+         "date": datetime(2024, 3, 1), "reason": "Expired", "entry_timestamp": datetime(2024, 3, 1)}
+        for item, quantity, unit, kg in rows
+    ])
+    before = food_waste_data.initialize_data()
+
+    # Milk has a density over 1 and rice servings weigh 0.18 kg, the rest is current
+    assert food_waste_data.renormalize_quantities(batch_size=2, dry_run=True) == (5, 2)
+    assert food_waste_data.initialize_data() is before
+    assert food_waste_data.renormalize_quantities(batch_size=2) == (5, 2)
+    assert food_waste_data.renormalize_quantities(batch_size=2) == (5, 0)
+
+    stored = {doc["food_item"]: doc["quantity_kg"] for doc in fresh_store.find()}
+    assert stored == pytest.approx({item: to_kg(quantity, unit, item) for item, quantity, unit, _ in rows})
+    # The caches were dropped, so the next load sees the new values
+    reloaded = food_waste_data.initialize_data()
+    assert reloaded is not before
+    assert reloaded["quantity_kg"].sum() == pytest.approx(sum(stored.values()))
@@ -0,0 +1,100 @@
+import threading
+from datetime import datetime
+import pytest
+import food_waste_data
+import watcher
+from watcher import Watcher
+
+# Poll `condition` until it holds or `timeout` seconds pass
+def _wait_for(condition, timeout=2):
+    pause = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        pause.wait(0.01)
+    return condition()
+
+def test_poll_errors_do_not_stop_the_watcher(fresh_store, monkeypatch):
+    calls = []
+
+    def flaky_poll():
+        calls.append(1)
+        if len(calls) <= 2:
+            raise ConnectionResetError("connection reset")
+
+    monkeypatch.setattr(food_waste_data, "poll_caches", flaky_poll)
+    monkeypatch.setattr(watcher, "WATCH_MAX_BACKOFF", 0.02)
+    live = Watcher(collection=None, poll_interval=0.01).start()
+    try:
+        assert _wait_for(lambda: len(calls) >= 4)
+        assert live.mode == "polling"
+        assert live._thread.is_alive()
+    finally:
+        live.stop(1)
+
+def test_falls_back_to_polling_without_change_streams(monkeypatch):
+    # mongomock collections have no watch(); calling it raises TypeError
+    mongomock = pytest.importorskip("mongomock")
+    polls = []
+    monkeypatch.setattr(food_waste_data, "poll_caches", lambda: polls.append(1))
+    live = Watcher(collection=mongomock.MongoClient().db.waste_entries, poll_interval=0.01).start()
+    try:
+        assert _wait_for(lambda: live.mode == "polling" and len(polls) >= 2)
+        assert live._thread.is_alive()
+    finally:
+        live.stop(1)
+
+def test_local_writes_wake_wait_for_change(fresh_store):
+    food_waste_data.initialize_data()
+    version = food_waste_data.get_data_version()
+    woke = []
+    waiter = threading.Thread(target=lambda: woke.append(Watcher().wait_for_change(version, timeout=5)))
+    waiter.start()
+    food_waste_data.add_waste_entry(None, "Bread", "Bakery", 2, "pcs", datetime(2024, 5, 1), "Expired", "")
+    waiter.join(1)
+    assert woke and woke[0] != version
+
+def test_poll_reads_the_database_without_holding_the_cache(fresh_store, monkeypatch):
+    food_waste_data.initialize_data()
+    reading, release = threading.Event(), threading.Event()
+    fetch = food_waste_data._fetch
+
+    def slow_fetch(*args, **kwargs):
+        reading.set()
+        release.wait(5)
+        return fetch(*args, **kwargs)
+
+    monkeypatch.setattr(food_waste_data, "_fetch", slow_fetch)
+    poller = threading.Thread(target=food_waste_data.poll_caches)
+    poller.start()
+    try:
+        assert reading.wait(5)
+        # Readers are served from the cache while the poll waits on the database
+        served = []
+        reader = threading.Thread(target=lambda: served.append(food_waste_data.get_cached_data()))
+        reader.start()
+        reader.join(1)
+        assert served
+    finally:
+        release.set()
+        poller.join(5)
+
+def test_entries_deleted_during_a_top_up_stay_deleted(fresh_store, monkeypatch):
+    food_waste_data.initialize_data()
+    # Written by another process, so only a top-up will pick it up
+    entry = {"food_item": "Milk", "category": "Dairy", "quantity": 1.0, "unit": "L",
+             "quantity_kg": 1.03, "date": datetime(2024, 5, 2), "reason": "Spoiled",
+             "notes": "", "entry_timestamp": datetime.utcnow()}
+    fresh_store.insert_one(entry)
+    id_str = str(entry["_id"])
+
+    # ...and deleted here after the top-up has read it, before it is applied
+    fetch = food_waste_data._fetch
+
+    def fetch_then_delete(*args, **kwargs):
+        result = fetch(*args, **kwargs)
+        food_waste_data.delete_data_by_id(id_str)
+        return result
+
+    monkeypatch.setattr(food_waste_data, "_fetch", fetch_then_delete)
+    assert id_str not in set(food_waste_data.initialize_data()["_id"])
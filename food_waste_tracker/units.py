@@ -0,0 +1,180 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+"""
+Unit conversion for waste quantities.
+
+One table of every unit the app accepts. Mass units convert to kg
+directly, volume units through the density of the food (water unless the
+item has its own), and servings / items through a per-item weight with a
+generic fallback. Unknown units are taken as kg.
+
+    to_kg(2, "lbs")                         one quantity
+    to_kg(1, "items", "Bananas")            with per-item overrides
+    to_kg_batch(quantities, units, items)   whole arrays at once
+
+to_kg_batch looks every distinct (unit, item) pair up once and converts
+the rest with array arithmetic, so importing or generating millions of
+entries costs a few factorizations rather than a dict lookup per row.
+
+    python units.py migrate     # recompute quantity_kg of stored entries
+"""
+
+# kg per unit of mass
+MASS_UNITS = {
+    "kg": 1.0,
+    "g": 0.001,
+    "mg": 0.000001,
+    "lb": 0.453592,
+    "lbs": 0.453592,
+    "oz": 0.0283495,
+}
+
+# Litres per unit of volume
+VOLUME_UNITS = {
+    "l": 1.0,
+    "ltr": 1.0,
+    "ml": 0.001,
+}
+
+# Countable units and what one of them is
+COUNT_UNITS = {
+    "servings": "serving",
+    "serving": "serving",
+    "items": "item",
+    "item": "item",
+}
+
+# kg per litre unless the item has its own density
+DEFAULT_DENSITY = 1.0
+
+# kg per serving / item unless the item has its own weight
+DEFAULT_COUNT_KG = {
+    "serving": 0.25,
+    "item": 0.15,
+}
+
+# Per-item density (kg per litre) and serving / item weights (kg), keyed by
+# the lower-case singular item name
+FOOD_OVERRIDES = {
+    "milk": {"density": 1.03, "serving": 0.245},
+    "cream": {"density": 1.01, "serving": 0.03},
+    "yogurt": {"density": 1.05, "serving": 0.17, "item": 0.15},
+    "juice": {"density": 1.05, "serving": 0.25},
+    "soup": {"density": 1.02, "serving": 0.3},
+    "sauce": {"density": 1.1, "serving": 0.06},
+    "oil": {"density": 0.92, "serving": 0.014},
+    "honey": {"density": 1.42, "serving": 0.021},
+    "cheese": {"serving": 0.03},
+    "butter": {"serving": 0.014},
+    "bread": {"serving": 0.04, "item": 0.5},
+    "rice": {"serving": 0.18},
+    "pasta": {"serving": 0.2},
+    "bagel": {"item": 0.1},
+    "tortilla": {"item": 0.045},
+    "chicken": {"serving": 0.15},
+    "beef": {"serving": 0.15},
+    "pork": {"serving": 0.15},
+    "fish": {"serving": 0.15},
+    "sausage": {"item": 0.075},
+    "egg": {"item": 0.05},
+    "banana": {"item": 0.12},
+    "apple": {"item": 0.18},
+    "orange": {"item": 0.15},
+    "strawberry": {"item": 0.012, "serving": 0.15},
+    "grape": {"item": 0.005, "serving": 0.15},
+    "tomato": {"item": 0.12},
+    "potato": {"item": 0.17},
+    "carrot": {"item": 0.06},
+    "cucumber": {"item": 0.3},
+    "lettuce": {"item": 0.5, "serving": 0.05},
+    "spinach": {"serving": 0.03},
+    "salad": {"serving": 0.1},
+    "sandwich": {"item": 0.2, "serving": 0.2},
+}
+
+# Every unit with its kg factor before per-item overrides
+UNIT_TO_KG = dict(
+    MASS_UNITS,
+    **{unit: litres * DEFAULT_DENSITY for unit, litres in VOLUME_UNITS.items()},
+    **{unit: DEFAULT_COUNT_KG[kind] for unit, kind in COUNT_UNITS.items()},
+)
+
+# Units whose factor depends on the food item
+ITEM_UNITS = frozenset(VOLUME_UNITS) | frozenset(COUNT_UNITS)
+
+def normalize_unit(unit):
+    return unit.strip().lower() if isinstance(unit, str) else ""
+
+# Overrides of a food item, trying the name as given and its singular
+def food_overrides(food_item):
+    if not isinstance(food_item, str):
+        return {}
+    name = food_item.strip().lower()
+    for key in (name, name[:-1] if name.endswith("s") else None, name[:-2] if name.endswith("es") else None):
+        if key and key in FOOD_OVERRIDES:
+            return FOOD_OVERRIDES[key]
+    return {}
+
+def unit_factor(unit, food_item=None):
+    """kg per one `unit` of `food_item`"""
+    unit = normalize_unit(unit)
+    if unit in VOLUME_UNITS:
+        return VOLUME_UNITS[unit] * food_overrides(food_item).get("density", DEFAULT_DENSITY)
+    if unit in COUNT_UNITS:
+        kind = COUNT_UNITS[unit]
+        return food_overrides(food_item).get(kind, DEFAULT_COUNT_KG[kind])
+    return MASS_UNITS.get(unit, 1.0)
+
+def to_kg(quantity, unit, food_item=None):
+    """One quantity in kg"""
+    return quantity * unit_factor(unit, food_item)
+
+# A scalar (or None) repeated to n rows, anything else as an object array
+def _column(values, n):
+    if values is None or isinstance(values, str):
+        return np.full(n, values, dtype=object)
+    return np.asarray(values, dtype=object)
+
+def to_kg_batch(quantity, unit, food_item=None):
+    """
+    Quantities in kg for whole columns of quantities, units and food items.
+
+    `unit` and `food_item` may be arrays / Series of the same length as
+    `quantity` or single values. Returns a float ndarray; missing or
+    non-numeric quantities come back as NaN.
+    """
+    quantity = pd.to_numeric(pd.Series(np.asarray(quantity, dtype=object)), errors="coerce").to_numpy(dtype=float)
+    n = len(quantity)
+    unit_codes, units = pd.factorize(_column(unit, n))
+    unit_codes = np.where(unit_codes < 0, len(units), unit_codes)  # missing unit: kg
+    factors = np.array([unit_factor(u) for u in units] + [1.0])[unit_codes]
+
+    # Only volumes and counts depend on the item: one lookup per distinct pair
+    dependent = [code for code, u in enumerate(units) if normalize_unit(u) in ITEM_UNITS]
+    if food_item is not None and dependent:
+        rows = np.flatnonzero(np.isin(unit_codes, dependent))
+        item_codes, items = pd.factorize(_column(food_item, n)[rows])
+        width = len(items) + 1  # slot 0 is a missing item
+        pair_codes, pairs = pd.factorize(unit_codes[rows] * width + item_codes + 1)
+        pair_factors = []
+        for pair in pairs:
+            unit_code, item_slot = divmod(int(pair), width)
+            pair_factors.append(unit_factor(units[unit_code], items[item_slot - 1] if item_slot else None))
+        factors[rows] = np.array(pair_factors)[pair_codes]
+    return quantity * factors
+
+if __name__ == "__main__":
+    from food_waste_data import renormalize_quantities, DEFAULT_INSERT_BATCH_SIZE
+
+    parser = argparse.ArgumentParser(description="Waste quantity units")
+    parser.add_argument("command", choices=["migrate"], help="migrate: recompute quantity_kg of stored entries")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_INSERT_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the entries that would change")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        checked, changed = renormalize_quantities(args.batch_size, args.dry_run)
+        action = "would change" if args.dry_run else "updated"
+        print(f"Checked {checked} entries, {action} {changed}")
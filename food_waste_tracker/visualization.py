@@ -1,35 +1,192 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
+from food_waste_data import get_aggregates, get_cached_data, DASHBOARD_COLUMNS
+import forecast
+import metrics
 
-# 📈 1. Daily waste line chart
-def create_daily_chart(df):
-    if df.empty or "date" not in df.columns or "quantity_kg" not in df.columns:
-        return go.Figure().update_layout(title="No data available for daily trend")
+# Charts read the shared rollups of the given DataFrame (computed once per
+# data version), or MongoDB-side rollups when df is None. Built figures are
+# cached per (chart, data fingerprint), so reruns on unchanged data skip
+# Plotly Express entirely. The cached go.Figure objects are shared by every
+# session: treat them as read-only (copy with go.Figure(fig) to modify).
+
+# Daily points sent to the browser; longer series are downsampled with LTTB
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "1500"))
+CHART_CACHE_SIZE = 32
+
+# Days of history drawn in front of a forecast
+FORECAST_CHART_HISTORY_DAYS = 56
+
+_chart_cache = OrderedDict()
+_chart_cache_lock = threading.Lock()
+_chart_cache_stats = {"hits": 0, "misses": 0}
+
+# Largest-Triangle-Three-Buckets: indices of `threshold` points that keep
+# the visual shape of the (x, y) series
+def lttb(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    # Bucket edges for the points between the fixed first and last point
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        selected[i + 1] = previous
+    return selected
 
-    daily_data = df.groupby(df['date'].dt.date)["quantity_kg"].sum().reset_index()
-    fig = px.line(daily_data, x="date", y="quantity_kg", title="Daily Food Waste (kg)")
+# Figure for a chart from the cache, building and storing it on a miss.
+# The figure is returned as cached (shared, read-only).
+def _cached_figure(chart, aggregates, build):
+    key = (chart, aggregates.fingerprint)
+    with _chart_cache_lock:
+        figure = _chart_cache.get(key)
+        if figure is not None:
+            _chart_cache.move_to_end(key)
+            _chart_cache_stats["hits"] += 1
+    metrics.cache_event("charts", figure is not None)
+    if figure is None:
+        with metrics.span(f"plotly.{chart}"):
+            figure = build(aggregates)
+        with _chart_cache_lock:
+            _chart_cache_stats["misses"] += 1
+            _chart_cache[key] = figure
+            while len(_chart_cache) > CHART_CACHE_SIZE:
+                _chart_cache.popitem(last=False)
+    return figure
+
+def chart_cache_stats():
+    with _chart_cache_lock:
+        return {**_chart_cache_stats, "size": len(_chart_cache)}
+
+# Rollups for a chart, or None when the required columns are missing
+def _chart_aggregates(df, column):
+    if df is not None and (df.empty or column not in df.columns or "quantity_kg" not in df.columns):
+        return None
+    aggregates = get_aggregates(df)
+    return None if aggregates.empty else aggregates
+
+def _daily_figure(aggregates):
+    daily_data = aggregates.daily_frame()
+    title = "Daily Food Waste (kg)"
+    if len(daily_data) > CHART_MAX_POINTS:
+        days = pd.to_datetime(daily_data["date"]).to_numpy().astype("int64")
+        keep = lttb(days, daily_data["quantity_kg"].to_numpy(), CHART_MAX_POINTS)
+        daily_data = daily_data.iloc[keep]
+        title = f"Daily Food Waste (kg, {len(keep)} of {len(days)} days shown)"
+    fig = px.line(daily_data, x="date", y="quantity_kg", title=title)
     fig.update_traces(mode="lines+markers")
     fig.update_layout(xaxis_title="Date", yaxis_title="Kg Wasted")
     return fig
 
-# 📊 2. Category-wise bar chart
-def create_category_chart(df):
-    if df.empty or "category" not in df.columns or "quantity_kg" not in df.columns:
-        return go.Figure().update_layout(title="No data available for category trend")
-
-    category_data = df.groupby("category")["quantity_kg"].sum().reset_index()
+def _category_figure(aggregates):
+    category_data = aggregates.category_frame()
     fig = px.bar(category_data, x="category", y="quantity_kg", title="Waste by Category (kg)", text_auto=True)
     fig.update_layout(xaxis_title="Category", yaxis_title="Kg Wasted")
     return fig
 
-# 📉 3. Monthly waste trend area chart
-def create_monthly_trend(df):
-    if df.empty or "date" not in df.columns or "quantity_kg" not in df.columns:
-        return go.Figure().update_layout(title="No data available for monthly trend")
-
-    df["month"] = df["date"].dt.to_period("M").astype(str)
-    monthly_data = df.groupby("month")["quantity_kg"].sum().reset_index()
+def _monthly_figure(aggregates):
+    monthly_data = aggregates.monthly_frame()
     fig = px.area(monthly_data, x="month", y="quantity_kg", title="Monthly Food Waste Trend (kg)")
     fig.update_layout(xaxis_title="Month", yaxis_title="Kg Wasted")
     return fig
+
+def _forecast_figure(aggregates, horizon, group_by):
+    names, calendar, y = forecast.daily_matrix(aggregates, group_by)
+    result = forecast.forecast(aggregates, horizon, group_by)
+    colors = px.colors.qualitative.Plotly
+    history = slice(max(len(calendar) - FORECAST_CHART_HISTORY_DAYS, 0), None)
+
+    fig = go.Figure()
+    for i, name in enumerate(names):
+        color = colors[i % len(colors)]
+        series = result["series"][name]
+        fig.add_trace(go.Scatter(
+            x=calendar[history], y=y[i, history], name=name, legendgroup=name,
+            mode="lines", line=dict(color=color)
+        ))
+        # Forecast joined to the last observed day, interval in the hover
+        fig.add_trace(go.Scatter(
+            x=calendar[-1:].append(result["dates"]),
+            y=np.concatenate([y[i, -1:], series["forecast_kg"]]),
+            customdata=np.column_stack([
+                np.concatenate([y[i, -1:], series["lower_kg"]]),
+                np.concatenate([y[i, -1:], series["upper_kg"]])
+            ]),
+            hovertemplate="%{y:.2f} kg (%{customdata[0]:.2f} to %{customdata[1]:.2f})",
+            name=f"{name} ({series['model'].replace('_', ' ')})", legendgroup=name,
+            mode="lines", line=dict(color=color, dash="dash"), showlegend=False
+        ))
+    fig.add_vline(x=calendar[-1], line_dash="dot", line_color="gray")
+    fig.update_layout(
+        title=f"Projected Daily Waste by {group_by.title()} (kg, next {horizon} days)",
+        xaxis_title="Date", yaxis_title="Kg Wasted", hovermode="x unified"
+    )
+    return fig
+
+# 📈 1. Daily waste line chart
+@metrics.timed()
+def create_daily_chart(df=None):
+    aggregates = _chart_aggregates(df, "date")
+    if aggregates is None or aggregates.daily_by_day.empty:
+        return go.Figure().update_layout(title="No data available for daily trend")
+    return _cached_figure("daily", aggregates, _daily_figure)
+
+# 📊 2. Category-wise bar chart
+@metrics.timed()
+def create_category_chart(df=None):
+    aggregates = _chart_aggregates(df, "category")
+    if aggregates is None or aggregates.by_category.empty:
+        return go.Figure().update_layout(title="No data available for category trend")
+    return _cached_figure("category", aggregates, _category_figure)
+
+# 📉 3. Monthly waste trend area chart
+@metrics.timed()
+def create_monthly_trend(df=None):
+    aggregates = _chart_aggregates(df, "date")
+    if aggregates is None or aggregates.monthly.empty:
+        return go.Figure().update_layout(title="No data available for monthly trend")
+    return _cached_figure("monthly", aggregates, _monthly_figure)
+
+# 🔮 4. Forecast of daily waste per category (or reason)
+@metrics.timed()
+def create_forecast_chart(df=None, horizon=forecast.FORECAST_HORIZON, group_by="category"):
+    aggregates = _chart_aggregates(df, "date")
+    if aggregates is None or not len(forecast.daily_matrix(aggregates, group_by)[0]):
+        return go.Figure().update_layout(title="No data available for a forecast")
+    # Series end at yesterday, so the figure changes with the day too
+    chart = f"forecast:{group_by}:{horizon}:{pd.Timestamp.now():%Y-%m-%d}"
+    return _cached_figure(chart, aggregates, lambda a: _forecast_figure(a, horizon, group_by))
+
+# Build the rollups, every dashboard chart and the Claude data context for
+# the current cached data, so the next render or question only reads caches
+# (run on a timer by the scheduler)
+def precompute_dashboard():
+    from api import anthropic_context
+
+    data = get_cached_data(DASHBOARD_COLUMNS)
+    get_aggregates(data)
+    for create in (create_daily_chart, create_category_chart, create_monthly_trend, create_forecast_chart):
+        create(data)
+    anthropic_context(data)
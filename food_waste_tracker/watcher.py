@@ -0,0 +1,177 @@
+import os
+import threading
+from pymongo.errors import OperationFailure, PyMongoError
+import food_waste_data
+
+"""
+Live updates of the cached waste data.
+
+One background thread per process follows the waste_entries change stream
+and applies inserts and deletes to the cached DataFrames (and their
+memoized rollups) as they happen, so every terminal sees other kitchens'
+entries without re-reading the collection. Standalone servers have no
+change streams, and neither do the embedded SQLite / DuckDB stores; the
+watcher then polls the (entry_timestamp, _id) watermark every
+WATCH_POLL_INTERVAL seconds instead.
+
+Subscribers are called with {"version", "inserted", "deleted"} after each
+applied batch; wait_for_change() blocks until the data version moves,
+including for entries written by this process.
+"""
+
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "2"))
+
+# Longest wait between retries while errors keep coming
+WATCH_MAX_BACKOFF = 60
+
+# Events read from the change stream before they are applied in one batch,
+# and the longest an event waits for the rest of its batch
+WATCH_BATCH_SIZE = 500
+WATCH_MAX_AWAIT_MS = 250
+
+# Error codes meaning change streams are unsupported (standalone server)
+_NO_CHANGE_STREAMS = {40573, 40324, 136}
+
+class Watcher:
+    """Background thread feeding MongoDB changes into the data caches"""
+
+    def __init__(self, collection=None, poll_interval=WATCH_POLL_INTERVAL):
+        if collection is None:
+            # Only MongoDB has change streams; embedded stores are polled
+            collection = getattr(food_waste_data.store, "collection", None)
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.mode = None            # "change_stream" or "polling" once running
+        self.resume_token = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the watcher thread (idempotent)"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="waste-watcher", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def subscribe(self, callback):
+        """Call `callback(event)` after every applied change; returns an unsubscribe function"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the data version differs from `version`; returns the current version"""
+        return food_waste_data.wait_for_change(version, timeout)
+
+    def _notify(self, version, inserted, deleted):
+        event = {"version": version, "inserted": inserted, "deleted": deleted}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Watcher subscriber error: {e}")
+
+    # Wait before the next attempt, doubling with each consecutive failure
+    def _backoff(self, failures):
+        self._stop.wait(min(self.poll_interval * 2 ** max(failures - 1, 0), WATCH_MAX_BACKOFF))
+
+    def _run(self):
+        if self.collection is None or not hasattr(self.collection, "watch"):
+            self._poll()
+            return
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self._follow_change_stream()
+                failures = 0
+            except OperationFailure as e:
+                if e.code in _NO_CHANGE_STREAMS:
+                    self._poll()
+                    return
+                failures += 1
+                print(f"Change stream error, resuming: {e}")
+            except PyMongoError as e:
+                failures += 1
+                print(f"Change stream error, resuming: {e}")
+            except Exception as e:
+                if self.mode is None:
+                    # The stream never opened (e.g. a driver or fake without
+                    # change streams): poll instead
+                    print(f"Change streams unavailable, polling instead: {e!r}")
+                    self._poll()
+                    return
+                failures += 1
+                print(f"Watcher error, resuming: {e!r}")
+            self._backoff(failures)
+
+    def _follow_change_stream(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "delete"]}}}]
+        with self.collection.watch(pipeline, resume_after=self.resume_token,
+                                   max_await_time_ms=WATCH_MAX_AWAIT_MS) as stream:
+            self.mode = "change_stream"
+            # Catch up on anything written before the stream was opened
+            self._apply_poll()
+            while not self._stop.is_set() and stream.alive:
+                inserted, deleted = [], []
+                change = stream.try_next()
+                while change is not None:
+                    if change["operationType"] == "insert":
+                        inserted.append(change["fullDocument"])
+                    else:
+                        deleted.append(change["documentKey"]["_id"])
+                    if len(inserted) + len(deleted) >= WATCH_BATCH_SIZE:
+                        break
+                    change = stream.try_next()
+                self.resume_token = stream.resume_token
+                if inserted or deleted:
+                    before = food_waste_data.get_data_version()
+                    version = food_waste_data.apply_changes(inserted, deleted)
+                    if version != before:
+                        self._notify(version, len(inserted), len(deleted))
+
+    def _apply_poll(self):
+        before = food_waste_data.get_data_version()
+        food_waste_data.poll_caches()
+        version = food_waste_data.get_data_version()
+        if version != before:
+            self._notify(version, None, None)
+
+    def _poll(self):
+        self.mode = "polling"
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self._apply_poll()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print(f"Watcher poll error: {e!r}")
+            self._backoff(failures)
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+def get_watcher():
+    """The process-wide watcher, started on first use"""
+    global _watcher
+    if _watcher is None:
+        with _watcher_lock:
+            if _watcher is None:
+                _watcher = Watcher().start()
+    return _watcher